@@ -16,27 +16,179 @@
 import time
 import tempfile
 import os
-from twisted.python import log
-from twisted.internet import defer, utils
+import fnmatch
+from twisted.python import log, failure
+from twisted.internet import defer, utils, reactor, protocol, error
 
 from buildbot.util import deferredLocked
 from buildbot.changes import base
 from buildbot.util import epoch2datetime
 
+# all GitPollers share this limit on the number of git processes they run at
+# once; change it with setGitProcessLimit
+_git_semaphore = defer.DeferredSemaphore(10)
+
+def setGitProcessLimit(limit):
+    """
+    Limit the number of git processes that all GitPollers together may run at
+    once.  Processes which are already running are not affected.
+    """
+    global _git_semaphore
+    _git_semaphore = defer.DeferredSemaphore(limit)
+
+def getProcessOutput(*args, **kwargs):
+    return _git_semaphore.run(utils.getProcessOutput, *args, **kwargs)
+
+def getProcessOutputAndValue(*args, **kwargs):
+    return _git_semaphore.run(utils.getProcessOutputAndValue, *args, **kwargs)
+
+class GitLogParser(object):
+    """
+    I parse the output of 'git log --name-only' in my L{format}, a chunk at a
+    time, and call COMMITCB with a dictionary describing each commit as soon
+    as all of its output has arrived.
+    """
+
+    # each commit starts with \x01 and its fields are separated by NULs; the
+    # names of the changed files follow the last NUL, one per line
+    format = r'--format=%x01%H%x00%ct%x00%aN <%aE>%x00%s%n%b%x00'
+
+    def __init__(self, commitCb, encoding='utf-8'):
+        self.commitCb = commitCb
+        self.encoding = encoding
+        self.pending = []
+
+    def feed(self, data):
+        if '\x01' not in data:
+            self.pending.append(data)
+            return
+        records = data.split('\x01')
+        self.pending.append(records[0])
+        records[0] = ''.join(self.pending)
+        self.pending = [ records.pop() ]
+        for record in records:
+            if record.strip():
+                self._parseRecord(record)
+
+    def finish(self):
+        record = ''.join(self.pending)
+        self.pending = []
+        if record.strip():
+            self._parseRecord(record)
+
+    def _parseRecord(self, record):
+        fields = record.split('\x00', 4)
+        if len(fields) != 5:
+            raise EnvironmentError('could not parse git log output: %r'
+                                   % (record[:100],))
+        revision, timestamp, author, comments, files = fields
+        author = author.strip().decode(self.encoding)
+        if not author:
+            raise EnvironmentError('could not get commit author for rev')
+        comments = comments.strip().decode(self.encoding)
+        if not comments:
+            raise EnvironmentError('could not get commit comment for rev')
+        self.commitCb(dict(revision=revision,
+                           timestamp=float(timestamp),
+                           author=author,
+                           comments=comments,
+                           files=[ f for f in files.split('\n') if f ]))
+
+
+class GitLogProtocol(protocol.ProcessProtocol):
+    """
+    I feed the output of 'git log' to a L{GitLogParser}, and hand the commits
+    to BATCHCB in lists of up to BATCHSIZE as they are parsed.  Git's output
+    is paused while a batch is being handled.  My C{deferred} fires when the
+    process has finished and every batch has been handled.
+    """
+
+    def __init__(self, batchCb, batchSize, encoding='utf-8'):
+        self.batchCb = batchCb
+        self.batchSize = batchSize
+        self.batch = []
+        self.parser = GitLogParser(self.batch.append, encoding)
+        self.stderr = []
+        self.ended = False
+        self.failed = False
+        self.chain = defer.succeed(None)
+        self.deferred = defer.Deferred()
+
+    def outReceived(self, data):
+        if self.failed:
+            return
+        try:
+            self.parser.feed(data)
+        except:
+            self._fail(failure.Failure())
+            return
+        if len(self.batch) >= self.batchSize:
+            self.transport.pauseProducing()
+            self._submitBatch()
+            self.chain.addCallback(self._resume)
+
+    def errReceived(self, data):
+        self.stderr.append(data)
+
+    def processEnded(self, reason):
+        self.ended = True
+        if not reason.check(error.ProcessDone) and not self.failed:
+            self._fail(failure.Failure(EnvironmentError(
+                'git log failed: %s' % (''.join(self.stderr),))))
+        if not self.failed:
+            try:
+                self.parser.finish()
+            except:
+                self._fail(failure.Failure())
+        if not self.failed:
+            self._submitBatch()
+        self.chain.chainDeferred(self.deferred)
+
+    def _submitBatch(self):
+        batch = self.batch[:]
+        del self.batch[:]
+        if batch:
+            self.chain.addCallback(lambda _ : self.batchCb(batch))
+            self.chain.addErrback(self._batchFailed)
+
+    def _resume(self, _):
+        if not self.ended and not self.failed:
+            self.transport.resumeProducing()
+
+    def _batchFailed(self, f):
+        if not self.failed:
+            self.failed = True
+            if not self.ended:
+                # the output must be read for the process to end
+                try:
+                    self.transport.signalProcess('KILL')
+                except error.ProcessExitedAlready:
+                    pass
+                self.transport.resumeProducing()
+        return f
+
+    def _fail(self, f):
+        self.chain.addCallback(lambda _ : f)
+        self.chain.addErrback(self._batchFailed)
+
+
 class GitPoller(base.PollingChangeSource):
     """This source will poll a remote git repo for changes and submit
     them to the change master."""
     
-    compare_attrs = ["repourl", "branch", "workdir",
+    compare_attrs = ["repourl", "branch", "branches", "workdir",
                      "pollInterval", "gitbin", "usetimestamps",
-                     "category", "project"]
+                     "category", "project", "bulk_log"]
+
+    # number of changes to parse from a bulk 'git log' before submitting them
+    bulk_batch_size = 100
                      
     def __init__(self, repourl, branch='master', 
                  workdir=None, pollInterval=10*60, 
                  gitbin='git', usetimestamps=True,
                  category=None, project=None,
                  pollinterval=-2, fetch_refspec=None,
-                 encoding='utf-8'):
+                 encoding='utf-8', bulk_log=True, branches=None):
         # for backward compatibility; the parameter used to be spelled with 'i'
         if pollinterval != -2:
             pollInterval = pollinterval
@@ -44,6 +196,9 @@ class GitPoller(base.PollingChangeSource):
 
         self.repourl = repourl
         self.branch = branch
+        if isinstance(branches, basestring):
+            branches = [ branches ]
+        self.branches = branches
         self.pollInterval = pollInterval
         self.fetch_refspec = fetch_refspec
         self.encoding = encoding
@@ -52,6 +207,7 @@ class GitPoller(base.PollingChangeSource):
         self.gitbin = gitbin
         self.workdir = workdir
         self.usetimestamps = usetimestamps
+        self.bulk_log = bulk_log
         self.category = category
         self.project = project
         self.changeCount = 0
@@ -72,7 +228,12 @@ class GitPoller(base.PollingChangeSource):
         # initialize the repository we'll use to get changes; note that
         # startService is not an event-driven method, so this method will
         # instead acquire self.initLock immediately when it is called.
-        if not os.path.exists(self.workdir + r'/.git'):
+        if self.branches is not None:
+            # a bare repository
+            exists = os.path.exists(os.path.join(self.workdir, 'HEAD'))
+        else:
+            exists = os.path.exists(self.workdir + r'/.git')
+        if not exists:
             d = self.initRepository()
             d.addErrback(log.err, 'while initializing GitPoller repository')
         else:
@@ -93,15 +254,17 @@ class GitPoller(base.PollingChangeSource):
 
         def git_init(_):
             log.msg('gitpoller: initializing working dir from %s' % self.repourl)
-            d = utils.getProcessOutputAndValue(self.gitbin,
-                    ['init', self.workdir], env=os.environ)
+            args = ['init', self.workdir]
+            if self.branches is not None:
+                args.insert(1, '--bare')
+            d = getProcessOutputAndValue(self.gitbin, args, env=os.environ)
             d.addCallback(self._convert_nonzero_to_failure)
             d.addErrback(self._stop_on_failure)
             return d
         d.addCallback(git_init)
         
         def git_remote_add(_):
-            d = utils.getProcessOutputAndValue(self.gitbin,
+            d = getProcessOutputAndValue(self.gitbin,
                     ['remote', 'add', 'origin', self.repourl],
                     path=self.workdir, env=os.environ)
             d.addCallback(self._convert_nonzero_to_failure)
@@ -112,21 +275,26 @@ class GitPoller(base.PollingChangeSource):
         def git_fetch_origin(_):
             args = ['fetch', 'origin']
             self._extend_with_fetch_refspec(args)
-            d = utils.getProcessOutputAndValue(self.gitbin, args,
+            d = getProcessOutputAndValue(self.gitbin, args,
                     path=self.workdir, env=os.environ)
             d.addCallback(self._convert_nonzero_to_failure)
             d.addErrback(self._stop_on_failure)
             return d
         d.addCallback(git_fetch_origin)
+
+        # a bare repository tracking several branches picks up the revision
+        # of each branch on its first poll
+        if self.branches is not None:
+            return d
         
         def set_master(_):
             log.msg('gitpoller: checking out %s' % self.branch)
             if self.branch == 'master': # repo is already on branch 'master', so reset
-                d = utils.getProcessOutputAndValue(self.gitbin,
+                d = getProcessOutputAndValue(self.gitbin,
                         ['reset', '--hard', 'origin/%s' % self.branch],
                         path=self.workdir, env=os.environ)
             else:
-                d = utils.getProcessOutputAndValue(self.gitbin,
+                d = getProcessOutputAndValue(self.gitbin,
                         ['checkout', '-b', self.branch, 'origin/%s' % self.branch],
                         path=self.workdir, env=os.environ)
             d.addCallback(self._convert_nonzero_to_failure)
@@ -134,7 +302,7 @@ class GitPoller(base.PollingChangeSource):
             return d
         d.addCallback(set_master)
         def get_rev(_):
-            d = utils.getProcessOutputAndValue(self.gitbin,
+            d = getProcessOutputAndValue(self.gitbin,
                     ['rev-parse', self.branch],
                     path=self.workdir, env=os.environ)
             d.addCallback(self._convert_nonzero_to_failure)
@@ -152,8 +320,12 @@ class GitPoller(base.PollingChangeSource):
         status = ""
         if not self.master:
             status = "[STOPPED - check log]"
-        str = 'GitPoller watching the remote git repository %s, branch: %s %s' \
-                % (self.repourl, self.branch, status)
+        if self.branches is not None:
+            branches = 'branches: %s' % (', '.join(self.branches),)
+        else:
+            branches = 'branch: %s' % (self.branch,)
+        str = 'GitPoller watching the remote git repository %s, %s %s' \
+                % (self.repourl, branches, status)
         return str
 
     @deferredLocked('initLock')
@@ -167,7 +339,7 @@ class GitPoller(base.PollingChangeSource):
 
     def _get_commit_comments(self, rev):
         args = ['log', rev, '--no-walk', r'--format=%s%n%b']
-        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
+        d = getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
         def process(git_output):
             stripped_output = git_output.strip().decode(self.encoding)
             if len(stripped_output) == 0:
@@ -179,7 +351,7 @@ class GitPoller(base.PollingChangeSource):
     def _get_commit_timestamp(self, rev):
         # unix timestamp
         args = ['log', rev, '--no-walk', r'--format=%ct']
-        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
+        d = getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
         def process(git_output):
             stripped_output = git_output.strip()
             if self.usetimestamps:
@@ -196,7 +368,7 @@ class GitPoller(base.PollingChangeSource):
 
     def _get_commit_files(self, rev):
         args = ['log', rev, '--name-only', '--no-walk', r'--format=%n']
-        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
+        d = getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
         def process(git_output):
             fileList = git_output.split()
             return fileList
@@ -205,7 +377,7 @@ class GitPoller(base.PollingChangeSource):
             
     def _get_commit_author(self, rev):
         args = ['log', rev, '--no-walk', r'--format=%aN <%aE>']
-        d = utils.getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
+        d = getProcessOutput(self.gitbin, args, path=self.workdir, env=os.environ, errortoo=False )
         def process(git_output):
             stripped_output = git_output.strip().decode(self.encoding)
             if len(stripped_output) == 0:
@@ -227,18 +399,100 @@ class GitPoller(base.PollingChangeSource):
         # about the stderr or stdout from this command. We set errortoo=True to
         # avoid an errback from the deferred. The callback which will be added to this
         # deferred will not use the response.
-        d = utils.getProcessOutput(self.gitbin, args,
+        d = getProcessOutput(self.gitbin, args,
                     path=self.workdir,
                     env=os.environ, errortoo=True )
 
         return d
 
-    @defer.inlineCallbacks
     def _process_changes(self, unused_output):
-        # get the change list
-        revListArgs = ['log', '%s..origin/%s' % (self.branch, self.branch), r'--format=%H']
         self.changeCount = 0
-        results = yield utils.getProcessOutput(self.gitbin, revListArgs,
+        if self.branches is not None:
+            return self._process_branches()
+        return self._process_range(self.branch,
+                '%s..origin/%s' % (self.branch, self.branch))
+
+    def _process_range(self, branch, revrange):
+        if self.bulk_log:
+            return self._process_changes_bulk(branch, revrange)
+        return self._process_changes_by_rev(branch, revrange)
+
+    @defer.inlineCallbacks
+    def _process_branches(self):
+        # in a bare repository, refs/heads/BRANCH is the last revision of
+        # BRANCH for which changes were added; a single for-each-ref finds
+        # all of the branches which have moved since
+        args = ['for-each-ref', '--format=%(objectname) %(refname)',
+                'refs/heads/', 'refs/remotes/origin/']
+        results = yield getProcessOutput(self.gitbin, args,
+                    path=self.workdir, env=os.environ, errortoo=False )
+
+        heads, remotes = {}, {}
+        for line in results.splitlines():
+            rev, ref = line.split(' ', 1)
+            if ref.startswith('refs/heads/'):
+                heads[ref[len('refs/heads/'):]] = rev
+            elif ref.startswith('refs/remotes/origin/'):
+                remotes[ref[len('refs/remotes/origin/'):]] = rev
+        remotes.pop('HEAD', None)
+
+        for branch in sorted(remotes):
+            if not [ p for p in self.branches
+                     if fnmatch.fnmatchcase(branch, p) ]:
+                continue
+            rev = remotes[branch]
+            if heads.get(branch) == rev:
+                continue
+
+            if branch in heads:
+                try:
+                    yield self._process_range(branch,
+                            '%s..%s' % (heads[branch], rev))
+                except:
+                    # try this branch again on the next poll
+                    log.err(None, 'while processing changes on branch %s'
+                                  % (branch,))
+                    continue
+            else:
+                log.msg('gitpoller: tracking new branch %s at %s'
+                        % (branch, rev))
+
+            res = yield getProcessOutputAndValue(self.gitbin,
+                    ['update-ref', 'refs/heads/%s' % (branch,), rev],
+                    path=self.workdir, env=os.environ)
+            self._convert_nonzero_to_failure(res)
+
+    def _process_changes_bulk(self, branch, revrange):
+        # get the metadata for every new revision, oldest first, from a
+        # single 'git log', and add changes as its output is parsed
+        args = ['log', '--reverse', '--name-only', GitLogParser.format,
+                revrange]
+
+        @defer.inlineCallbacks
+        def add_batch(commits):
+            self.changeCount += len(commits)
+            log.msg('gitpoller: processing %d changes in "%s"'
+                    % (len(commits), self.workdir))
+            for commit in commits:
+                timestamp = commit['timestamp']
+                if not self.usetimestamps:
+                    timestamp = None
+                yield self._add_change(branch, commit['revision'], timestamp,
+                        commit['author'], commit['files'], commit['comments'])
+
+        def spawn():
+            pp = GitLogProtocol(add_batch, self.bulk_batch_size,
+                                self.encoding)
+            reactor.spawnProcess(pp, self.gitbin, [ self.gitbin ] + args,
+                    path=self.workdir, env=os.environ)
+            return pp.deferred
+        return _git_semaphore.run(spawn)
+
+    @defer.inlineCallbacks
+    def _process_changes_by_rev(self, branch, revrange):
+        # get the change list
+        revListArgs = ['log', revrange, r'--format=%H']
+        results = yield getProcessOutput(self.gitbin, revListArgs,
                     path=self.workdir, env=os.environ, errortoo=False )
 
         # process oldest change first
@@ -247,7 +501,7 @@ class GitPoller(base.PollingChangeSource):
             return
 
         revList.reverse()
-        self.changeCount = len(revList)
+        self.changeCount += len(revList)
             
         log.msg('gitpoller: processing %d changes: %s in "%s"'
                 % (self.changeCount, revList, self.workdir) )
@@ -269,17 +523,21 @@ class GitPoller(base.PollingChangeSource):
                 raise failures[0]
 
             timestamp, author, files, comments = [ r[1] for r in results ]
-            yield self.master.addChange(
-                   author=author,
-                   revision=rev,
-                   files=files,
-                   comments=comments,
-                   when_timestamp=epoch2datetime(timestamp),
-                   branch=self.branch,
-                   category=self.category,
-                   project=self.project,
-                   repository=self.repourl,
-                   src='git')
+            yield self._add_change(branch, rev, timestamp, author, files,
+                                   comments)
+
+    def _add_change(self, branch, rev, timestamp, author, files, comments):
+        return self.master.addChange(
+               author=author,
+               revision=rev,
+               files=files,
+               comments=comments,
+               when_timestamp=epoch2datetime(timestamp),
+               branch=branch,
+               category=self.category,
+               project=self.project,
+               repository=self.repourl,
+               src='git')
 
     def _process_changes_failure(self, f):
         log.msg('gitpoller: repo poll failed')
@@ -288,12 +546,15 @@ class GitPoller(base.PollingChangeSource):
         return None
         
     def _catch_up(self, res):
+        if self.branches is not None:
+            # each branch is caught up as its changes are processed
+            return
         if self.changeCount == 0:
             log.msg('gitpoller: no changes, no catch_up')
             return
         log.msg('gitpoller: catching up tracking branch')
         args = ['reset', '--hard', 'origin/%s' % (self.branch,)]
-        d = utils.getProcessOutputAndValue(self.gitbin, args, path=self.workdir, env=os.environ)
+        d = getProcessOutputAndValue(self.gitbin, args, path=self.workdir, env=os.environ)
         d.addCallback(self._convert_nonzero_to_failure)
         return d
 
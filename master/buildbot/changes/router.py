@@ -0,0 +1,111 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.python import failure, log
+from buildbot.util import subscription
+from buildbot.changes.filter import ChangeFilter
+
+class ChangeSubscription(subscription.Subscription):
+    def __init__(self, subpt, callback, change_filter, index_key):
+        subscription.Subscription.__init__(self, subpt, callback)
+        self.change_filter = change_filter
+        self.index_key = index_key
+
+class ChangeRouter(subscription.SubscriptionPoint):
+    """
+    I am a L{SubscriptionPoint} for changes.  A subscriber may give a
+    L{ChangeFilter}, and is then only called with the changes which pass it.
+
+    Rather than evaluating every filter for every change, I index the
+    subscriptions by one of the exact-match lists (project, repository,
+    branch or category) in their filters, and only evaluate the filters of
+    subscriptions indexed under the change's values.  Subscriptions whose
+    filters have no such list, or which override C{filter_change}, are
+    evaluated for every change.
+    """
+
+    def __init__(self, name):
+        subscription.SubscriptionPoint.__init__(self, name)
+        # { attribute : { value : set of subscriptions } }
+        self.index = {}
+
+    def subscribe(self, callback, change_filter=None):
+        index_key = self._getIndexKey(change_filter)
+        sub = ChangeSubscription(self, callback, change_filter, index_key)
+        if index_key is None:
+            self.subscriptions.add(sub)
+        else:
+            attr, values = index_key
+            by_value = self.index.setdefault(attr, {})
+            for value in values:
+                by_value.setdefault(value, set()).add(sub)
+        return sub
+
+    def _getIndexKey(self, change_filter):
+        # index by the shortest exact-match list in the filter, if any; a
+        # subclass which overrides filter_change may accept changes its checks
+        # would not, so it is evaluated for every change
+        if not isinstance(change_filter, ChangeFilter):
+            return None
+        if (change_filter.__class__.filter_change.im_func
+                is not ChangeFilter.filter_change.im_func):
+            return None
+        best = None
+        for (filt_list, filt_re, filt_fn, chg_attr) in change_filter.checks:
+            if filt_list is None:
+                continue
+            try:
+                values = frozenset(filt_list)
+            except TypeError:
+                continue # unhashable values
+            if best is None or len(values) < len(best[1]):
+                best = (chg_attr, values)
+        return best
+
+    def deliver(self, change):
+        subs = set(self.subscriptions)
+        for attr, by_value in self.index.iteritems():
+            try:
+                matched = by_value.get(getattr(change, attr, ''))
+            except TypeError:
+                # an unhashable value can't be looked up, so try them all
+                for matched in by_value.itervalues():
+                    subs.update(matched)
+                continue
+            if matched:
+                subs.update(matched)
+
+        for sub in subs:
+            try:
+                if (sub.change_filter and
+                        not sub.change_filter.filter_change(change)):
+                    continue
+                sub.callback(change)
+            except:
+                log.err(failure.Failure(),
+                        'while invoking callback %s to %s' % (sub.callback, self))
+
+    def _unsubscribe(self, sub):
+        if sub.index_key is None:
+            self.subscriptions.remove(sub)
+            return
+        attr, values = sub.index_key
+        by_value = self.index[attr]
+        for value in values:
+            by_value[value].discard(sub)
+            if not by_value[value]:
+                del by_value[value]
+        if not by_value:
+            del self.index[attr]
@@ -66,10 +66,12 @@ class MasterConfig(object):
         self.logCompressionMethod = 'bz2'
         self.logMaxTailSize = None
         self.logMaxSize = None
+        self.buildStatusStore = 'pickle'
         self.properties = properties.Properties()
         self.mergeRequests = None
         self.codebaseGenerator = None
         self.prioritizeBuilders = None
+        self.builderDispatchConcurrency = 1
         self.slavePortnum = None
         self.multiMaster = False
         self.debugPassword = None
@@ -90,6 +92,7 @@ class MasterConfig(object):
             Builds=15,
             Changes=10,
         )
+        self.cacheMaxBytes = {}
         self.schedulers = {}
         self.builders = []
         self.slaves = []
@@ -99,7 +102,8 @@ class MasterConfig(object):
         self.revlink = default_revlink_matcher
 
     _known_config_keys = set([
-        "buildbotURL", "buildCacheSize", "builders", "buildHorizon", "caches",
+        "buildbotURL", "buildCacheSize", "builderDispatchConcurrency",
+        "builders", "buildHorizon", "buildStatusStore", "cacheMaxBytes", "caches",
         "change_source", "codebaseGenerator", "changeCacheSize", "changeHorizon",
         'db', "db_poll_interval", "db_url", "debugPassword", "eventHorizon",
         "logCompressionLimit", "logCompressionMethod", "logHorizon",
@@ -248,14 +252,21 @@ class MasterConfig(object):
 
         if 'logCompressionMethod' in config_dict:
             logCompressionMethod = config_dict.get('logCompressionMethod')
-            if logCompressionMethod not in ('bz2', 'gz'):
-                errors.addError(
-                        "c['logCompressionMethod'] must be 'bz2' or 'gz'")
+            if logCompressionMethod not in ('bz2', 'gz', 'zlib-blocks'):
+                errors.addError("c['logCompressionMethod'] must be 'bz2', "
+                                "'gz' or 'zlib-blocks'")
             self.logCompressionMethod = logCompressionMethod
 
         copy_int_param('logMaxSize')
         copy_int_param('logMaxTailSize')
 
+        if 'buildStatusStore' in config_dict:
+            buildStatusStore = config_dict.get('buildStatusStore')
+            if buildStatusStore not in ('pickle', 'sqlite'):
+                errors.addError("c['buildStatusStore'] must be 'pickle' or "
+                                "'sqlite'")
+            self.buildStatusStore = buildStatusStore
+
         properties = config_dict.get('properties', {})
         if not isinstance(properties, dict):
             errors.addError("c['properties'] must be a dictionary")
@@ -282,6 +293,14 @@ class MasterConfig(object):
         else:
             self.prioritizeBuilders = prioritizeBuilders
 
+        if 'builderDispatchConcurrency' in config_dict:
+            concurrency = config_dict['builderDispatchConcurrency']
+            if not isinstance(concurrency, int) or concurrency < 1:
+                errors.addError(
+                    "c['builderDispatchConcurrency'] must be a positive int")
+            else:
+                self.builderDispatchConcurrency = concurrency
+
         if 'slavePortnum' in config_dict:
             slavePortnum = config_dict.get('slavePortnum')
             if isinstance(slavePortnum, int):
@@ -373,6 +392,18 @@ class MasterConfig(object):
                 errors.addError(msg)
             self.caches['Changes'] = config_dict['changeCacheSize']
 
+        if 'cacheMaxBytes' in config_dict:
+            cacheMaxBytes = config_dict['cacheMaxBytes']
+            if not isinstance(cacheMaxBytes, dict):
+                errors.addError("c['cacheMaxBytes'] must be a dictionary")
+            else:
+                for name, max_bytes in cacheMaxBytes.iteritems():
+                    if (not isinstance(max_bytes, (int, long))
+                            or max_bytes <= 0):
+                        errors.addError("c['cacheMaxBytes'][%r] must be a "
+                                        "positive int" % (name,))
+                self.cacheMaxBytes = cacheMaxBytes
+
 
     def load_schedulers(self, filename, config_dict, errors):
         if 'schedulers' not in config_dict:
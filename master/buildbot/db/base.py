@@ -54,6 +54,15 @@ class DBConnectorComponent(object):
                     % (col, col.type.length, value))
 
 
+def in_batches(ids, size=100):
+    """
+    Split C{ids} into lists of at most C{size} elements, so that they can be
+    used in C{IN} clauses without exhausting the parameter lists supported by
+    the DBAPI.
+    """
+    ids = list(ids)
+    return [ ids[i:i+size] for i in xrange(0, len(ids), size) ]
+
 class CachedMethod(object):
     def __init__(self, cache_name, method):
         self.cache_name = cache_name
@@ -75,5 +84,39 @@ class CachedMethod(object):
         wrap.cache = cache
         return wrap
 
+class CachedManyMethod(CachedMethod):
+    # The wrapped method takes a list of keys and returns a dictionary
+    # mapping each key to its value, omitting nonexistent keys.  The method
+    # as seen by callers returns a list of values, in the same order as the
+    # keys, with None for nonexistent keys.
+
+    def get_cached_method(self, component):
+        meth = self.method
+
+        meth_name = meth.__name__
+        def miss_fn(key):
+            d = meth(component, [ key ])
+            d.addCallback(lambda values : values.get(key))
+            return d
+        def miss_many_fn(keys):
+            return meth(component, keys)
+        cache = component.db.master.caches.get_cache(self.cache_name,
+                miss_fn, miss_many_fn)
+        def wrap(keys, no_cache=0):
+            if no_cache:
+                d = meth(component, keys)
+                d.addCallback(lambda values :
+                        [ values.get(key) for key in keys ])
+                return d
+            return cache.get_many(keys)
+        wrap.__name__ = meth_name + " (wrapped)"
+        wrap.__module__ = meth.__module__
+        wrap.__doc__ = meth.__doc__
+        wrap.cache = cache
+        return wrap
+
 def cached(cache_name):
     return lambda method : CachedMethod(cache_name, method)
+
+def cached_many(cache_name):
+    return lambda method : CachedManyMethod(cache_name, method)
@@ -64,7 +64,7 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
 
     @with_master_objectid
     def getBuildRequests(self, buildername=None, complete=None, claimed=None,
-            bsid=None, _master_objectid=None):
+            bsid=None, after_brid=None, brids=None, _master_objectid=None):
         def thd(conn):
             reqs_tbl = self.db.model.buildrequests
             claims_tbl = self.db.model.buildrequest_claims
@@ -90,35 +90,118 @@ class BuildRequestsConnectorComponent(base.DBConnectorComponent):
                     q = q.where(reqs_tbl.c.complete == 0)
             if bsid is not None:
                 q = q.where(reqs_tbl.c.buildsetid == bsid)
-            res = conn.execute(q)
+            if after_brid is not None:
+                q = q.where(reqs_tbl.c.id > after_brid)
+
+            if brids is None:
+                queries = [ q ]
+            else:
+                queries = [ q.where(reqs_tbl.c.id.in_(batch))
+                            for batch in base.in_batches(brids) ]
+            rv = []
+            for q in queries:
+                res = conn.execute(q)
+                rv.extend([ self._brdictFromRow(row, _master_objectid)
+                            for row in res.fetchall() ])
+            return rv
+        return self.db.pool.do(thd)
 
-            return [ self._brdictFromRow(row, _master_objectid)
-                     for row in res.fetchall() ]
+    def getLatestBrid(self):
+        def thd(conn):
+            reqs_tbl = self.db.model.buildrequests
+            q = sa.select([ reqs_tbl.c.id ],
+                    order_by=sa.desc(reqs_tbl.c.id),
+                    limit=1)
+            return conn.scalar(q)
         return self.db.pool.do(thd)
 
-    @with_master_objectid
-    def claimBuildRequests(self, brids, claimed_at=None, _reactor=reactor,
-                            _master_objectid=None):
+    def _claimThd(self, conn, brids, claimed_at, objectid, _reactor):
+        # This method must be run in a db.pool thread.  It claims the given
+        # brids in a new transaction, which it returns for the caller to
+        # commit, or rolls back and raises AlreadyClaimedError.
         if claimed_at is not None:
             claimed_at = datetime2epoch(claimed_at)
         else:
             claimed_at = _reactor.seconds()
 
+        transaction = conn.begin()
+        tbl = self.db.model.buildrequest_claims
+        try:
+            q = tbl.insert()
+            conn.execute(q, [ dict(brid=id, objectid=objectid,
+                                claimed_at=claimed_at)
+                              for id in brids ])
+        except (sa.exc.IntegrityError, sa.exc.ProgrammingError):
+            transaction.rollback()
+            raise AlreadyClaimedError
+        return transaction
+
+    @with_master_objectid
+    def claimBuildRequests(self, brids, claimed_at=None, _reactor=reactor,
+                            _master_objectid=None):
         def thd(conn):
-            transaction = conn.begin()
-            tbl = self.db.model.buildrequest_claims
+            transaction = self._claimThd(conn, brids, claimed_at,
+                                         _master_objectid, _reactor)
+            transaction.commit()
+        return self.db.pool.do(thd)
 
+    @with_master_objectid
+    def claimAndFetch(self, brids, claimed_at=None, _reactor=reactor,
+                      _master_objectid=None):
+        def thd(conn):
+            transaction = self._claimThd(conn, brids, claimed_at,
+                                         _master_objectid, _reactor)
+
+            # fetch everything needed to construct BuildRequest objects in the
+            # same transaction, with a batch of queries for each table
             try:
-                q = tbl.insert()
-                conn.execute(q, [ dict(brid=id, objectid=_master_objectid,
-                                    claimed_at=claimed_at)
-                                  for id in brids ])
-            except (sa.exc.IntegrityError, sa.exc.ProgrammingError):
+                reqs_tbl = self.db.model.buildrequests
+                tbl = self.db.model.buildrequest_claims
+                brdicts = {}
+                for batch in base.in_batches(brids):
+                    res = conn.execute(sa.select([
+                        reqs_tbl.outerjoin(tbl, (reqs_tbl.c.id == tbl.c.brid)) ],
+                        whereclause=reqs_tbl.c.id.in_(batch)))
+                    for row in res.fetchall():
+                        brdicts[row.id] = self._brdictFromRow(row,
+                                                        _master_objectid)
+
+                bsids = set([ brdict['buildsetid']
+                              for brdict in brdicts.itervalues() ])
+                bsdicts = self.db.buildsets._getBuildsetsThd(conn, bsids)
+                bsprops = self.db.buildsets._getBuildsetPropertiesThd(conn,
+                                                                      bsids)
+                sslists = self.db.sourcestamps._getSourceStampsThd(conn,
+                            set([ bsdict['sourcestampsetid']
+                                  for bsdict in bsdicts.itervalues() ]))
+                changeids = set()
+                for sslist in sslists.itervalues():
+                    for ssdict in sslist:
+                        changeids.update(ssdict['changeids'])
+                chdicts = self.db.changes._getChangesThd(conn, changeids)
+            except:
                 transaction.rollback()
-                raise AlreadyClaimedError
+                raise
 
             transaction.commit()
 
+            rv = []
+            for brid in brids:
+                brdict = brdicts.get(brid)
+                if not brdict:
+                    continue
+                bsdict = bsdicts[brdict['buildsetid']]
+                sslist = sslists.get(bsdict['sourcestampsetid'], [])
+                for ssdict in sslist:
+                    ssdict['chdicts'] = [ chdicts[changeid]
+                            for changeid in sorted(ssdict['changeids'])
+                            if changeid in chdicts ]
+                brdict['buildset'] = bsdict
+                brdict['buildset_properties'] = \
+                        bsprops.get(brdict['buildsetid'], {})
+                brdict['sourcestamps'] = sslist
+                rv.append(brdict)
+            return rv
         return self.db.pool.do(thd)
 
     @with_master_objectid
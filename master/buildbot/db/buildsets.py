@@ -26,6 +26,9 @@ from buildbot.util import epoch2datetime, datetime2epoch
 class BsDict(dict):
     pass
 
+class BsProps(dict):
+    pass
+
 class BuildsetsConnectorComponent(base.DBConnectorComponent):
     # Documentation is in developer/database.rst
 
@@ -119,8 +122,13 @@ class BuildsetsConnectorComponent(base.DBConnectorComponent):
             return self._row2dict(row)
         return self.db.pool.do(thd)
 
-    def getBuildsets(self, complete=None):
+    def getBuildsets(self, complete=None, bsids=None):
         def thd(conn):
+            if bsids is not None:
+                bsdicts = self._getBuildsetsThd(conn, bsids)
+                return [ bsdicts[bsid] for bsid in bsids
+                         if bsid in bsdicts and (complete is None
+                            or bsdicts[bsid]['complete'] == bool(complete)) ]
             bs_tbl = self.db.model.buildsets
             q = bs_tbl.select()
             if complete is not None:
@@ -133,6 +141,7 @@ class BuildsetsConnectorComponent(base.DBConnectorComponent):
             return [ self._row2dict(row) for row in res.fetchall() ]
         return self.db.pool.do(thd)
 
+    @base.cached("bsprops")
     def getBuildsetProperties(self, buildsetid):
         """
         Return the properties for a buildset, in the same format they were
@@ -147,20 +156,58 @@ class BuildsetsConnectorComponent(base.DBConnectorComponent):
         Deferred
         """
         def thd(conn):
-            bsp_tbl = self.db.model.buildset_properties
+            return self._getBuildsetPropertiesThd(conn,
+                                    [buildsetid]).get(buildsetid, BsProps())
+        return self.db.pool.do(thd)
+
+    @base.cached_many("bsprops")
+    def getManyBuildsetProperties(self, buildsetids):
+        """
+        Return the properties for several buildsets, as a list in the same
+        order as C{buildsetids}, with each element as returned by
+        L{getBuildsetProperties}.
+
+        @param buildsetids: buildset IDs
+
+        @returns: list of dictionaries, via Deferred
+        """
+        def thd(conn):
+            bsprops = self._getBuildsetPropertiesThd(conn, buildsetids)
+            return dict((bsid, bsprops.get(bsid, BsProps()))
+                        for bsid in buildsetids)
+        return self.db.pool.do(thd)
+
+    def _getBuildsetsThd(self, conn, bsids):
+        # This method must be run in a db.pool thread, and returns a
+        # dictionary mapping bsid to bsdict for the given bsids.
+        bs_tbl = self.db.model.buildsets
+        rv = {}
+        for batch in base.in_batches(bsids):
+            q = bs_tbl.select(whereclause=bs_tbl.c.id.in_(batch))
+            for row in conn.execute(q).fetchall():
+                rv[row.id] = self._row2dict(row)
+        return rv
+
+    def _getBuildsetPropertiesThd(self, conn, bsids):
+        # This method must be run in a db.pool thread, and returns a
+        # dictionary mapping bsid to a properties dictionary, as returned by
+        # getBuildsetProperties, for each of the given bsids that has
+        # properties.
+        bsp_tbl = self.db.model.buildset_properties
+        rv = {}
+        for batch in base.in_batches(bsids):
             q = sa.select(
-                [ bsp_tbl.c.property_name, bsp_tbl.c.property_value ],
-                whereclause=(bsp_tbl.c.buildsetid == buildsetid))
-            l = []
+                [ bsp_tbl.c.buildsetid, bsp_tbl.c.property_name,
+                  bsp_tbl.c.property_value ],
+                whereclause=bsp_tbl.c.buildsetid.in_(batch))
             for row in conn.execute(q):
                 try:
                     properties = json.loads(row.property_value)
-                    l.append((row.property_name,
-                           tuple(properties)))
+                    bsprops = rv.setdefault(row.buildsetid, BsProps())
+                    bsprops[row.property_name] = tuple(properties)
                 except ValueError:
                     pass
-            return dict(l)
-        return self.db.pool.do(thd)
+        return rv
 
     def _row2dict(self, row):
         def mkdt(epoch):
@@ -126,6 +126,25 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         d = self.db.pool.do(thd)
         return d
 
+    @base.cached_many("chdicts")
+    def getChanges(self, changeids):
+        def thd(conn):
+            return self._getChangesThd(conn, changeids)
+        d = self.db.pool.do(thd)
+        return d
+
+    def getChangesSince(self, changeid, limit=None):
+        def thd(conn):
+            changes_tbl = self.db.model.changes
+            q = changes_tbl.select(
+                    whereclause=(changes_tbl.c.changeid > changeid),
+                    order_by=[changes_tbl.c.changeid],
+                    limit=limit)
+            rows = conn.execute(q).fetchall()
+            return self._chdicts_from_change_rows_thd(conn, rows)
+        d = self.db.pool.do(thd)
+        return d
+
     def getChangeUids(self, changeid):
         assert changeid >= 0
         def thd(conn):
@@ -152,10 +171,7 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
         d = self.db.pool.do(thd)
 
         # then turn those into changes, using the cache
-        def get_changes(changeids):
-            return defer.gatherResults([ self.getChange(changeid)
-                                         for changeid in changeids ])
-        d.addCallback(get_changes)
+        d.addCallback(self.getChanges)
         return d
 
     def getLatestChangeid(self):
@@ -204,10 +220,36 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
     def _chdict_from_change_row_thd(self, conn, ch_row):
         # This method must be run in a db.pool thread, and returns a chdict
         # given a row from the 'changes' table
+        return self._chdicts_from_change_rows_thd(conn, [ch_row])[0]
+
+    def _getChangesThd(self, conn, changeids):
+        # This method must be run in a db.pool thread, and returns a
+        # dictionary mapping changeid to chdict for the given changeids.
+        # Nonexistent changes are omitted.
+        changes_tbl = self.db.model.changes
+        rows = []
+        for batch in base.in_batches(changeids):
+            q = changes_tbl.select(
+                    whereclause=changes_tbl.c.changeid.in_(batch))
+            rows.extend(conn.execute(q).fetchall())
+        return dict((chdict['changeid'], chdict) for chdict in
+                    self._chdicts_from_change_rows_thd(conn, rows))
+
+    def _chdicts_from_change_rows_thd(self, conn, ch_rows):
+        # This method must be run in a db.pool thread, and returns a list of
+        # chdicts given a list of rows from the 'changes' table.  The files
+        # and properties for all of the rows are fetched with one query each,
+        # selecting the range of changeids spanned by the rows, or, if the
+        # changeids are sparse, with batches of IN queries.
         change_files_tbl = self.db.model.change_files
         change_properties_tbl = self.db.model.change_properties
 
-        chdict = ChDict(
+        if not ch_rows:
+            return []
+
+        chdicts = {}
+        for ch_row in ch_rows:
+            chdicts[ch_row.changeid] = ChDict(
                 changeid=ch_row.changeid,
                 author=ch_row.author,
                 files=[], # see below
@@ -223,11 +265,22 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
                 codebase=ch_row.codebase,
                 project=ch_row.project)
 
-        query = change_files_tbl.select(
-                whereclause=(change_files_tbl.c.changeid == ch_row.changeid))
-        rows = conn.execute(query)
+        def select_rows(tbl):
+            if max(chdicts) - min(chdicts) < 2 * len(chdicts):
+                query = tbl.select(whereclause=sa.and_(
+                    tbl.c.changeid >= min(chdicts),
+                    tbl.c.changeid <= max(chdicts)))
+                return conn.execute(query).fetchall()
+            rows = []
+            for batch in base.in_batches(chdicts):
+                query = tbl.select(whereclause=tbl.c.changeid.in_(batch))
+                rows.extend(conn.execute(query).fetchall())
+            return rows
+
+        rows = select_rows(change_files_tbl)
         for r in rows:
-            chdict['files'].append(r.filename)
+            if r.changeid in chdicts:
+                chdicts[r.changeid]['files'].append(r.filename)
 
         # and properties must be given without a source, so strip that, but
         # be flexible in case users have used a development version where the
@@ -241,14 +294,14 @@ class ChangesConnectorComponent(base.DBConnectorComponent):
                 v,s = vs, "Change"
             return v, s
 
-        query = change_properties_tbl.select(
-                whereclause=(change_properties_tbl.c.changeid == ch_row.changeid))
-        rows = conn.execute(query)
+        rows = select_rows(change_properties_tbl)
         for r in rows:
+            if r.changeid not in chdicts:
+                continue
             try:
                 v, s = split_vs(json.loads(r.property_value))
-                chdict['properties'][r.property_name] = (v,s)
+                chdicts[r.changeid]['properties'][r.property_name] = (v,s)
             except ValueError:
                 pass
 
-        return chdict
+        return [ chdicts[ch_row.changeid] for ch_row in ch_rows ]
@@ -21,6 +21,7 @@ from buildbot import config
 from buildbot.db import enginestrategy
 from buildbot.db import pool, model, changes, schedulers, sourcestamps, sourcestampsets
 from buildbot.db import state, buildsets, buildrequests, builds, users
+from buildbot.db import invalidations
 
 class DatabaseNotReadyError(Exception):
     pass
@@ -53,6 +54,10 @@ class DBConnector(config.ReconfigurableServiceMixin, service.MultiService):
     # periodic cleanup actions on this schedule.
     CLEANUP_PERIOD = 3600
 
+    # Age, in seconds, after which cache invalidations are deleted.  Every
+    # master polls for invalidations much more often than this.
+    INVALIDATION_HORIZON = 3600
+
     def __init__(self, master, basedir):
         service.MultiService.__init__(self)
         self.setName('db')
@@ -76,6 +81,8 @@ class DBConnector(config.ReconfigurableServiceMixin, service.MultiService):
         self.state = state.StateConnectorComponent(self)
         self.builds = builds.BuildsConnectorComponent(self)
         self.users = users.UsersConnectorComponent(self)
+        self.invalidations = \
+                invalidations.InvalidationsConnectorComponent(self)
 
         self.cleanup_timer = internet.TimerService(self.CLEANUP_PERIOD,
                 self._doCleanup)
@@ -127,4 +134,10 @@ class DBConnector(config.ReconfigurableServiceMixin, service.MultiService):
 
         d = self.changes.pruneChanges(self.master.config.changeHorizon)
         d.addErrback(log.err, 'while pruning changes')
+
+        # cache invalidations are only recorded by multi-master configurations
+        if self.master.config.multiMaster:
+            d.addCallback(lambda _ : self.invalidations.pruneInvalidations(
+                                            self.INVALIDATION_HORIZON))
+            d.addErrback(log.err, 'while pruning cache invalidations')
         return d
@@ -0,0 +1,75 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+"""
+Support for sharing cache invalidations between masters
+"""
+
+import sqlalchemy as sa
+from twisted.internet import reactor
+from buildbot.db import base
+from buildbot.util import json, epoch2datetime
+
+class InvDict(dict):
+    pass
+
+class InvalidationsConnectorComponent(base.DBConnectorComponent):
+    # Documentation is in developer/database.rst
+
+    def addInvalidations(self, cache_name, keys, objectid=None,
+                         _reactor=reactor):
+        def thd(conn):
+            tbl = self.db.model.cache_invalidations
+            created_at = _reactor.seconds()
+            conn.execute(tbl.insert(), [
+                dict(cache_name=cache_name, cache_key_json=json.dumps(key),
+                     objectid=objectid, created_at=created_at)
+                for key in keys ])
+        return self.db.pool.do(thd)
+
+    def getInvalidationsSince(self, invalidationid, limit=None):
+        def thd(conn):
+            tbl = self.db.model.cache_invalidations
+            q = tbl.select(whereclause=(tbl.c.id > invalidationid),
+                           order_by=[tbl.c.id], limit=limit)
+            return [ self._row2dict(row) for row in conn.execute(q) ]
+        return self.db.pool.do(thd)
+
+    def getLatestInvalidationId(self):
+        def thd(conn):
+            tbl = self.db.model.cache_invalidations
+            q = sa.select([ tbl.c.id ], order_by=sa.desc(tbl.c.id), limit=1)
+            return conn.scalar(q)
+        return self.db.pool.do(thd)
+
+    def pruneInvalidations(self, horizon, _reactor=reactor):
+        """
+        Called periodically by DBConnector, this method deletes invalidations
+        that are more than C{horizon} seconds old.
+        """
+        def thd(conn):
+            tbl = self.db.model.cache_invalidations
+            conn.execute(tbl.delete(
+                tbl.c.created_at < _reactor.seconds() - horizon))
+        return self.db.pool.do(thd)
+
+    def _row2dict(self, row):
+        key = json.loads(row.cache_key_json)
+        # JSON has no tuples, but cache keys must be hashable
+        if isinstance(key, list):
+            key = tuple(key)
+        return InvDict(invalidationid=row.id, cache_name=row.cache_name,
+                key=key, objectid=row.objectid,
+                created_at=epoch2datetime(row.created_at))
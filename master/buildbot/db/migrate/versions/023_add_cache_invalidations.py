@@ -0,0 +1,34 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+
+def upgrade(migrate_engine):
+
+    metadata = sa.MetaData()
+    metadata.bind = migrate_engine
+
+    cache_invalidations = sa.Table('cache_invalidations', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('cache_name', sa.String(length=256), nullable=False),
+        sa.Column('cache_key_json', sa.Text, nullable=False),
+        sa.Column('objectid', sa.Integer),
+        sa.Column('created_at', sa.Integer, nullable=False),
+    )
+    cache_invalidations.create()
+
+    idx = sa.Index('cache_invalidations_created_at',
+            cache_invalidations.c.created_at)
+    idx.create()
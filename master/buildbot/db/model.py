@@ -351,6 +351,26 @@ class Model(base.DBConnectorComponent):
         sa.Column("attr_data", sa.String(128), nullable=False),
     )
 
+    # cache invalidations
+
+    # This table records changes to rows that masters may have cached, so
+    # that the other masters in a multi-master configuration can evict the
+    # stale values from their caches.
+    cache_invalidations = sa.Table("cache_invalidations", metadata,
+        sa.Column("id", sa.Integer, primary_key=True),
+
+        # name of the cache, and the key within it, as a JSON string
+        sa.Column("cache_name", sa.String(256), nullable=False),
+        sa.Column("cache_key_json", sa.Text, nullable=False),
+
+        # the master that made the change (not a foreign key, as this row
+        # is advisory and short-lived)
+        sa.Column("objectid", sa.Integer),
+
+        # time of the invalidation, for pruning
+        sa.Column("created_at", sa.Integer, nullable=False),
+    )
+
 
     # indexes
 
@@ -390,6 +410,8 @@ class Model(base.DBConnectorComponent):
             unique=True)
     sa.Index('name_per_object', object_state.c.objectid, object_state.c.name,
             unique=True)
+    sa.Index('cache_invalidations_created_at',
+            cache_invalidations.c.created_at)
 
     # MySQl creates indexes for foreign keys, and these appear in the
     # reflection.  This is a list of (table, index) names that should be
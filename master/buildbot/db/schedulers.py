@@ -74,3 +74,17 @@ class SchedulersConnectorComponent(base.DBConnectorComponent):
             return dict([ (r.changeid, [False,True][r.important])
                           for r in conn.execute(q) ])
         return self.db.pool.do(thd)
+
+    def getAllChangeClassifications(self, objectids):
+        def thd(conn):
+            sch_ch_tbl = self.db.model.scheduler_changes
+            rv = dict((objectid, {}) for objectid in objectids)
+            for batch in base.in_batches(objectids):
+                q = sa.select(
+                    [ sch_ch_tbl.c.objectid, sch_ch_tbl.c.changeid,
+                      sch_ch_tbl.c.important ],
+                    whereclause=sch_ch_tbl.c.objectid.in_(batch))
+                for r in conn.execute(q):
+                    rv[r.objectid][r.changeid] = [False,True][r.important]
+            return rv
+        return self.db.pool.do(thd)
@@ -14,8 +14,6 @@
 # Copyright Buildbot Team Members
 
 import base64
-import sqlalchemy as sa
-from twisted.internet import defer
 from twisted.python import log
 from buildbot.db import base
 
@@ -78,23 +76,20 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
         return self.db.pool.do(thd)
 
     @base.cached("sssetdicts")
-    @defer.inlineCallbacks
     def getSourceStamps(self,sourcestampsetid):
-        def getSourceStampIds(sourcestampsetid):
-            def thd(conn):
-                tbl = self.db.model.sourcestamps
-                q = sa.select([tbl.c.id],
-                       whereclause=(tbl.c.sourcestampsetid == sourcestampsetid))
-                res = conn.execute(q)
-                return [ row.id for row in res.fetchall() ]
-            return self.db.pool.do(thd)
-        ssids = yield getSourceStampIds(sourcestampsetid)
+        def thd(conn):
+            sslists = self._getSourceStampsThd(conn, [ sourcestampsetid ])
+            return sslists.get(sourcestampsetid, SsList())
+        return self.db.pool.do(thd)
 
-        sslist=SsList()
-        for ssid in ssids:
-            sourcestamp = yield self.getSourceStamp(ssid)
-            sslist.append(sourcestamp)
-        defer.returnValue(sslist)
+    @base.cached_many("sssetdicts")
+    def getSourceStampSets(self, sourcestampsetids):
+        def thd(conn):
+            sslists = self._getSourceStampsThd(conn, sourcestampsetids)
+            # like getSourceStamps, return an empty list for empty sets
+            return dict((setid, sslists.get(setid, SsList()))
+                        for setid in sourcestampsetids)
+        return self.db.pool.do(thd)
 
     @base.cached("ssdicts")
     def getSourceStamp(self, ssid):
@@ -105,12 +100,7 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
             row = res.fetchone()
             if not row:
                 return None
-            ssdict = SsDict(ssid=ssid, branch=row.branch, sourcestampsetid=row.sourcestampsetid,
-                    revision=row.revision, patch_body=None, patch_level=None,
-                    patch_author=None, patch_comment=None, patch_subdir=None,
-                    repository=row.repository, codebase=row.codebase,
-                    project=row.project,
-                    changeids=set([]))
+            ssdict = self._ssdictFromRow(row)
             patchid = row.patchid
             res.close()
 
@@ -121,13 +111,7 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
                 res = conn.execute(q)
                 row = res.fetchone()
                 if row:
-                    # note the subtle renaming here
-                    ssdict['patch_level'] = row.patchlevel
-                    ssdict['patch_subdir'] = row.subdir
-                    ssdict['patch_author'] = row.patch_author
-                    ssdict['patch_comment'] = row.patch_comment
-                    body = base64.b64decode(row.patch_base64)
-                    ssdict['patch_body'] = body
+                    self._addPatch(ssdict, row)
                 else:
                     log.msg('patchid %d, referenced from ssid %d, not found'
                             % (patchid, ssid))
@@ -143,3 +127,56 @@ class SourceStampsConnectorComponent(base.DBConnectorComponent):
 
             return ssdict
         return self.db.pool.do(thd)
+
+    def _getSourceStampsThd(self, conn, sourcestampsetids):
+        # This method must be run in a db.pool thread, and returns a
+        # dictionary mapping sourcestampsetid to an SsList of the ssdicts in
+        # that set, for the given sourcestampsetids.  Patches and change ids
+        # are fetched with one batch of queries for all of the sourcestamps.
+        ss_tbl = self.db.model.sourcestamps
+        ssdicts = {}
+        patchids = {}
+        for batch in base.in_batches(sourcestampsetids):
+            q = ss_tbl.select(
+                    whereclause=ss_tbl.c.sourcestampsetid.in_(batch),
+                    order_by=[ss_tbl.c.id])
+            for row in conn.execute(q).fetchall():
+                ssdicts[row.id] = self._ssdictFromRow(row)
+                if row.patchid is not None:
+                    patchids[row.patchid] = row.id
+
+        patches_tbl = self.db.model.patches
+        for batch in base.in_batches(patchids):
+            q = patches_tbl.select(whereclause=patches_tbl.c.id.in_(batch))
+            for row in conn.execute(q).fetchall():
+                self._addPatch(ssdicts[patchids[row.id]], row)
+
+        ssc_tbl = self.db.model.sourcestamp_changes
+        for batch in base.in_batches(ssdicts):
+            q = ssc_tbl.select(whereclause=ssc_tbl.c.sourcestampid.in_(batch))
+            for row in conn.execute(q).fetchall():
+                ssdicts[row.sourcestampid]['changeids'].add(row.changeid)
+
+        rv = {}
+        for ssid in sorted(ssdicts):
+            ssdict = ssdicts[ssid]
+            rv.setdefault(ssdict['sourcestampsetid'], SsList()).append(ssdict)
+        return rv
+
+    def _ssdictFromRow(self, row):
+        return SsDict(ssid=row.id, branch=row.branch,
+                sourcestampsetid=row.sourcestampsetid,
+                revision=row.revision, patch_body=None, patch_level=None,
+                patch_author=None, patch_comment=None, patch_subdir=None,
+                repository=row.repository, codebase=row.codebase,
+                project=row.project,
+                changeids=set([]))
+
+    def _addPatch(self, ssdict, row):
+        # note the subtle renaming here
+        ssdict['patch_level'] = row.patchlevel
+        ssdict['patch_subdir'] = row.subdir
+        ssdict['patch_author'] = row.patch_author
+        ssdict['patch_comment'] = row.patch_comment
+        body = base64.b64decode(row.patch_base64)
+        ssdict['patch_body'] = body
@@ -205,6 +205,7 @@ class UsersConnectorComponent(base.DBConnectorComponent):
 
             transaction.commit()
         d = self.db.pool.do(thd)
+        d.addCallback(lambda _ : self._invalidate(uid))
         return d
 
     def removeUser(self, uid):
@@ -217,8 +218,13 @@ class UsersConnectorComponent(base.DBConnectorComponent):
                     ]:
                 conn.execute(tbl.delete(whereclause=(tbl.c.uid==uid)))
         d = self.db.pool.do(thd)
+        d.addCallback(lambda _ : self._invalidate(uid))
         return d
 
+    def _invalidate(self, uid):
+        # the cached usdict for this user, here and in other masters, is stale
+        return self.db.master.caches.invalidate('usdicts', [uid])
+
     def identifierToUid(self, identifier):
         def thd(conn):
             tbl = self.db.model.users
@@ -77,6 +77,13 @@ class ISourceStamp(Interface):
         Can this SourceStamp be merged with OTHER?
         """
 
+    def getMergeKey(self):
+        """
+        Return a hashable key such that two SourceStamps with equal keys can
+        be merged, or None if this SourceStamp cannot be merged with any
+        other.  This gives the same answers as L{canBeMergedWith}.
+        """
+
     def mergeWith(self, others):
         """Generate a SourceStamp for the merger of me and all the other
         SourceStamps. This is called by a Build when it starts, to figure
@@ -395,6 +402,16 @@ class IBuilderStatus(Interface):
                            of builds that will be examined.
         """
 
+    def generateFinishedBuildSummaries(branches=[],
+                                       num_builds=None,
+                                       max_buildnum=None, finished_before=None,
+                                       max_search=200,
+                                       ):
+        """Like generateFinishedBuilds, but produce dictionaries summarizing
+        each build instead of IBuildStatus objects, without loading the
+        builds.  The dictionaries have keys 'number', 'start', 'finish',
+        'results', 'branch', 'revision' and 'slavename'."""
+
     def subscribe(receiver):
         """Register an IStatusReceiver to receive new status events. The
         receiver will be given builderChangedState, buildStarted, and
@@ -798,20 +815,32 @@ class IStatusLog(Interface):
         """Return one big string with the contents of the Log. This merges
         all non-header chunks together."""
 
-    def readlines(channel=LOG_CHANNEL_STDOUT):
-        """Read lines from one channel of the logfile. This returns an
+    def readlines(start_line=None, end_line=None):
+        """Read lines from the stdout channel of the logfile. This returns an
         iterator that will provide single lines of text (including the
-        trailing newline).
+        trailing newline).  If C{start_line} or C{end_line} are given, only
+        that range of lines is read, as for C{getChunks}.
         """
 
     def getTextWithHeaders():
         """Return one big string with the contents of the Log. This merges
         all chunks (including headers) together."""
 
-    def getChunks():
+    def getLineCount():
+        """Return the number of lines in the Log, counting all channels and
+        including a final line without a trailing newline."""
+
+    def getChunks(channels=[], onlyText=False, start_line=None,
+                  end_line=None):
         """Generate a list of (channel, text) tuples. 'channel' is a number,
         0 for stdout, 1 for stderr, 2 for header. (note that stderr is merged
-        into stdout if PTYs are in use)."""
+        into stdout if PTYs are in use).  If C{channels} is given, only
+        chunks for those channels are generated; if C{onlyText} is true,
+        only the text of each chunk is generated.
+
+        If C{start_line} or C{end_line} are given, only the text of lines
+        C{start_line} (inclusive) through C{end_line} (exclusive) is
+        generated.  Lines are numbered from zero, counting all channels."""
 
 class IStatusLogConsumer(Interface):
     """I am an object which can be passed to IStatusLog.subscribeConsumer().
@@ -27,7 +27,7 @@ import buildbot
 import buildbot.pbmanager
 from buildbot.util import subscription, epoch2datetime
 from buildbot.status.master import Status
-from buildbot.changes import changes
+from buildbot.changes import changes, router
 from buildbot.changes.manager import ChangeManager
 from buildbot import interfaces
 from buildbot.process.builder import BuilderControl
@@ -65,6 +65,17 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
     # database poll operation.
     WARNING_UNCLAIMED_COUNT = 10000
 
+    # frequency with which to re-read all unclaimed build requests, rather
+    # than just those added since the last poll; this catches requests that
+    # were unclaimed again, e.g., by another master
+    UNCLAIMED_RESCAN_INTERVAL = 5*60
+
+    # number of brids below the highest brid seen so far that are re-read on
+    # each poll between rescans; this catches requests whose transactions
+    # committed out of brid order, and recent requests that were unclaimed
+    # again
+    UNCLAIMED_POLL_LOOKBACK = 1000
+
     def __init__(self, basedir, configFileName="master.cfg", umask=None):
         service.MultiService.__init__(self)
         self.setName("buildmaster")
@@ -93,7 +104,7 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
 
         # subscription points
         self._change_subs = \
-                subscription.SubscriptionPoint("changes")
+                router.ChangeRouter("changes")
         self._new_buildrequest_subs = \
                 subscription.SubscriptionPoint("buildrequest_additions")
         self._new_buildset_subs = \
@@ -112,7 +123,7 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
         self.metrics = metrics.MetricLogObserver()
         self.metrics.setServiceParent(self)
 
-        self.caches = cache.CacheManager()
+        self.caches = cache.CacheManager(self)
         self.caches.setServiceParent(self)
 
         self.pbmanager = buildbot.pbmanager.PBManager()
@@ -492,14 +503,15 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
         d.addCallback(notify)
         return d
 
-    def subscribeToChanges(self, callback):
+    def subscribeToChanges(self, callback, change_filter=None):
         """
         Request that C{callback} be called with each Change object added to the
-        cluster.
+        cluster.  If C{change_filter} is given, only changes which pass that
+        L{buildbot.changes.filter.ChangeFilter} are delivered.
 
         Note: this method will go away in 0.9.x
         """
-        return self._change_subs.subscribe(callback)
+        return self._change_subs.subscribe(callback, change_filter)
 
     def addBuildset(self, **kwargs):
         """
@@ -616,12 +628,14 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
         d = defer.gatherResults([
             self.pollDatabaseChanges(),
             self.pollDatabaseBuildRequests(),
+            self.pollDatabaseCacheInvalidations(),
             # also unclaim
         ])
         d.addErrback(log.err, 'while polling database')
         return d
 
     _last_processed_change = None
+    change_poll_batch_size = 500
     @defer.inlineCallbacks
     def pollDatabaseChanges(self):
         # Older versions of Buildbot had each scheduler polling the database
@@ -658,21 +672,31 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
             timer.stop()
             return
 
+        # fetch new changes in batches, delivering them in order
         while True:
-            changeid = self._last_processed_change + 1
-            chdict = yield self.db.changes.getChange(changeid)
+            chdicts = yield self.db.changes.getChangesSince(
+                    self._last_processed_change,
+                    limit=self.change_poll_batch_size)
 
-            # if there's no such change, we've reached the end and can
-            # stop polling
-            if not chdict:
-                break
+            for chdict in chdicts:
+                # if there's a gap in the changeids, stop polling there; the
+                # missing change may not have been committed yet
+                changeid = chdict['changeid']
+                if changeid != self._last_processed_change + 1:
+                    chdicts = []
+                    break
 
-            change = yield changes.Change.fromChdict(self, chdict)
+                change = yield changes.Change.fromChdict(self, chdict)
 
-            self._change_subs.deliver(change)
+                self._change_subs.deliver(change)
 
-            self._last_processed_change = changeid
-            need_setState = True
+                self._last_processed_change = changeid
+                need_setState = True
+
+            # if that was less than a full batch, we've reached the end and
+            # can stop polling
+            if len(chdicts) < self.change_poll_batch_size:
+                break
 
         # write back the updated state, if it's changed
         if need_setState:
@@ -680,7 +704,48 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
                             self._last_processed_change)
         timer.stop()
 
+    _last_processed_invalidation = None
+    invalidation_poll_batch_size = 500
+    @defer.inlineCallbacks
+    def pollDatabaseCacheInvalidations(self):
+        # Other masters record the cache keys whose database rows they have
+        # modified; evict those keys from this master's caches.  Invalidations
+        # made by this master have already been applied locally.
+        timer = metrics.Timer("BuildMaster.pollDatabaseCacheInvalidations()")
+        timer.start()
+
+        # on the first poll, anything cached so far may predate invalidations
+        # we will never see, so start afresh from the latest invalidation
+        if self._last_processed_invalidation is None:
+            lpi = yield self.db.invalidations.getLatestInvalidationId()
+            self._last_processed_invalidation = lpi or 0
+            self.caches.clear()
+            timer.stop()
+            return
+
+        objectid = yield self.getObjectId()
+        rows = 0
+        while True:
+            invdicts = yield self.db.invalidations.getInvalidationsSince(
+                    self._last_processed_invalidation,
+                    limit=self.invalidation_poll_batch_size)
+
+            for invdict in invdicts:
+                if invdict['objectid'] != objectid:
+                    self.caches.evict(invdict['cache_name'], [invdict['key']])
+                self._last_processed_invalidation = invdict['invalidationid']
+            rows += len(invdicts)
+
+            if len(invdicts) < self.invalidation_poll_batch_size:
+                break
+
+        metrics.MetricCountEvent.log(
+                "BuildMaster.pollDatabaseCacheInvalidations.rows", rows)
+        timer.stop()
+
     _last_unclaimed_brids_set = None
+    _last_unclaimed_rescan = 0
+    _last_polled_brid = None
     _last_claim_cleanup = 0
     @defer.inlineCallbacks
     def pollDatabaseBuildRequests(self):
@@ -703,6 +768,12 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
         # the last poll, it notifies the subscribers.  It only tracks that
         # state within the master instance, though; on startup, it notifies for
         # all unclaimed requests in the database.
+        #
+        # Reading all unclaimed requests is expensive, so that is only done
+        # every UNCLAIMED_RESCAN_INTERVAL.  In between, only the unclaimed
+        # requests with a brid above the highest seen so far, less
+        # UNCLAIMED_POLL_LOOKBACK, are read; they replace that part of
+        # _last_unclaimed_brids_set.
 
         last_unclaimed = self._last_unclaimed_brids_set or set()
         if len(last_unclaimed) > self.WARNING_UNCLAIMED_COUNT:
@@ -710,10 +781,45 @@ class BuildMaster(config.ReconfigurableServiceMixin, service.MultiService):
                     "producing builds for which no builder is running?"
                     % len(last_unclaimed))
 
-        # get the current set of unclaimed buildrequests
-        now_unclaimed_brdicts = \
-            yield self.db.buildrequests.getBuildRequests(claimed=False)
-        now_unclaimed = set([ brd['brid'] for brd in now_unclaimed_brdicts ])
+        since_last_rescan = reactor.seconds() - self._last_unclaimed_rescan
+        if (self._last_unclaimed_brids_set is None
+                or self._last_polled_brid is None
+                or since_last_rescan >= self.UNCLAIMED_RESCAN_INTERVAL):
+            poll_timer = metrics.Timer(
+                    "BuildMaster.pollDatabaseBuildRequests.rescan")
+            poll_timer.start()
+            # get the latest brid first, so that any requests added during
+            # the rescan are caught by the next incremental poll
+            self._last_polled_brid = \
+                yield self.db.buildrequests.getLatestBrid()
+            self._last_unclaimed_rescan = reactor.seconds()
+
+            # get the current set of unclaimed buildrequests
+            now_unclaimed_brdicts = \
+                yield self.db.buildrequests.getBuildRequests(claimed=False)
+            now_unclaimed = set([ brd['brid']
+                                  for brd in now_unclaimed_brdicts ])
+        else:
+            poll_timer = metrics.Timer(
+                    "BuildMaster.pollDatabaseBuildRequests.incremental")
+            poll_timer.start()
+            after_brid = max(0,
+                    self._last_polled_brid - self.UNCLAIMED_POLL_LOOKBACK)
+            now_unclaimed_brdicts = \
+                yield self.db.buildrequests.getBuildRequests(claimed=False,
+                                        after_brid=after_brid)
+            now_unclaimed = set([ brid for brid in last_unclaimed
+                                  if brid <= after_brid ])
+            now_unclaimed.update([ brd['brid']
+                                   for brd in now_unclaimed_brdicts ])
+        poll_timer.stop()
+        metrics.MetricCountEvent.log(
+                "BuildMaster.pollDatabaseBuildRequests.rows",
+                len(now_unclaimed_brdicts))
+
+        if now_unclaimed_brdicts:
+            self._last_polled_brid = max(self._last_polled_brid,
+                    max([ brd['brid'] for brd in now_unclaimed_brdicts ]))
 
         # and store that for next time
         self._last_unclaimed_brids_set = now_unclaimed
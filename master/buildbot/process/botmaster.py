@@ -141,6 +141,9 @@ class BotMaster(config.ReconfigurableServiceMixin, service.MultiService):
 
     def startService(self):
         def buildRequestAdded(notif):
+            bldr = self.builders.get(notif['buildername'])
+            if bldr:
+                bldr.addPendingRequest(notif['brid'])
             self.maybeStartBuildsForBuilder(notif['buildername'])
         self.buildrequest_sub = \
             self.master.subscribeToBuildRequests(buildRequestAdded)
@@ -328,6 +331,11 @@ class BuildRequestDistributor(service.Service):
     are still working on the previous build request, then this class will
     correctly re-prioritize invocations of builders' C{maybeStartBuild}
     methods.
+
+    Up to C{builderDispatchConcurrency} builders are invoked at once, always
+    starting with the highest-priority builder that is not already running.
+    A builder's C{maybeStartBuild} is never invoked while a previous
+    invocation is still running.
     """
 
     def __init__(self, botmaster):
@@ -343,12 +351,30 @@ class BuildRequestDistributor(service.Service):
         self.activity_lock = defer.DeferredLock()
         self.active = False
 
+        # names of builders whose maybeStartBuild is running, mapped to lists
+        # of Deferreds to fire when it finishes
+        self._running_builders = {}
+        # Deferred the activity loop is waiting on, if any
+        self._wakeup = None
+
     def stopService(self):
         # let the parent stopService succeed between activity; then the loop
-        # will stop calling itself, since self.running is false
+        # will stop calling itself, since self.running is false.  Finally, wait
+        # for any builders that are still running to finish.
         d = self.activity_lock.acquire()
         d.addCallback(lambda _ : service.Service.stopService(self))
         d.addBoth(lambda _ : self.activity_lock.release())
+        d.addCallback(lambda _ : self._waitForRunningBuilders())
+        return d
+
+    def _waitForRunningBuilders(self):
+        dl = []
+        for waiters in self._running_builders.itervalues():
+            d = defer.Deferred()
+            waiters.append(d)
+            dl.append(d)
+        d = defer.DeferredList(dl)
+        d.addCallback(lambda _ : None)
         return d
 
     @defer.inlineCallbacks
@@ -380,10 +406,16 @@ class BuildRequestDistributor(service.Service):
             # then sort the new, expanded set of builders
             self._pending_builders = \
                 yield self._sortBuilders(list(existing_pending | new_builders))
+            metrics.MetricCountEvent.log(
+                    'BuildRequestDistributor.pending_builders',
+                    len(self._pending_builders), absolute=True)
 
-            # start the activity loop, if we aren't already working on that.
+            # start the activity loop, if we aren't already working on that,
+            # or let it know that there may be more to do.
             if not self.active:
                 self._activityLoop()
+            else:
+                self._wake()
         except:
             log.err(Failure(),
                     "while attempting to start builds on %s" % self.name)
@@ -453,30 +485,44 @@ class BuildRequestDistributor(service.Service):
     def _activityLoop(self):
         self.active = True
 
+        # this measures the time taken to drain the list of pending builders
         timer = metrics.Timer('BuildRequestDistributor._activityLoop()')
         timer.start()
 
         while 1:
             yield self.activity_lock.acquire()
 
-            # lock pending_builders, pop an element from it, and release
+            # lock pending_builders, pop the first element that is not
+            # already running from it, and release
             yield self.pending_builders_lock.acquire()
 
-            # bail out if we shouldn't keep looping
-            if not self.running or not self._pending_builders:
-                self.pending_builders_lock.release()
-                self.activity_lock.release()
-                break
-
-            bldr_name = self._pending_builders.pop(0)
+            # find a builder to run, if we should keep looping
+            bldr_name = None
+            concurrency = self.master.config.builderDispatchConcurrency
+            if self.running and len(self._running_builders) < concurrency:
+                for name in self._pending_builders:
+                    if name not in self._running_builders:
+                        bldr_name = name
+                        break
+            if bldr_name is not None:
+                self._pending_builders.remove(bldr_name)
             self.pending_builders_lock.release()
 
-            try:
-                yield self._callABuilder(bldr_name)
-            except:
-                log.err(Failure(),
-                        "from maybeStartBuild for builder '%s'" % (bldr_name,))
+            if bldr_name is None:
+                # bail out if nothing is running; if we're still running, then
+                # there's nothing pending, either
+                if not self._running_builders:
+                    self.activity_lock.release()
+                    break
 
+                # otherwise, wait until a builder finishes or more builders
+                # are added
+                self._wakeup = d = defer.Deferred()
+                self.activity_lock.release()
+                yield d
+                continue
+
+            self._startBuilder(bldr_name)
             self.activity_lock.release()
 
         timer.stop()
@@ -484,6 +530,29 @@ class BuildRequestDistributor(service.Service):
         self.active = False
         self._quiet()
 
+    def _wake(self):
+        if self._wakeup:
+            d, self._wakeup = self._wakeup, None
+            d.callback(None)
+
+    def _startBuilder(self, bldr_name):
+        self._running_builders[bldr_name] = []
+        metrics.MetricCountEvent.log('BuildRequestDistributor.running_builders',
+                len(self._running_builders), absolute=True)
+
+        d = defer.maybeDeferred(self._callABuilder, bldr_name)
+        d.addErrback(log.err,
+                "from maybeStartBuild for builder '%s'" % (bldr_name,))
+        def finished(_):
+            waiters = self._running_builders.pop(bldr_name)
+            metrics.MetricCountEvent.log(
+                    'BuildRequestDistributor.running_builders',
+                    len(self._running_builders), absolute=True)
+            for waiter in waiters:
+                waiter.callback(None)
+            self._wake()
+        d.addCallback(finished)
+
     def _callABuilder(self, bldr_name):
         # get the actual builder object
         bldr = self.botmaster.builders.get(bldr_name)
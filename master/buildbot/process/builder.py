@@ -19,7 +19,7 @@ from zope.interface import implements
 from twisted.python import log, failure
 from twisted.spread import pb
 from twisted.application import service, internet
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 
 from buildbot import interfaces, config
 from buildbot.status.progress import Expectations
@@ -30,6 +30,26 @@ from buildbot.process import buildrequest, slavebuilder
 from buildbot.process.slavebuilder import BUILDING
 from buildbot.db import buildrequests
 
+def mergeRequestsByKey(keyfn):
+    """
+    Make a C{mergeRequests} callable from a key function.  The key function is
+    called with a L{Builder} and a L{buildrequest.BuildRequest}, and returns a
+    hashable key, or None if the request cannot be merged with any other.
+    Requests with equal keys are merged.
+
+    Because the key function looks at each request on its own, the builder can
+    group its whole queue of requests in a single pass, rather than comparing
+    requests pairwise.
+
+    @param keyfn: key function
+    @returns: callable suitable for the C{mergeRequests} configuration
+    """
+    def mergeRequests(builder, req1, req2):
+        key = keyfn(builder, req1)
+        return key is not None and key == keyfn(builder, req2)
+    mergeRequests.mergeKey = keyfn
+    return mergeRequests
+
 class Builder(config.ReconfigurableServiceMixin,
               pb.Referenceable,
               service.MultiService):
@@ -37,6 +57,13 @@ class Builder(config.ReconfigurableServiceMixin,
     # reconfigure builders before slaves
     reconfig_priority = 196
 
+    # interval (in seconds) at which the in-memory queue of pending build
+    # requests is re-read from the database; this catches requests that were
+    # unclaimed or claimed by other masters without our knowledge
+    PENDING_RECONCILE_INTERVAL = 5*60
+
+    _reactor = reactor # for testing
+
     def __init__(self, name, _addServices=True):
         service.MultiService.__init__(self)
         self.name = name
@@ -61,6 +88,16 @@ class Builder(config.ReconfigurableServiceMixin,
         self.config = None
         self.builder_status = None
 
+        # unclaimed build request dictionaries for this builder, sorted by
+        # submission time.  This is None until it is first loaded from the
+        # database, and is reloaded every PENDING_RECONCILE_INTERVAL seconds;
+        # in between, it is kept up to date by addPendingRequest and by the
+        # claims made in maybeStartBuild.
+        self._pending_requests = None
+        self._pending_loaded_at = None
+        # brids that may have been added since the queue was loaded
+        self._pending_added_brids = set()
+
         if _addServices:
             self.reclaim_svc = internet.TimerService(10*60,
                                             self.reclaimAllBuilds)
@@ -90,6 +127,8 @@ class Builder(config.ReconfigurableServiceMixin,
 
         self.builder_status.setSlavenames(self.config.slavenames)
         self.builder_status.setCacheSize(new_config.caches['Builds'])
+        self.builder_status.setCacheMaxBytes(
+                new_config.cacheMaxBytes.get('Builds'))
 
         return defer.succeed(None)
 
@@ -114,15 +153,16 @@ class Builder(config.ReconfigurableServiceMixin,
         """Returns the submitted_at of the oldest unclaimed build request for
         this builder, or None if there are no build requests.
 
+        This is answered from the queue of pending build requests, so the
+        database is only consulted to load the queue or to fetch newly-added
+        requests.
+
         @returns: datetime instance or None, via Deferred
         """
-        unclaimed = yield self.master.db.buildrequests.getBuildRequests(
-                        buildername=self.name, claimed=False)
+        unclaimed = yield self._getPendingRequests()
 
         if unclaimed:
-            unclaimed = [ brd['submitted_at'] for brd in unclaimed ]
-            unclaimed.sort()
-            defer.returnValue(unclaimed[0])
+            defer.returnValue(unclaimed[0]['submitted_at'])
         else:
             defer.returnValue(None)
 
@@ -433,7 +473,16 @@ class Builder(config.ReconfigurableServiceMixin,
 
     def _resubmit_buildreqs(self, build):
         brids = [br.id for br in build.requests]
-        return self.master.db.buildrequests.unclaimBuildRequests(brids)
+        d = self.master.db.buildrequests.unclaimBuildRequests(brids)
+        def requeue(_):
+            for brid in brids:
+                self.addPendingRequest(brid)
+        d.addCallback(requeue)
+        # the master's incremental polling does not notice requests that are
+        # unclaimed again, so look for a slave to retry them on right away
+        d.addCallback(lambda _ :
+                self.master.botmaster.maybeStartBuildsForBuilder(self.name))
+        return d
 
     def setExpectations(self, progress):
         """Mark the build as successful and update expectations for the next
@@ -474,21 +523,20 @@ class Builder(config.ReconfigurableServiceMixin,
             self.updateBigStatus()
             return
 
-        # now, get the available build requests
-        unclaimed_requests = \
-            yield self.master.db.buildrequests.getBuildRequests(
-                    buildername=self.name, claimed=False)
+        # now, get the available build requests from the pending queue
+        unclaimed_requests = yield self._getPendingRequests()
 
         if not unclaimed_requests:
             self.updateBigStatus()
             return
 
-        # sort by submitted_at, so the first is the oldest
-        unclaimed_requests.sort(key=lambda brd : brd['submitted_at'])
-
         # get the mergeRequests function for later
         mergeRequests_fn = self._getMergeRequestsFn()
 
+        # requests which were claimed but could not be started, and which
+        # must go back into the queue once this invocation is done
+        requeue = []
+
         # match them up until we're out of options
         while available_slavebuilders and unclaimed_requests:
             # first, choose a slave (using nextSlave)
@@ -502,68 +550,192 @@ class Builder(config.ReconfigurableServiceMixin,
                          "'%s'; cannot start build") % self.name)
                 break
 
-            # then choose a request (using nextBuild)
-            brdict = yield self._chooseBuild(unclaimed_requests)
+            # other builders may have started builds on this slave while it
+            # was being chosen, so check it again.  Then reserve it, so that
+            # they cannot do so until this build has started, or failed to.
+            if not slavebuilder.isAvailable():
+                available_slavebuilders.remove(slavebuilder)
+                continue
+            slavebuilder.reserved = True
+            try:
+                # then choose a request (using nextBuild)
+                brdict = yield self._chooseBuild(unclaimed_requests)
+
+                if not brdict:
+                    break
+
+                if brdict not in unclaimed_requests:
+                    log.msg(("nextBuild chose a nonexistent request for "
+                             "builder '%s'; cannot start build") % self.name)
+                    break
+
+                # merge the chosen request with any compatible requests in
+                # the queue
+                brdicts = yield self._mergeRequests(brdict,
+                                        unclaimed_requests, mergeRequests_fn)
+
+                # try to claim the build requests, fetching everything needed
+                # to build BuildRequest objects for them at the same time
+                brids = [ brdict['brid'] for brdict in brdicts ]
+                try:
+                    claimed = yield \
+                        self.master.db.buildrequests.claimAndFetch(brids)
+                except buildrequests.AlreadyClaimedError:
+                    # one or more of the build requests was already claimed;
+                    # re-check just those requests, drop the ones that are
+                    # gone from the queue, and keep trying to match the rest
+                    yield self._recheckPendingRequests(brdicts)
+                    unclaimed_requests = yield self._getPendingRequests()
+
+                    # go around the loop again
+                    continue
+
+                # claim was successful, so remove the buildrequests and
+                # slavebuilder from the respective queues and initiate a
+                # build for this set of requests.  Note that if the build
+                # fails from here on out (e.g., because a slave has failed),
+                # it will be handled outside of this loop. TODO: test that!
+                # The queue may have been reloaded since the requests were
+                # chosen, so they may already be gone.
+                for brdict in brdicts:
+                    if brdict in unclaimed_requests:
+                        unclaimed_requests.remove(brdict)
+                available_slavebuilders.remove(slavebuilder)
+
+                # _startBuildFor expects BuildRequest objects, so cook some
+                # up, using the data fetched with the claim where necessary
+                claimed = dict((brdict['brid'], brdict) for brdict in claimed)
+                breqs = yield defer.gatherResults(
+                        [ self._brdictToBuildRequest(brdict,
+                                            claimed.get(brdict['brid']))
+                          for brdict in brdicts ])
+
+                build_started = yield self._startBuildFor(slavebuilder,
+                                                          breqs)
+
+                if not build_started:
+                    # build was not started, so unclaim the build requests
+                    yield self.master.db.buildrequests.unclaimBuildRequests(
+                                                                        brids)
+
+                    # put them back in the queue, and try starting builds
+                    # again.  If we still have a working slave, then this may
+                    # re-claim the same buildrequests
+                    requeue.extend(brdicts)
+                    self.botmaster.maybeStartBuildsForBuilder(self.name)
+                else:
+                    self._breakBrdictRefloops(brdicts)
+            finally:
+                slavebuilder.reserved = False
+
+        if requeue and self._pending_requests is not None:
+            self._pending_requests.extend(requeue)
+            self._pending_requests.sort(key=self._pendingSortKey)
 
-            if not brdict:
-                break
+        self.updateBigStatus()
+        return
 
-            if brdict not in unclaimed_requests:
-                log.msg(("nextBuild chose a nonexistent request for builder "
-                         "'%s'; cannot start build") % self.name)
-                break
+    # management of the queue of pending build requests
 
-            # merge the chosen request with any compatible requests in the
-            # queue
-            brdicts = yield self._mergeRequests(brdict, unclaimed_requests,
-                                    mergeRequests_fn)
+    def addPendingRequest(self, brid):
+        """
+        Note that the build request with id C{brid} may have been added (or
+        unclaimed) for this builder.  The request is fetched and added to the
+        pending queue on the next call to L{maybeStartBuild}.
 
-            # try to claim the build requests
-            brids = [ brdict['brid'] for brdict in brdicts ]
-            try:
-                yield self.master.db.buildrequests.claimBuildRequests(brids)
-            except buildrequests.AlreadyClaimedError:
-                # one or more of the build requests was already claimed;
-                # re-fetch the now-partially-claimed build requests and keep
-                # trying to match them
-                self._breakBrdictRefloops(unclaimed_requests)
-                unclaimed_requests = \
-                    yield self.master.db.buildrequests.getBuildRequests(
-                            buildername=self.name, claimed=False)
-
-                # go around the loop again
-                continue
+        @param brid: build request ID
+        """
+        # if the queue has not been loaded, it will pick this up anyway
+        if self._pending_requests is not None:
+            self._pending_added_brids.add(brid)
 
-            # claim was successful, so initiate a build for this set of
-            # requests.  Note that if the build fails from here on out (e.g.,
-            # because a slave has failed), it will be handled outside of this
-            # loop. TODO: test that!
+    def _pendingSortKey(self, brdict):
+        # sort by submitted_at, so the first is the oldest
+        return (brdict['submitted_at'], brdict['brid'])
 
-            # _startBuildFor expects BuildRequest objects, so cook some up
-            breqs = yield defer.gatherResults(
-                    [ self._brdictToBuildRequest(brdict)
-                      for brdict in brdicts ])
+    @defer.inlineCallbacks
+    def _getPendingRequests(self):
+        """
+        Get the queue of unclaimed build requests for this builder, loading it
+        from the database if it is not loaded or is due for reconciliation,
+        and fetching any requests added since the last call.
 
-            build_started = yield self._startBuildFor(slavebuilder, breqs)
+        @returns: sorted list of build request dictionaries via Deferred
+        """
+        now = self._reactor.seconds()
+        if (self._pending_requests is None or
+            now - self._pending_loaded_at >= self.PENDING_RECONCILE_INTERVAL):
+            # anything added while the query is running will be fetched on
+            # the next call, and de-duplicated then
+            self._pending_added_brids = set()
+            old_requests = dict((brdict['brid'], brdict)
+                                for brdict in self._pending_requests or [])
+
+            brdicts = yield self.master.db.buildrequests.getBuildRequests(
+                    buildername=self.name, claimed=False)
 
-            if not build_started:
-                # build was not started, so unclaim the build requests
-                yield self.master.db.buildrequests.unclaimBuildRequests(brids)
+            # re-use the dictionaries (and thus the cached BuildRequest
+            # objects) of requests that were already in the queue
+            pending = []
+            for brdict in brdicts:
+                pending.append(old_requests.pop(brdict['brid'], brdict))
+            self._breakBrdictRefloops(old_requests.values())
+
+            pending.sort(key=self._pendingSortKey)
+            # update the queue in place, as a concurrent maybeStartBuild may
+            # be working with it
+            if self._pending_requests is None:
+                self._pending_requests = pending
+            else:
+                self._pending_requests[:] = pending
+            self._pending_loaded_at = now
+
+        elif self._pending_added_brids:
+            added_brids = self._pending_added_brids
+            self._pending_added_brids = set()
+            added_brids -= set([ brdict['brid']
+                                 for brdict in self._pending_requests ])
+
+            added = []
+            if added_brids:
+                added = yield self.master.db.buildrequests.getBuildRequests(
+                        buildername=self.name, claimed=False,
+                        brids=sorted(added_brids))
+
+            # the queue may have been reloaded while fetching
+            if added and self._pending_requests is not None:
+                known = set([ brdict['brid']
+                              for brdict in self._pending_requests ])
+                self._pending_requests.extend([ brdict for brdict in added
+                                                if brdict['brid'] not in known ])
+                self._pending_requests.sort(key=self._pendingSortKey)
+
+        defer.returnValue(self._pending_requests)
 
-                # and try starting builds again.  If we still have a working slave,
-                # then this may re-claim the same buildrequests
-                self.botmaster.maybeStartBuildsForBuilder(self.name)
+    @defer.inlineCallbacks
+    def _recheckPendingRequests(self, brdicts):
+        """
+        Re-fetch the given build requests, after a claim of them failed, and
+        remove any that are no longer unclaimed from the pending queue.  If
+        they all turn out to be unclaimed, the whole queue is reloaded.
 
-            # finally, remove the buildrequests and slavebuilder from the
-            # respective queues
-            self._breakBrdictRefloops(brdicts)
-            for brdict in brdicts:
-                unclaimed_requests.remove(brdict)
-            available_slavebuilders.remove(slavebuilder)
+        @param brdicts: build request dictionaries to check
+        """
+        current = yield self.master.db.buildrequests.getBuildRequests(
+                claimed=False,
+                brids=[ brdict['brid'] for brdict in brdicts ])
+        unclaimed = set([ brdict['brid'] for brdict in current ])
+        gone = [ brdict for brdict in brdicts
+                 if brdict['brid'] not in unclaimed ]
+
+        if not gone or self._pending_requests is None:
+            self._pending_requests = None
+            return
 
-        self._breakBrdictRefloops(unclaimed_requests)
-        self.updateBigStatus()
-        return
+        for brdict in gone:
+            if brdict in self._pending_requests:
+                self._pending_requests.remove(brdict)
+        self._breakBrdictRefloops(gone)
 
     # a few utility functions to make the maybeStartBuild a bit shorter and
     # easier to read
@@ -626,6 +798,14 @@ class Builder(config.ReconfigurableServiceMixin,
 
     def _defaultMergeRequestFn(self, req1, req2):
         return req1.canBeMergedWith(req2)
+    # the default merge criteria can also be expressed as a key, which lets
+    # _mergeRequests group requests in a single pass
+    _defaultMergeRequestFn.mergeKey = \
+            lambda builder, req : req.getMergeKey()
+    # ..and that key can be calculated from source stamp dictionaries, which
+    # can be fetched for the whole queue at once
+    _defaultMergeRequestFn.mergeKeyFromSsdicts = \
+            buildrequest.BuildRequest.getMergeKeyFromSsdicts
 
     @defer.inlineCallbacks
     def _mergeRequests(self, breq, unclaimed_requests, mergeRequests_fn):
@@ -636,6 +816,18 @@ class Builder(config.ReconfigurableServiceMixin,
             defer.returnValue([ breq ])
             return
 
+        # the queue of pending requests may be updated while we wait for
+        # results, so work with a copy of it
+        unclaimed_requests = unclaimed_requests[:]
+
+        mergeKey_fn = getattr(mergeRequests_fn, 'mergeKey', None)
+        if mergeKey_fn:
+            merged_requests = yield self._mergeRequestsByKey(breq,
+                        unclaimed_requests, mergeKey_fn,
+                        getattr(mergeRequests_fn, 'mergeKeyFromSsdicts', None))
+            defer.returnValue(merged_requests)
+            return
+
         # we'll need BuildRequest objects, so get those first
         unclaimed_request_objects = yield defer.gatherResults(
                 [ self._brdictToBuildRequest(brdict)
@@ -656,7 +848,73 @@ class Builder(config.ReconfigurableServiceMixin,
         merged_requests = [ br.brdict for br in merged_request_objects ]
         defer.returnValue(merged_requests)
 
-    def _brdictToBuildRequest(self, brdict):
+    @defer.inlineCallbacks
+    def _mergeRequestsByKey(self, breq, unclaimed_requests, mergeKey_fn,
+                            ssdictsKey_fn=None):
+        """Merge C{breq} with the requests in C{unclaimed_requests} that have
+        the same key according to C{mergeKey_fn}.  Keys are cached in the
+        build request dictionaries, so each request's key is only calculated
+        once while it is in the queue.  If C{ssdictsKey_fn} is given, it
+        calculates the same keys from source stamp dictionaries, which are
+        fetched for all of the requests at once."""
+        def isCached(brdict):
+            cached = brdict.get('mergekey')
+            return cached and cached[0] is mergeKey_fn
+
+        uncached = [ brdict for brdict in unclaimed_requests
+                     if not isCached(brdict) ]
+        if ssdictsKey_fn and uncached:
+            sslists = yield self._getSourceStampsForRequests(uncached)
+            for brdict, sslist in zip(uncached, sslists):
+                brdict['mergekey'] = (mergeKey_fn, ssdictsKey_fn(sslist))
+
+        def getKey(brdict):
+            if isCached(brdict):
+                return defer.succeed(brdict['mergekey'][1])
+            d = self._brdictToBuildRequest(brdict)
+            def calc(breq_object):
+                key = mergeKey_fn(self, breq_object)
+                brdict['mergekey'] = (mergeKey_fn, key)
+                return key
+            d.addCallback(calc)
+            return d
+
+        keys = yield defer.gatherResults(
+                [ getKey(brdict) for brdict in unclaimed_requests ])
+
+        key = keys[unclaimed_requests.index(breq)]
+        if key is None:
+            defer.returnValue([ breq ])
+            return
+
+        merged_requests = [ breq ] + [ brdict
+                for brdict, brkey in zip(unclaimed_requests, keys)
+                if brkey == key and brdict is not breq ]
+        defer.returnValue(merged_requests)
+
+    @defer.inlineCallbacks
+    def _getSourceStampsForRequests(self, brdicts):
+        """
+        Fetch the source stamps of the buildsets of several build requests,
+        with a fixed number of queries.
+
+        @param brdicts: build request dictionaries
+        @returns: list of sslists, in the same order, via Deferred
+        """
+        bsids = set([ brdict['buildsetid'] for brdict in brdicts ])
+        bsdicts = yield self.master.db.buildsets.getBuildsets(
+                                                        bsids=list(bsids))
+        setids = dict((bsdict['bsid'], bsdict['sourcestampsetid'])
+                      for bsdict in bsdicts)
+        unique_setids = list(set(setids.itervalues()))
+        sslists = yield self.master.db.sourcestamps.getSourceStampSets(
+                                                            unique_setids)
+        sslists = dict(zip(unique_setids, sslists))
+        defer.returnValue([
+            sslists.get(setids.get(brdict['buildsetid']), [])
+            for brdict in brdicts ])
+
+    def _brdictToBuildRequest(self, brdict, fetched=None):
         """
         Convert a build request dictionary to a L{buildrequest.BuildRequest}
         object, caching the result in the dictionary itself.  The resulting
@@ -667,12 +925,15 @@ class Builder(config.ReconfigurableServiceMixin,
         only called once at a time for each build request dictionary.
 
         @param brdict: dictionary to convert
+        @param fetched: the same request's dictionary as returned from
+        C{claimAndFetch}, if available
 
         @returns: L{buildrequest.BuildRequest} via Deferred
         """
         if 'brobj' in brdict:
             return defer.succeed(brdict['brobj'])
-        d = buildrequest.BuildRequest.fromBrdict(self.master, brdict)
+        d = buildrequest.BuildRequest.fromBrdict(self.master,
+                                                 fetched or brdict)
         def keep(buildrequest):
             brdict['brobj'] = buildrequest
             buildrequest.brdict = brdict
@@ -685,7 +946,7 @@ class Builder(config.ReconfigurableServiceMixin,
         for brdict in requests:
             try:
                 del brdict['brobj'].brdict
-            except KeyError:
+            except (KeyError, AttributeError):
                 pass
 
 
@@ -76,7 +76,10 @@ class BuildRequest(object):
     def fromBrdict(cls, master, brdict):
         """
         Construct a new L{BuildRequest} from a dictionary as returned by
-        L{BuildRequestsConnectorComponent.getBuildRequest}.
+        L{BuildRequestsConnectorComponent.getBuildRequest}.  If the dictionary
+        came from L{BuildRequestsConnectorComponent.claimAndFetch}, then the
+        buildset, sourcestamps and changes it contains are used instead of
+        fetching them from the database.
 
         This method uses a cache, which may result in return of stale objects;
         for the most up-to-date information, use the database connector
@@ -103,18 +106,23 @@ class BuildRequest(object):
         buildrequest.master = master
 
         # fetch the buildset to get the reason
-        wfd = defer.waitForDeferred(
-            master.db.buildsets.getBuildset(brdict['buildsetid']))
-        yield wfd
-        buildset = wfd.getResult()
+        buildset = brdict.get('buildset')
+        if buildset is None:
+            wfd = defer.waitForDeferred(
+                master.db.buildsets.getBuildset(brdict['buildsetid']))
+            yield wfd
+            buildset = wfd.getResult()
         assert buildset # schema should guarantee this
         buildrequest.reason = buildset['reason']
 
         # fetch the buildset properties, and convert to Properties
-        wfd = defer.waitForDeferred(
-            master.db.buildsets.getBuildsetProperties(brdict['buildsetid']))
-        yield wfd
-        buildset_properties = wfd.getResult()
+        buildset_properties = brdict.get('buildset_properties')
+        if buildset_properties is None:
+            wfd = defer.waitForDeferred(
+                master.db.buildsets.getBuildsetProperties(
+                                                brdict['buildsetid']))
+            yield wfd
+            buildset_properties = wfd.getResult()
 
         pr = properties.Properties()
         for name, (value, source) in buildset_properties.iteritems():
@@ -122,10 +130,13 @@ class BuildRequest(object):
         buildrequest.properties = pr
 
         # fetch the sourcestamp dictionary
-        wfd = defer.waitForDeferred(
-            master.db.sourcestamps.getSourceStamps(buildset['sourcestampsetid']))
-        yield wfd
-        sslist = wfd.getResult()
+        sslist = brdict.get('sourcestamps')
+        if sslist is None:
+            wfd = defer.waitForDeferred(
+                master.db.sourcestamps.getSourceStamps(
+                                        buildset['sourcestampsetid']))
+            yield wfd
+            sslist = wfd.getResult()
         assert len(sslist) > 0, "Empty sourcestampset: db schema enforces set to exist but cannot enforce a non empty set"
 
         # and turn it into a SourceStamps
@@ -198,6 +209,45 @@ class BuildRequest(object):
                 return False
         return True
 
+    def getMergeKey(self):
+        """
+        Returns a hashable key such that requests with equal keys can be
+        merged, or None if this request cannot be merged with any other.  This
+        gives the same answers as L{canBeMergedWith}, but allows a whole queue
+        of requests to be grouped in a single pass.
+        """
+        return self._combineMergeKeys(dict(
+                (codebase, ss.getMergeKey())
+                for codebase, ss in self.sources.iteritems()))
+
+    @classmethod
+    def getMergeKeyFromSsdicts(cls, sslist):
+        """
+        Return the same key as L{getMergeKey} would for a request whose
+        buildset has the source stamps in C{sslist}.  This allows the keys of
+        a queue of requests to be calculated from their source stamp
+        dictionaries, without constructing BuildRequest objects.
+
+        @param sslist: list of source stamp dictionaries
+        """
+        if not sslist:
+            return None
+        sskeys = {}
+        for ssdict in sslist:
+            sskeys[ssdict['codebase']] = \
+                sourcestamp.SourceStamp.getMergeKeyFromSsdict(ssdict)
+        return cls._combineMergeKeys(sskeys)
+
+    @staticmethod
+    def _combineMergeKeys(sskeys):
+        # sskeys maps codebase to the merge key of its source stamp
+        key = []
+        for codebase in sorted(sskeys):
+            if sskeys[codebase] is None:
+                return None
+            key.append(sskeys[codebase])
+        return tuple(key)
+
     def mergeSourceStampsWith(self, others):
         """ Returns one merged sourcestamp for every codebase """
         #get all codebases from all requests
@@ -14,6 +14,7 @@
 # Copyright Buildbot Team Members
 
 import re
+import zlib
 
 from zope.interface import implements
 from twisted.internet import reactor, defer, error
@@ -29,6 +30,7 @@ from buildbot.status import progress
 from buildbot.status.results import SUCCESS, WARNINGS, FAILURE, SKIPPED, \
      EXCEPTION, RETRY, worst_status
 from buildbot.process import metrics, properties
+from buildbot.util.linematcher import LineMatcher
 
 class BuildStepFailed(Exception):
     pass
@@ -101,6 +103,7 @@ class RemoteCommand(pb.Referenceable):
 
     def _start(self):
         self.updates = {}
+        self._decompressors = {}
         self._startTime = util.now()
 
         # This method only initiates the remote command.
@@ -169,6 +172,8 @@ class RemoteCommand(pb.Referenceable):
             #log.msg("update[%d]:" % num)
             try:
                 if self.active and not self.ignore_updates:
+                    if 'compressed' in update:
+                        update = self._decompressUpdate(update)
                     self.remoteUpdate(update)
             except:
                 # log failure, terminate build, let slave retire the update
@@ -179,6 +184,38 @@ class RemoteCommand(pb.Referenceable):
                 max_updatenum = num
         return max_updatenum
 
+    def _decompressUpdate(self, update):
+        # the slave compresses each output stream with its own zlib context,
+        # so each stream is decompressed in order with its own decompressor
+        update = update.copy()
+        method = update.pop('compressed')
+        if method != 'zlib':
+            raise ValueError("unknown output compression %r" % (method,))
+        compressed_bytes = decompressed_bytes = 0
+        for key in ('stdout', 'stderr', 'log'):
+            if key not in update:
+                continue
+            if key == 'log':
+                logname, data = update['log']
+                stream = ('log', logname)
+            else:
+                data = update[key]
+                stream = key
+            if stream not in self._decompressors:
+                self._decompressors[stream] = zlib.decompressobj()
+            data_out = self._decompressors[stream].decompress(data)
+            compressed_bytes += len(data)
+            decompressed_bytes += len(data_out)
+            if key == 'log':
+                update['log'] = (logname, data_out)
+            else:
+                update[key] = data_out
+        metrics.MetricCountEvent.log("RemoteCommand.compressed_output_bytes",
+                                     compressed_bytes)
+        metrics.MetricCountEvent.log("RemoteCommand.output_bytes",
+                                     decompressed_bytes)
+        return update
+
     def remote_complete(self, failure=None):
         """
         Called by the slave's L{buildbot.slave.bot.SlaveBuilder} to
@@ -916,15 +953,25 @@ def regex_log_evaluator(cmd, step_status, regexes):
     worst = SUCCESS
     if cmd.rc != 0:
         worst = FAILURE
+
+    matcher = LineMatcher()
     for err, possible_status in regexes:
+        if isinstance(err, (basestring)):
+            err = re.compile(err, re.DOTALL)
+        matcher.addPattern(possible_status, err, search=True)
+
+    # read each log only once, and skip those which match none of the
+    # regexes with a single pass over their text
+    texts = [ l.getText() for l in cmd.logs.values() ]
+    texts = [ text for text in texts if matcher.matchesAny(text) ]
+
+    for possible_status, err, search in matcher.patterns:
         # worst_status returns the worse of the two status' passed to it.
         # we won't be changing "worst" unless possible_status is worse than it,
         # so we don't even need to check the log if that's the case
         if worst_status(worst, possible_status) == possible_status:
-            if isinstance(err, (basestring)):
-                err = re.compile(".*%s.*" % err, re.DOTALL)
-            for l in cmd.logs.values():
-                if err.search(l.getText()):
+            for text in texts:
+                if err.search(text):
                     worst = possible_status
     return worst
 
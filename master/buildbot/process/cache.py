@@ -15,6 +15,7 @@
 
 from buildbot.util import lru
 from buildbot import config
+from twisted.internet import defer
 from twisted.application import service
 
 class CacheManager(config.ReconfigurableServiceMixin, service.Service):
@@ -31,12 +32,16 @@ class CacheManager(config.ReconfigurableServiceMixin, service.Service):
     # miss function; and it will optimize repeated fetches of the same object.
     DEFAULT_CACHE_SIZE = 1
 
-    def __init__(self):
+    def __init__(self, master=None):
         self.setName('caches')
+        self.master = master
         self.config = {}
+        self.max_bytes = {}
+        self.multiMaster = False
         self._caches = {}
 
-    def get_cache(self, cache_name, miss_fn):
+    def get_cache(self, cache_name, miss_fn, miss_many_fn=None,
+                  size_fn=lru.estimate_size):
         """
         Get an L{AsyncLRUCache} object with the given name.  If such an object
         does not exist, it will be created.  Since the cache is permanent, this
@@ -47,27 +52,85 @@ class CacheManager(config.ReconfigurableServiceMixin, service.Service):
         object it stores)
         @param miss_fn: miss function for the cache; see L{AsyncLRUCache}
         constructor.
+        @param miss_many_fn: batched miss function for the cache; see
+        L{AsyncLRUCache} constructor.  If the cache already exists, this
+        replaces its batched miss function.
+        @param size_fn: function to estimate the size, in bytes, of a value in
+        the cache; used to enforce any byte budget for the cache.  This is
+        only used when the cache is created.
         @returns: L{AsyncLRUCache} instance
         """
         try:
-            return self._caches[cache_name]
+            c = self._caches[cache_name]
         except KeyError:
             max_size = self.config.get(cache_name, self.DEFAULT_CACHE_SIZE)
             assert max_size >= 1
-            c = self._caches[cache_name] = lru.AsyncLRUCache(miss_fn, max_size)
+            c = self._caches[cache_name] = lru.AsyncLRUCache(miss_fn, max_size,
+                                miss_many_fn=miss_many_fn,
+                                max_bytes=self.max_bytes.get(cache_name),
+                                size_fn=size_fn)
             return c
+        if miss_many_fn is not None:
+            c.miss_many_fn = miss_many_fn
+        return c
 
     def reconfigService(self, new_config):
         self.config = new_config.caches
+        self.max_bytes = new_config.cacheMaxBytes
+        self.multiMaster = new_config.multiMaster
         for name, cache in self._caches.iteritems():
             cache.set_max_size(new_config.caches.get(name,
                                                 self.DEFAULT_CACHE_SIZE))
+            cache.set_max_bytes(new_config.cacheMaxBytes.get(name))
 
         return config.ReconfigurableServiceMixin.reconfigService(self,
                                                             new_config)
 
+    def evict(self, cache_name, keys):
+        """
+        Evict the given keys from the named cache in this master only.  It is
+        not an error if the cache does not exist or the keys are not cached.
+
+        @param cache_name: name of the cache
+        @param keys: iterable of keys to evict
+        """
+        c = self._caches.get(cache_name)
+        if c is None:
+            return
+        for key in keys:
+            c.evict(key)
+
+    def clear(self):
+        """
+        Evict everything from every cache in this master.
+        """
+        for c in self._caches.itervalues():
+            c.clear()
+
+    def invalidate(self, cache_name, keys):
+        """
+        Evict the given keys from the named cache, in this master and, in a
+        multi-master configuration, in every other master.  Call this after
+        modifying the database rows from which the cached values were built.
+
+        @param cache_name: name of the cache
+        @param keys: list of keys to evict
+        @returns: Deferred
+        """
+        keys = list(keys)
+        self.evict(cache_name, keys)
+        if not self.multiMaster or not keys or self.master is None:
+            return defer.succeed(None)
+        d = self.master.getObjectId()
+        d.addCallback(lambda objectid :
+            self.master.db.invalidations.addInvalidations(cache_name, keys,
+                                                          objectid))
+        return d
+
     def get_metrics(self):
         return dict([
             (n, dict(hits=c.hits, refhits=c.refhits,
-                     misses=c.misses, max_size=c.max_size))
+                     misses=c.misses, max_size=c.max_size,
+                     size=len(c.cache), bytes=c.bytes,
+                     max_bytes=c.max_bytes))
             for n, c in self._caches.iteritems()])
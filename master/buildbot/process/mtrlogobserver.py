@@ -19,6 +19,7 @@ from twisted.python import log
 from twisted.internet import defer
 from twisted.enterprise import adbapi
 from buildbot.process.buildstep import LogLineObserver
+from buildbot.util.linematcher import LineMatcher
 from buildbot.steps.shell import Test
 
 class EqConnectionPool(adbapi.ConnectionPool):
@@ -96,6 +97,11 @@ class MtrLogObserver(LogLineObserver):
         self.testFail = None
         self.failList = []
         self.warnList = []
+        self.lineMatcher = LineMatcher()
+        self.lineMatcher.addPattern('test', self._line_re, search=True)
+        self.lineMatcher.addPattern('warnings', self._line_re3, search=True)
+        for pattern in (self._line_re2, self._line_re4, self._line_re5):
+            self.lineMatcher.addPattern('close', pattern, search=True)
         LogLineObserver.__init__(self)
 
     def setLog(self, loog):
@@ -105,8 +111,8 @@ class MtrLogObserver(LogLineObserver):
 
     def outLineReceived(self, line):
         stripLine = line.strip("\r\n")
-        m = self._line_re.search(stripLine)
-        if m:
+        kind, m = self.lineMatcher.match(stripLine)
+        if kind == 'test':
             testname, variant, worker, result, info = m.groups()
             self.closeTestFail()
             self.numTests += 1
@@ -120,16 +126,13 @@ class MtrLogObserver(LogLineObserver):
                 self.openTestFail(testname, variant, result, info, stripLine + "\n")
 
         else:
-            m = self._line_re3.search(stripLine)
-            if m:
+            if kind == 'warnings':
                 stuff = m.group(1)
                 self.closeTestFail()
                 testList = stuff.split(" ")
                 self.doCollectWarningTests(testList)
 
-            elif (self._line_re2.search(stripLine) or
-                  self._line_re4.search(stripLine) or
-                  self._line_re5.search(stripLine) or
+            elif (kind == 'close' or
                   stripLine == "Test suite timeout! Terminating..." or
                   stripLine.startswith("mysql-test-run: *** ERROR: Not all tests completed") or
                   (stripLine.startswith("------------------------------------------------------------")
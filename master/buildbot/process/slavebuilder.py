@@ -31,6 +31,16 @@ class AbstractSlaveBuilder(pb.Referenceable):
     buildbot. When a remote builder connects, I query it for command versions
     and then make it available to any Builds that are ready to run. """
 
+    # the number of update calls a slave may have awaiting acknowledgement at
+    # once; slaves batch any further updates until one is acknowledged.  Set
+    # this to None to have slaves send each update separately.
+    updateWindow = 8
+
+    # the slave command versions at which slaves support setUpdateWindow and
+    # setOutputCompression
+    UPDATE_WINDOW_VERSION = "2.16"
+    OUTPUT_COMPRESSION_VERSION = "2.17"
+
     def __init__(self):
         self.ping_watchers = []
         self.state = None # set in subclass
@@ -38,6 +48,9 @@ class AbstractSlaveBuilder(pb.Referenceable):
         self.slave = None
         self.builder_name = None
         self.locks = None
+        # true while a build is being started on this slavebuilder, before
+        # its state reflects that
+        self.reserved = False
 
     def __repr__(self):
         r = ["<", self.__class__.__name__]
@@ -58,6 +71,14 @@ class AbstractSlaveBuilder(pb.Referenceable):
             return oldversion
         return self.remoteCommands.get(command)
 
+    def _slaveVersionIsAtLeast(self, minversion):
+        # every command has the same version, so check a command that all
+        # slaves have
+        sv = self.getSlaveCommandVersion("shell")
+        if sv is None:
+            return False
+        return map(int, sv.split(".")) >= map(int, minversion.split("."))
+
     def isAvailable(self):
         # if this SlaveBuilder is busy, then it's definitely not available
         if self.isBusy():
@@ -71,7 +92,7 @@ class AbstractSlaveBuilder(pb.Referenceable):
         return False
 
     def isBusy(self):
-        return self.state not in (IDLE, LATENT)
+        return self.reserved or self.state not in (IDLE, LATENT)
 
     def buildStarted(self):
         self.state = BUILDING
@@ -106,6 +127,17 @@ class AbstractSlaveBuilder(pb.Referenceable):
         d.addCallback(lambda _:
             self.remote.callRemote("setMaster", self))
 
+        if (self.updateWindow is not None
+                and self._slaveVersionIsAtLeast(self.UPDATE_WINDOW_VERSION)):
+            d.addCallback(lambda _:
+                self.remote.callRemote("setUpdateWindow", self.updateWindow))
+
+        if (slave.compress_output
+                and self._slaveVersionIsAtLeast(
+                                    self.OUTPUT_COMPRESSION_VERSION)):
+            d.addCallback(lambda _:
+                self.remote.callRemote("setOutputCompression", "zlib"))
+
         d.addCallback(lambda _:
             self.remote.callRemote("print", "attached"))
 
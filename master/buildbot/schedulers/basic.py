@@ -62,6 +62,9 @@ class BaseBasicScheduler(base.BaseScheduler):
         self._stable_timers = defaultdict(lambda : None)
         self._stable_timers_lock = defer.DeferredLock()
 
+        # (classifications, chdicts) supplied by preloadClassifiedChanges
+        self._preloaded_classifications = None
+
     def getChangeFilter(self, branch, branches, change_filter, categories):
         raise NotImplementedError
 
@@ -76,6 +79,7 @@ class BaseBasicScheduler(base.BaseScheduler):
         # changes, so get rid of any hanging around from previous
         # configurations
         if not self.treeStableTimer:
+            self._preloaded_classifications = None
             d.addCallback(lambda _ :
                 self.master.db.schedulers.flushChangeClassifications(
                                                         self.objectid))
@@ -129,37 +133,79 @@ class BaseBasicScheduler(base.BaseScheduler):
         def fix_timer(_):
             if not important and not self._stable_timers[timer_name]:
                 return
-            if self._stable_timers[timer_name]:
-                self._stable_timers[timer_name].cancel()
-            def fire_timer():
-                d = self.stableTimerFired(timer_name)
-                d.addErrback(log.err, "while firing stable timer")
-            self._stable_timers[timer_name] = self._reactor.callLater(
-                    self.treeStableTimer, fire_timer)
+            self._startStableTimer(timer_name)
         d.addCallback(fix_timer)
         return d
 
+    def _startStableTimer(self, timer_name):
+        # (re)start the named timer; call with _stable_timers_lock held
+        if self._stable_timers[timer_name]:
+            self._stable_timers[timer_name].cancel()
+        def fire_timer():
+            d = self.stableTimerFired(timer_name)
+            d.addErrback(log.err, "while firing stable timer")
+        self._stable_timers[timer_name] = self._reactor.callLater(
+                self.treeStableTimer, fire_timer)
+
+    def preloadClassifiedChanges(self, classifications, chdicts):
+        """
+        Supply this scheduler's existing change classifications, and the
+        changes they refer to, before it starts.  The scheduler manager loads
+        these for all new schedulers at once, so that each scheduler need not
+        query them in L{scanExistingClassifiedChanges}.
+
+        @param classifications: dictionary mapping changeid to importance
+        @param chdicts: dictionary mapping changeid to chdict; it may contain
+        other changes, too
+        """
+        self._preloaded_classifications = (classifications, chdicts)
+
     @defer.inlineCallbacks
     def scanExistingClassifiedChanges(self):
-        # call gotChange for each classified change.  This is called at startup
-        # and is intended to re-start the treeStableTimer for any changes that
-        # had not yet been built when the scheduler was stopped.
-
-        # NOTE: this may double-call gotChange for changes that arrive just as
-        # the scheduler starts up.  In practice, this doesn't hurt anything.
-        classifications = \
+        # re-start the treeStableTimer for any changes that had not yet been
+        # built when the scheduler was stopped.  This is called at startup.
+        if self._preloaded_classifications:
+            classifications, chdicts = self._preloaded_classifications
+            self._preloaded_classifications = None
+        else:
+            classifications = \
                 yield self.master.db.schedulers.getChangeClassifications(
                                                                 self.objectid)
+            chdicts = {}
 
-        # call gotChange for each change, after first fetching it from the db
-        for changeid, important in classifications.iteritems():
-            chdict = yield self.master.db.changes.getChange(changeid)
+        # fetch any changes that were not preloaded, all at once
+        missing = [ changeid for changeid in classifications
+                    if changeid not in chdicts ]
+        if missing:
+            chdicts = chdicts.copy()
+            fetched = yield self.master.db.changes.getChanges(missing)
+            for chdict in fetched:
+                if chdict:
+                    chdicts[chdict['changeid']] = chdict
 
+        yield self._restoreStableTimers(classifications, chdicts)
+
+    @util.deferredLocked('_stable_timers_lock')
+    @defer.inlineCallbacks
+    def _restoreStableTimers(self, classifications, chdicts):
+        # start the timer for each timer name with an important change, with
+        # the same result as calling gotChange for each change, but without
+        # classifying the changes all over again.  A timer already started
+        # by a change that arrived as the scheduler started is restarted, as
+        # gotChange would.
+        restart = set()
+        for changeid, important in sorted(classifications.iteritems()):
+            chdict = chdicts.get(changeid)
             if not chdict:
                 continue
 
             change = yield changes.Change.fromChdict(self.master, chdict)
-            yield self.gotChange(change, important)
+            timer_name = self.getTimerNameForChange(change)
+            if important or self._stable_timers[timer_name]:
+                restart.add(timer_name)
+
+        for timer_name in restart:
+            self._startStableTimer(timer_name)
 
     def getTimerNameForChange(self, change):
         raise NotImplementedError # see subclasses
@@ -13,7 +13,7 @@
 #
 # Copyright Buildbot Team Members
 
-from twisted.internet import defer
+from twisted.internet import defer, reactor, task
 from twisted.python import log
 from buildbot import util, interfaces, config
 from buildbot.status.results import SUCCESS, WARNINGS
@@ -23,6 +23,12 @@ class Dependent(base.BaseScheduler):
 
     compare_attrs = base.BaseScheduler.compare_attrs + ('upstream_name',)
 
+    # how often to look for upstream buildsets whose completion was not
+    # announced on this master, e.g. because they completed on another master
+    catchUpInterval = 5*60
+
+    _reactor = reactor # for tests
+
     def __init__(self, name, upstream, builderNames, properties={}):
         base.BaseScheduler.__init__(self, name, builderNames, properties)
         if not interfaces.IScheduler.providedBy(upstream):
@@ -32,6 +38,7 @@ class Dependent(base.BaseScheduler):
         self._buildset_addition_subscr = None
         self._buildset_completion_subscr = None
         self._cached_upstream_bsids = None
+        self._catch_up_loop = None
 
         # the subscription lock makes sure that we're done inserting a
         # subcription into the DB before registering that the buildset is
@@ -48,7 +55,13 @@ class Dependent(base.BaseScheduler):
         d = self._checkCompletedBuildsets(None, None)
         d.addErrback(log.err, 'while checking for completed buildsets in start')
 
+        self._catch_up_loop = task.LoopingCall(self._catchUpCompletedBuildsets)
+        self._catch_up_loop.clock = self._reactor
+        self._catch_up_loop.start(self.catchUpInterval, now=False)
+
     def stopService(self):
+        if self._catch_up_loop and self._catch_up_loop.running:
+            self._catch_up_loop.stop()
         if self._buildset_addition_subscr:
             self._buildset_addition_subscr.unsubscribe()
         if self._buildset_completion_subscr:
@@ -72,10 +85,40 @@ class Dependent(base.BaseScheduler):
         d = self._checkCompletedBuildsets(bsid, result)
         d.addErrback(log.err, 'while checking for completed buildsets')
 
+    def _catchUpCompletedBuildsets(self):
+        d = self._checkCompletedBuildsets(None, None, catchUp=True)
+        d.addErrback(log.err, 'while catching up on completed buildsets')
+        return d
+
     @util.deferredLocked('_subscription_lock')
     @defer.inlineCallbacks
-    def _checkCompletedBuildsets(self, bsid, result):
-        subs = yield self._getUpstreamBuildsets()
+    def _checkCompletedBuildsets(self, bsid, result, catchUp=False):
+        if catchUp:
+            # periodically, fetch only those upstream buildsets which have
+            # completed without us hearing about it
+            yield self._updateCachedUpstreamBuilds()
+            if not self._cached_upstream_bsids:
+                return
+            bsdicts = yield self.master.db.buildsets.getBuildsets(
+                    bsids=sorted(self._cached_upstream_bsids), complete=True)
+            subs = [ (bsdict['bsid'], bsdict['sourcestampsetid'],
+                      True, bsdict['results'])
+                     for bsdict in bsdicts ]
+        elif bsid is None:
+            # at startup, check all of the upstream buildsets, in case any
+            # completed while we were not running
+            subs = yield self._getUpstreamBuildsets()
+        else:
+            # otherwise only the buildset that completed needs checking, and
+            # only if it is one of ours
+            yield self._updateCachedUpstreamBuilds()
+            if bsid not in self._cached_upstream_bsids:
+                return
+            bsdict = yield self.master.db.buildsets.getBuildset(bsid)
+            if bsdict:
+                subs = [ (bsid, bsdict['sourcestampsetid'], True, result) ]
+            else:
+                subs = [ (bsid, None, True, None) ]
 
         sub_bsids = []
         for (sub_bsid, sub_sssetid, sub_complete, sub_results) in subs:
@@ -99,7 +142,11 @@ class Dependent(base.BaseScheduler):
         if self._cached_upstream_bsids is None:
             bsids = yield self.master.db.state.getState(self.objectid,
                                         'upstream_bsids', [])
-            self._cached_upstream_bsids = bsids
+            self._cached_upstream_bsids = set(bsids)
+
+    def _saveCachedUpstreamBuilds(self):
+        return self.master.db.state.setState(self.objectid,
+                'upstream_bsids', sorted(self._cached_upstream_bsids))
 
     @defer.inlineCallbacks
     def _getUpstreamBuildsets(self):
@@ -107,21 +154,17 @@ class Dependent(base.BaseScheduler):
         # upstream buildsets
         yield self._updateCachedUpstreamBuilds()
 
-        changed = False
-        rv = []
-        for bsid in self._cached_upstream_bsids[:]:
-            bsdict = yield self.master.db.buildsets.getBuildset(bsid)
-            if not bsdict:
-                self._cached_upstream_bsids.remove(bsid)
-                changed = True
-                continue
-
-            rv.append((bsid, bsdict['sourcestampsetid'], bsdict['complete'],
-                bsdict['results']))
+        bsdicts = yield self.master.db.buildsets.getBuildsets(
+                bsids=sorted(self._cached_upstream_bsids))
+        rv = [ (bsdict['bsid'], bsdict['sourcestampsetid'],
+                bsdict['complete'], bsdict['results'])
+               for bsdict in bsdicts ]
 
-        if changed:
-            yield self.master.db.state.setState(self.objectid,
-                                'upstream_bsids', self._cached_upstream_bsids)
+        # forget any buildsets which no longer exist
+        found = set(bsdict['bsid'] for bsdict in bsdicts)
+        if found != self._cached_upstream_bsids:
+            self._cached_upstream_bsids = found
+            yield self._saveCachedUpstreamBuilds()
 
         defer.returnValue(rv)
 
@@ -130,18 +173,13 @@ class Dependent(base.BaseScheduler):
         yield self._updateCachedUpstreamBuilds()
 
         if bsid not in self._cached_upstream_bsids:
-            self._cached_upstream_bsids.append(bsid)
-
-            yield self.master.db.state.setState(self.objectid,
-                                'upstream_bsids', self._cached_upstream_bsids)
+            self._cached_upstream_bsids.add(bsid)
+            yield self._saveCachedUpstreamBuilds()
 
     @defer.inlineCallbacks
     def _removeUpstreamBuildsets(self, bsids):
         yield self._updateCachedUpstreamBuilds()
 
-        old = set(self._cached_upstream_bsids)
-        self._cached_upstream_bsids = list(old - set(bsids))
-
-        yield self.master.db.state.setState(self.objectid,
-                            'upstream_bsids', self._cached_upstream_bsids)
+        self._cached_upstream_bsids.difference_update(bsids)
+        yield self._saveCachedUpstreamBuilds()
 
@@ -68,6 +68,7 @@ class SchedulerManager(config.ReconfigurableServiceMixin,
 
         # .. then additions
 
+        added = []
         for sch_name in added_names:
             log.msg("adding scheduler '%s'" % (sch_name,))
             sch = new_by_name[sch_name]
@@ -81,8 +82,12 @@ class SchedulerManager(config.ReconfigurableServiceMixin,
             # set up the scheduler
             sch.objectid = objectid
             sch.master = self.master
+            added.append(sch)
 
-            # *then* attacah and start it
+        yield self.preloadClassifiedChanges(added)
+
+        # *then* attach and start them
+        for sch in added:
             sch.setServiceParent(self)
 
         metrics.MetricCountEvent.log("num_schedulers", len(list(self)),
@@ -93,3 +98,31 @@ class SchedulerManager(config.ReconfigurableServiceMixin,
                                                         new_config)
 
         timer.stop()
+
+    @defer.inlineCallbacks
+    def preloadClassifiedChanges(self, schedulers):
+        # load the existing change classifications of all of the given
+        # schedulers which can use them, and the changes they refer to, with
+        # a few queries, rather than a few queries per scheduler
+        schedulers = [ sch for sch in schedulers
+                       if hasattr(sch, 'preloadClassifiedChanges') ]
+        if not schedulers:
+            return
+
+        classifications = \
+            yield self.master.db.schedulers.getAllChangeClassifications(
+                    [ sch.objectid for sch in schedulers ])
+
+        changeids = set()
+        for cls in classifications.itervalues():
+            changeids.update(cls)
+        chdicts = {}
+        if changeids:
+            fetched = yield self.master.db.changes.getChanges(list(changeids))
+            for chdict in fetched:
+                if chdict:
+                    chdicts[chdict['changeid']] = chdict
+
+        for sch in schedulers:
+            sch.preloadClassifiedChanges(
+                    classifications.get(sch.objectid, {}), chdicts)
@@ -112,16 +112,18 @@ class SourceStamp(util.ComparableMixin, styles.Versioned):
             sourcestamp.patch_info = (ssdict['patch_author'],
                                       ssdict['patch_comment'])
         
-        if ssdict['changeids']:
+        if ssdict.get('chdicts') is not None:
+            # the changes were fetched along with the sourcestamp (see
+            # claimAndFetch); these are already sorted oldest to newest
+            d = defer.gatherResults([ Change.fromChdict(master, chdict)
+                                      for chdict in ssdict['chdicts'] ])
+        elif ssdict['changeids']:
             # sort the changeids in order, oldest to newest
             sorted_changeids = sorted(ssdict['changeids'])
-            def gci(id):
-                d = master.db.changes.getChange(id)
-                d.addCallback(lambda chdict :
-                    Change.fromChdict(master, chdict))
-                return d
-            d = defer.gatherResults([ gci(id)
-                                for id in sorted_changeids ])
+            d = master.db.changes.getChanges(sorted_changeids)
+            d.addCallback(lambda chdicts :
+                defer.gatherResults([ Change.fromChdict(master, chdict)
+                                      for chdict in chdicts ]))
         else:
             d = defer.succeed([])
         def got_changes(changes):
@@ -195,6 +197,33 @@ class SourceStamp(util.ComparableMixin, styles.Versioned):
 
         return False
 
+    def getMergeKey(self):
+        # this must give the same answers as canBeMergedWith, above
+        return self._mergeKey(self.codebase, self.repository, self.branch,
+                self.project, self.patch, self.changes, self.revision)
+
+    @classmethod
+    def getMergeKeyFromSsdict(cls, ssdict):
+        """
+        Return the same key as L{getMergeKey} would for the SourceStamp made
+        from C{ssdict}, without fetching its changes.
+
+        @param ssdict: source stamp dictionary
+        """
+        return cls._mergeKey(ssdict['codebase'], ssdict['repository'],
+                ssdict['branch'], ssdict['project'], ssdict['patch_body'],
+                ssdict['changeids'], ssdict['revision'])
+
+    @staticmethod
+    def _mergeKey(codebase, repository, branch, project, patch, changes,
+                  revision):
+        if patch:
+            return None
+        if changes:
+            # any two sourcestamps with changes can be merged
+            return (codebase, repository, branch, project, True, None)
+        return (codebase, repository, branch, project, False, revision)
+
     def mergeWith(self, others):
         """Generate a SourceStamp for the merger of me and all the other
         SourceStamps. This is called by a Build when it starts, to figure
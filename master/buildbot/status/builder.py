@@ -16,14 +16,16 @@
 from __future__ import with_statement
 
 
-import os, re, itertools
-from cPickle import load, dump
+import os, itertools
+from cPickle import dump
 
 from zope.interface import implements
 from twisted.python import log, runtime
+from twisted.internet import defer
 from twisted.persisted import styles
 from buildbot import interfaces, util
-from buildbot.util.lru import LRUCache
+from buildbot.util.lru import LRUCache, estimate_size
+from buildbot.status import buildstore
 from buildbot.status.event import Event
 from buildbot.status.build import BuildStatus
 from buildbot.status.buildrequest import BuildRequestStatus
@@ -34,6 +36,16 @@ from buildbot.status.results import EXCEPTION, RETRY, Results, worst_status
 _hush_pyflakes = [ SUCCESS, WARNINGS, FAILURE, SKIPPED,
                    EXCEPTION, RETRY, Results, worst_status ]
 
+def estimateBuildSize(build):
+    """Estimate the memory used by a BuildStatus, including its properties,
+    steps and logs, for use in sizing the build cache."""
+    size = estimate_size(build) + estimate_size(build.properties)
+    for step in build.getSteps():
+        size += estimate_size(step)
+        for l in step.getLogs():
+            size += estimate_size(l)
+    return size
+
 class BuilderStatus(styles.Versioned):
     """I handle status information for a single process.build.Builder object.
     That object sends status changes to me (frequently as Events), and I
@@ -61,6 +73,9 @@ class BuilderStatus(styles.Versioned):
     category = None
     currentBigState = "offline" # or idle/waiting/interlocked/building
     basedir = None # filled in by our parent
+    buildStore = None # created by getBuildStore
+    buildIndex = None # created by getBuildIndex
+    buildPruner = None # created by getBuildPruner
 
     def __init__(self, buildername, category, master):
         self.name = buildername
@@ -77,7 +92,8 @@ class BuilderStatus(styles.Versioned):
         self.currentBuilds = []
         self.nextBuild = None
         self.watchers = []
-        self.buildCache = LRUCache(self.cacheMiss)
+        self.buildCache = LRUCache(self.cacheMiss,
+                                   size_fn=estimateBuildSize)
 
     # persistence
 
@@ -99,13 +115,17 @@ class BuilderStatus(styles.Versioned):
         del d['status']
         del d['nextBuildNumber']
         del d['master']
+        d.pop('buildStore', None)
+        d.pop('buildIndex', None)
+        d.pop('buildPruner', None)
         return d
 
     def __setstate__(self, d):
         # when loading, re-initialize the transient stuff. Remember that
         # upgradeToVersion1 and such will be called after this finishes.
         styles.Versioned.__setstate__(self, d)
-        self.buildCache = LRUCache(self.cacheMiss)
+        self.buildCache = LRUCache(self.cacheMiss,
+                                   size_fn=estimateBuildSize)
         self.currentBuilds = []
         self.watchers = []
         self.slavenames = []
@@ -127,9 +147,7 @@ class BuilderStatus(styles.Versioned):
         highest-numbered build we discover. This is called by the top-level
         Status object shortly after we are created or loaded from disk.
         """
-        existing_builds = [int(f)
-                           for f in os.listdir(self.basedir)
-                           if re.match("^\d+$", f)]
+        existing_builds = self.getBuildStore().getBuildNumbers()
         if existing_builds:
             self.nextBuildNumber = max(existing_builds) + 1
         else:
@@ -155,44 +173,63 @@ class BuilderStatus(styles.Versioned):
             log.msg("unable to save builder %s" % self.name)
             log.err()
 
+    def getBuildStore(self):
+        """Return the store holding our finished builds, (re)creating it if
+        the configured C{buildStatusStore} has changed."""
+        kind = self.master.config.buildStatusStore
+        store = self.buildStore
+        if store is None or store.kind != kind or store.basedir != self.basedir:
+            if store is not None:
+                store.close()
+            store = self.buildStore = buildstore.makeBuildStore(kind,
+                                                                self.basedir)
+        return store
+
+    def getBuildIndex(self):
+        """Return the L{buildstore.BuildSummaryIndex} of our builds."""
+        index = self.buildIndex
+        if index is None or index.basedir != self.basedir:
+            index = self.buildIndex = buildstore.BuildSummaryIndex(
+                                                            self.basedir)
+        return index
+
+    def getBuildPruner(self):
+        if self.buildPruner is None:
+            self.buildPruner = buildstore.BuildPruner(self)
+        return self.buildPruner
+
     # build cache management
 
     def setCacheSize(self, size):
         self.buildCache.set_max_size(size)
 
-    def makeBuildFilename(self, number):
-        return os.path.join(self.basedir, "%d" % number)
+    def setCacheMaxBytes(self, max_bytes):
+        self.buildCache.set_max_bytes(max_bytes)
 
     def getBuildByNumber(self, number):
         return self.buildCache.get(number)
 
     def loadBuildFromFile(self, number):
-        filename = self.makeBuildFilename(number)
-        try:
-            log.msg("Loading builder %s's build %d from on-disk pickle"
-                % (self.name, number))
-            with open(filename, "rb") as f:
-                build = load(f)
-            build.setProcessObjects(self, self.master)
-
-            # (bug #1068) if we need to upgrade, we probably need to rewrite
-            # this pickle, too.  We determine this by looking at the list of
-            # Versioned objects that have been unpickled, and (after doUpgrade)
-            # checking to see if any of them set wasUpgraded.  The Versioneds'
-            # upgradeToVersionNN methods all set this.
-            versioneds = styles.versionedsToUpgrade
-            styles.doUpgrade()
-            if True in [ hasattr(o, 'wasUpgraded') for o in versioneds.values() ]:
-                log.msg("re-writing upgraded build pickle")
-                build.saveYourself()
-
-            # check that logfiles exist
-            build.checkLogfiles()
-            return build
-        except IOError:
-            raise IndexError("no such build %d" % number)
-        except EOFError:
-            raise IndexError("corrupted build pickle %d" % number)
+        store = self.getBuildStore()
+        log.msg("Loading builder %s's build %d from on-disk %s store"
+            % (self.name, number, store.kind))
+        build = store.loadBuild(number)
+        build.setProcessObjects(self, self.master)
+
+        # (bug #1068) if we need to upgrade, we probably need to rewrite
+        # this pickle, too.  We determine this by looking at the list of
+        # Versioned objects that have been unpickled, and (after doUpgrade)
+        # checking to see if any of them set wasUpgraded.  The Versioneds'
+        # upgradeToVersionNN methods all set this.
+        versioneds = styles.versionedsToUpgrade
+        styles.doUpgrade()
+        if True in [ hasattr(o, 'wasUpgraded') for o in versioneds.values() ]:
+            log.msg("re-writing upgraded build pickle")
+            build.saveYourself()
+
+        # check that logfiles exist
+        build.checkLogfiles()
+        return build
 
     def cacheMiss(self, number, **kwargs):
         # If kwargs['val'] exists, this is a new value being added to
@@ -219,7 +256,7 @@ class BuilderStatus(styles.Versioned):
         # get the horizons straight
         buildHorizon = self.master.config.buildHorizon
         if buildHorizon is not None:
-            earliest_build = self.nextBuildNumber - self.buildHorizon
+            earliest_build = self.nextBuildNumber - buildHorizon
         else:
             earliest_build = 0
 
@@ -232,36 +269,15 @@ class BuilderStatus(styles.Versioned):
         if earliest_log < earliest_build:
             earliest_log = earliest_build
 
-        if earliest_build == 0:
-            return
+        if earliest_log <= 0:
+            return defer.succeed(None)
 
-        # skim the directory and delete anything that shouldn't be there anymore
-        build_re = re.compile(r"^([0-9]+)$")
-        build_log_re = re.compile(r"^([0-9]+)-.*$")
         # if the directory doesn't exist, bail out here
         if not os.path.exists(self.basedir):
-            return
+            return defer.succeed(None)
 
-        for filename in os.listdir(self.basedir):
-            num = None
-            mo = build_re.match(filename)
-            is_logfile = False
-            if mo:
-                num = int(mo.group(1))
-            else:
-                mo = build_log_re.match(filename)
-                if mo:
-                    num = int(mo.group(1))
-                    is_logfile = True
-
-            if num is None: continue
-            if num in self.buildCache.cache: continue
-
-            if (is_logfile and num < earliest_log) or num < earliest_build:
-                pathname = os.path.join(self.basedir, filename)
-                log.msg("pruning '%s'" % pathname)
-                try: os.unlink(pathname)
-                except OSError: pass
+        # the files are deleted incrementally, in a thread
+        return self.getBuildPruner().prune(earliest_build, earliest_log)
 
     # IBuilderStatus methods
     def getName(self):
@@ -313,33 +329,100 @@ class BuilderStatus(styles.Versioned):
         except IndexError:
             return None
 
-    def generateFinishedBuilds(self, branches=[],
-                               num_builds=None,
-                               max_buildnum=None,
-                               finished_before=None,
-                               max_search=200):
+    def getBuildSummary(self, number):
+        """Return a dictionary summarizing build C{number}, as given by
+        L{buildstore.summarizeBuild}, or None if there is no such build.  If
+        the build is not already in memory and the build store supports it,
+        the summary is loaded without loading the build's steps."""
+        return self._getPartial(number, buildstore.summarizeBuild,
+                                'loadBuildSummary')
+
+    def getBuildStepSummaries(self, number):
+        """Return a list of dictionaries summarizing the steps of build
+        C{number}, as given by L{buildstore.summarizeSteps}, or None if there
+        is no such build.  Where possible, the steps' logs are not loaded."""
+        return self._getPartial(number, buildstore.summarizeSteps,
+                                'loadBuildSteps')
+
+    def _getPartial(self, number, summarize_fn, load_method):
+        if number < 0:
+            number = self.nextBuildNumber + number
+        if number < 0 or number >= self.nextBuildNumber:
+            return None
+
+        # running or cached builds are summarized from memory
+        for b in self.currentBuilds:
+            if b.number == number:
+                return summarize_fn(b)
+        build = self.buildCache.weakrefs.get(number)
+        if build is not None:
+            return summarize_fn(build)
+
+        partial = getattr(self.getBuildStore(), load_method)(number)
+        if partial is not None:
+            return partial
+
+        build = self.getBuild(number)
+        if build is None:
+            return None
+        return summarize_fn(build)
+
+    def generateFinishedBuildSummaries(self, branches=[],
+                                       num_builds=None,
+                                       max_buildnum=None,
+                                       finished_before=None,
+                                       max_search=200):
+        """Like L{generateFinishedBuilds}, but generate summary dictionaries
+        from our L{buildstore.BuildSummaryIndex} instead of builds.  Builds
+        missing from the index are summarized and added to it."""
+        index = self.getBuildIndex()
+        running = set(b.number for b in self.currentBuilds)
         got = 0
         for Nb in itertools.count(1):
             if Nb > self.nextBuildNumber:
                 break
             if Nb > max_search:
                 break
-            build = self.getBuild(-Nb)
-            if build is None:
-                continue
+            number = self.nextBuildNumber - Nb
             if max_buildnum is not None:
-                if build.getNumber() > max_buildnum:
+                if number > max_buildnum:
+                    continue
+            if number in running:
+                continue
+            summary = index.get(number)
+            if summary is None:
+                summary = self.getBuildSummary(number)
+                if summary is None:
                     continue
-            if not build.isFinished():
+                index.add(summary)
+            if summary['finish'] is None:
                 continue
             if finished_before is not None:
-                start, end = build.getTimes()
-                if end >= finished_before:
+                if summary['finish'] >= finished_before:
                     continue
             if branches:
-                if build.getSourceStamp().branch not in branches:
+                if summary['branch'] not in branches:
                     continue
             got += 1
+            yield summary
+            if num_builds is not None:
+                if got >= num_builds:
+                    return
+
+    def generateFinishedBuilds(self, branches=[],
+                               num_builds=None,
+                               max_buildnum=None,
+                               finished_before=None,
+                               max_search=200):
+        # search the index, so that only the builds which match are loaded
+        got = 0
+        for summary in self.generateFinishedBuildSummaries(branches,
+                max_buildnum=max_buildnum, finished_before=finished_before,
+                max_search=max_search):
+            build = self.getBuild(summary['number'])
+            if build is None:
+                continue
+            got += 1
             yield build
             if num_builds is not None:
                 if got >= num_builds:
@@ -500,6 +583,11 @@ class BuilderStatus(styles.Versioned):
         assert s in self.currentBuilds
         s.saveYourself()
         self.currentBuilds.remove(s)
+        self.getBuildIndex().add(buildstore.summarizeBuild(s))
+        self.getBuildPruner().buildFinished(s)
+        # the build has grown since it was added to the cache, so update
+        # its size estimate
+        self.buildCache.put(s.number, s)
 
         name = self.getName()
         results = s.getResults()
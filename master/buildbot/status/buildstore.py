@@ -0,0 +1,517 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+"""
+Storage backends for finished L{BuildStatus} objects.
+
+Each builder has a store rooted in its status directory.  Besides loading and
+saving complete builds, a store may be able to return a build's summary
+(without its steps) and its step summaries (without their logs), so that
+callers scanning history need not unpickle whole object graphs.  A
+L{BuildSummaryIndex} goes further, answering history searches from a single
+small file.
+"""
+
+from __future__ import with_statement
+
+import os
+import re
+import bisect
+import shutil
+import sqlite3
+import thread
+from cPickle import load, loads, dump, dumps
+from twisted.python import log, runtime
+from twisted.internet import defer, threads
+from buildbot.process import metrics
+
+def summarizeBuild(build):
+    """Return a dictionary describing C{build} without its steps."""
+    start, finish = build.getTimes()
+    branch = revision = None
+    ss = build.getSourceStamp()
+    if ss is not None:
+        branch, revision = ss.branch, ss.revision
+    return dict(
+        number=build.getNumber(),
+        start=start,
+        finish=finish,
+        results=build.getResults(),
+        text=build.getText(),
+        reason=build.getReason(),
+        slavename=build.getSlavename(),
+        branch=branch,
+        revision=revision)
+
+def summarizeSteps(build):
+    """Return a list of dictionaries describing the steps of C{build},
+    without their logs."""
+    steps = []
+    for step in build.getSteps():
+        start, finish = step.getTimes()
+        steps.append(dict(
+            name=step.getName(),
+            start=start,
+            finish=finish,
+            results=step.getResults()[0],
+            text=step.getText(),
+            hidden=step.isHidden(),
+            statistics=step.statistics.copy(),
+            urls=step.getURLs()))
+    return steps
+
+class PickleBuildStore(object):
+    """
+    I store each build as a pickle named by its build number in the
+    builder's status directory.  This is the historical on-disk format.  I
+    have no cheaper representation than the pickle itself, so I do not
+    support partial loads.
+    """
+
+    kind = 'pickle'
+
+    build_re = re.compile(r"^\d+$")
+
+    def __init__(self, basedir):
+        self.basedir = basedir
+
+    def makeBuildFilename(self, number):
+        return os.path.join(self.basedir, "%d" % number)
+
+    def getBuildNumbers(self):
+        """Return a sorted list of the numbers of all stored builds."""
+        if not os.path.isdir(self.basedir):
+            return []
+        return sorted(int(f) for f in os.listdir(self.basedir)
+                      if self.build_re.match(f))
+
+    def saveBuild(self, build):
+        filename = self.makeBuildFilename(build.number)
+        if os.path.isdir(filename):
+            # leftover from 0.5.0, which stored builds in directories
+            shutil.rmtree(filename, ignore_errors=True)
+        tmpfilename = filename + ".tmp"
+        with open(tmpfilename, "wb") as f:
+            dump(build, f, -1)
+        if runtime.platformType  == 'win32':
+            # windows cannot rename a file on top of an existing one, so
+            # fall back to delete-first. There are ways this can fail and
+            # lose the builder's history, so we avoid using it in the
+            # general (non-windows) case
+            if os.path.exists(filename):
+                os.unlink(filename)
+        os.rename(tmpfilename, filename)
+
+    def loadBuild(self, number):
+        """Unpickle and return build C{number}, raising IndexError if it is
+        missing or corrupt.  The caller is responsible for calling
+        C{setProcessObjects} and upgrading the result."""
+        try:
+            with open(self.makeBuildFilename(number), "rb") as f:
+                return load(f)
+        except IOError:
+            raise IndexError("no such build %d" % number)
+        except EOFError:
+            raise IndexError("corrupted build pickle %d" % number)
+
+    def loadBuildSummary(self, number):
+        """Return the summary of build C{number} as given by
+        L{summarizeBuild}, or None if it cannot be loaded without loading the
+        whole build."""
+        return None
+
+    def loadBuildSteps(self, number):
+        """Return the step summaries of build C{number} as given by
+        L{summarizeSteps}, or None if they cannot be loaded without loading
+        the whole build."""
+        return None
+
+    def deleteBuild(self, number):
+        """Delete build C{number}, returning the number of bytes reclaimed.
+        This method may be called from a thread."""
+        filename = self.makeBuildFilename(number)
+        try:
+            size = os.path.getsize(filename)
+            os.unlink(filename)
+        except OSError:
+            return 0
+        return size
+
+    def close(self):
+        pass
+
+class SqliteBuildStore(PickleBuildStore):
+    """
+    I store builds in a per-builder SQLite file, C{builds.sqlite}, keyed by
+    build number.  Each row carries the build summary and step summaries as
+    separate pickles alongside the full build, so partial loads never touch
+    the full object graph.
+
+    Builds saved by L{PickleBuildStore} remain readable: numbers missing from
+    the database are loaded from their pickle files, although without partial
+    loads.
+
+    Each thread uses its own connection to the database.
+    """
+
+    kind = 'sqlite'
+
+    filename = 'builds.sqlite'
+
+    def __init__(self, basedir):
+        PickleBuildStore.__init__(self, basedir)
+        self.conns = {}
+
+    def _getConn(self):
+        ident = thread.get_ident()
+        conn = self.conns.get(ident)
+        if conn is None:
+            conn = self.conns[ident] = sqlite3.connect(
+                    os.path.join(self.basedir, self.filename),
+                    check_same_thread=False)
+            conn.text_factory = str
+            conn.execute("CREATE TABLE IF NOT EXISTS builds ("
+                         "number INTEGER PRIMARY KEY, "
+                         "summary BLOB NOT NULL, "
+                         "steps BLOB NOT NULL, "
+                         "build BLOB NOT NULL)")
+            conn.commit()
+        return conn
+
+    def _getColumn(self, number, column):
+        row = self._getConn().execute(
+                "SELECT %s FROM builds WHERE number = ?" % column,
+                (number,)).fetchone()
+        if row is None:
+            return None
+        return loads(str(row[0]))
+
+    def getBuildNumbers(self):
+        numbers = set(PickleBuildStore.getBuildNumbers(self))
+        numbers.update(row[0] for row in
+                self._getConn().execute("SELECT number FROM builds"))
+        return sorted(numbers)
+
+    def saveBuild(self, build):
+        conn = self._getConn()
+        conn.execute("INSERT OR REPLACE INTO builds "
+                     "(number, summary, steps, build) VALUES (?, ?, ?, ?)",
+                     (build.number,
+                      sqlite3.Binary(dumps(summarizeBuild(build), -1)),
+                      sqlite3.Binary(dumps(summarizeSteps(build), -1)),
+                      sqlite3.Binary(dumps(build, -1))))
+        conn.commit()
+
+    def loadBuild(self, number):
+        build = self._getColumn(number, 'build')
+        if build is None:
+            return PickleBuildStore.loadBuild(self, number)
+        return build
+
+    def loadBuildSummary(self, number):
+        return self._getColumn(number, 'summary')
+
+    def loadBuildSteps(self, number):
+        return self._getColumn(number, 'steps')
+
+    def deleteBuild(self, number):
+        conn = self._getConn()
+        row = conn.execute("SELECT LENGTH(summary) + LENGTH(steps) + "
+                           "LENGTH(build) FROM builds WHERE number = ?",
+                           (number,)).fetchone()
+        conn.execute("DELETE FROM builds WHERE number = ?", (number,))
+        conn.commit()
+        size = row and row[0] or 0
+        return size + PickleBuildStore.deleteBuild(self, number)
+
+    def close(self):
+        for conn in self.conns.values():
+            conn.close()
+        self.conns.clear()
+
+build_stores = {
+    'pickle' : PickleBuildStore,
+    'sqlite' : SqliteBuildStore,
+}
+
+def makeBuildStore(kind, basedir):
+    """Return a build store of the given C{kind} rooted at C{basedir}."""
+    log.msg("using %s build store in %s" % (kind, basedir))
+    return build_stores[kind](basedir)
+
+class BuildSummaryIndex(object):
+    """
+    I keep a compact summary of each of a builder's finished builds, so that
+    searches through build history can be answered without loading builds.
+    The summaries are held in memory and appended to C{builds.index} in the
+    builder's directory as builds finish; a later record for a build number
+    replaces an earlier one.  Removed builds stay in the file until it is
+    rewritten, in a thread, by L{rewrite}.  Summaries are dictionaries with
+    the keys in C{fields}.
+    """
+
+    filename = 'builds.index'
+
+    fields = ('number', 'start', 'finish', 'results', 'branch', 'revision',
+              'slavename')
+
+    def __init__(self, basedir):
+        self.basedir = basedir
+        self.records = None
+        # records added while the file is being rewritten, which must be
+        # appended to the new file
+        self.rewriting = None
+
+    def _getRecords(self):
+        if self.records is None:
+            self.records = {}
+            path = os.path.join(self.basedir, self.filename)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    while True:
+                        try:
+                            record = load(f)
+                        except EOFError:
+                            break
+                        except:
+                            # a truncated trailing record is lost; its build
+                            # will be summarized again when needed
+                            log.msg("ignoring corrupt record in %s" % path)
+                            break
+                        self.records[record[0]] = record
+        return self.records
+
+    def get(self, number):
+        """Return the summary of build C{number}, or None if it has not been
+        indexed."""
+        record = self._getRecords().get(number)
+        if record is None:
+            return None
+        return dict(zip(self.fields, record))
+
+    def add(self, summary):
+        """Index a build, given its summary from L{summarizeBuild}."""
+        record = tuple(summary[k] for k in self.fields)
+        self._getRecords()[record[0]] = record
+        self._append([record])
+        if self.rewriting is not None:
+            self.rewriting.append(record)
+
+    def _append(self, records):
+        with open(os.path.join(self.basedir, self.filename), "ab") as f:
+            for record in records:
+                dump(record, f, -1)
+
+    def remove(self, numbers):
+        """Forget the given build numbers.  They are dropped from the index
+        file the next time it is rewritten."""
+        records = self._getRecords()
+        for number in numbers:
+            records.pop(number, None)
+
+    @defer.inlineCallbacks
+    def rewrite(self):
+        """Rewrite the index file in a thread, so that it holds only the
+        current records.  Returns a Deferred."""
+        records = self._getRecords()
+        self.rewriting = []
+        try:
+            yield threads.deferToThread(self._write, records.values())
+        finally:
+            added, self.rewriting = self.rewriting, None
+            # anything added meanwhile went to the replaced file
+            added = [ r for r in added if records.get(r[0]) is r ]
+            if added:
+                self._append(added)
+
+    def _write(self, records):
+        # runs in a thread
+        path = os.path.join(self.basedir, self.filename)
+        tmppath = path + ".tmp"
+        with open(tmppath, "wb") as f:
+            for record in sorted(records):
+                dump(record, f, -1)
+        if runtime.platformType  == 'win32':
+            if os.path.exists(path):
+                os.unlink(path)
+        os.rename(tmppath, path)
+
+class BuildPruner(object):
+    """
+    I delete a builder's old builds and logfiles, a bounded batch at a time in
+    a thread, so that pruning never stalls the reactor.
+
+    The builder's directory is scanned once, in a thread, the first time I
+    run.  From then on I track the oldest build number which may still be
+    stored and the logfiles of each build, which L{buildFinished} tells me
+    about, so later runs never list the directory.  The bytes reclaimed are
+    reported by the C{BuildPruner.reclaimed_bytes} metric, and the time spent
+    by the C{BuildPruner.prune()} timer.
+    """
+
+    batch_size = 500
+
+    build_re = re.compile(r"^\d+$")
+    build_log_re = re.compile(r"^(\d+)-")
+
+    # suffixes of the files that make up a logfile, covering each compression
+    # method and the chunk index
+    logfile_suffixes = ('', '.bz2', '.gz', '.zblk', '.idx')
+
+    def __init__(self, builder_status):
+        self.builder_status = builder_status
+        self.scanned = False
+        self.oldest_build = 0
+        # base names of the logfiles of each build, and their sorted numbers
+        self.logfiles = {}
+        self.lognums = []
+        self.running = False
+        self.pending = None
+        self.waiters = []
+
+    def buildFinished(self, build):
+        """Record the logfiles of a newly-finished build."""
+        names = [ os.path.basename(l.getFilename())
+                  for step in build.getSteps()
+                  for l in step.getLogs() ]
+        if names:
+            if build.number not in self.logfiles:
+                bisect.insort(self.lognums, build.number)
+            self.logfiles[build.number] = set(names)
+
+    def prune(self, earliest_build, earliest_log):
+        """Delete builds numbered below C{earliest_build} and logfiles of
+        builds numbered below C{earliest_log}, except those in the build
+        cache.  If I am already running, I run again with the latest
+        horizons when done.  Returns a Deferred which fires when a run with
+        these horizons is complete."""
+        d = defer.Deferred()
+        self.waiters.append(d)
+        self.pending = (earliest_build, earliest_log)
+        if not self.running:
+            self._run()
+        return d
+
+    @defer.inlineCallbacks
+    def _run(self):
+        self.running = True
+        while self.pending:
+            earliest_build, earliest_log = self.pending
+            self.pending = None
+            waiters, self.waiters = self.waiters, []
+            try:
+                yield self._prune(earliest_build, earliest_log)
+            except:
+                log.msg("while pruning builder %s:"
+                        % self.builder_status.name)
+                log.err()
+            for d in waiters:
+                d.callback(None)
+        self.running = False
+
+    @defer.inlineCallbacks
+    def _prune(self, earliest_build, earliest_log):
+        timer = metrics.Timer("BuildPruner.prune()")
+        timer.start()
+
+        bs = self.builder_status
+        store = bs.getBuildStore()
+        if not self.scanned:
+            numbers, logfiles = yield threads.deferToThread(self._scan,
+                                                            store)
+            self.scanned = True
+            if numbers:
+                self.oldest_build = numbers[0]
+            for num, names in logfiles.iteritems():
+                self.logfiles.setdefault(num, set()).update(names)
+            self.lognums = sorted(self.logfiles)
+
+        # builds which are in memory are skipped, and retried next time
+        keep = set(bs.buildCache.cache)
+
+        builds = []
+        oldest = max(self.oldest_build, earliest_build)
+        for num in xrange(self.oldest_build, earliest_build):
+            if num in keep:
+                oldest = min(oldest, num)
+            else:
+                builds.append(num)
+        self.oldest_build = oldest
+
+        logfiles = []
+        i = bisect.bisect_left(self.lognums, earliest_log)
+        retained = []
+        for num in self.lognums[:i]:
+            if num in keep:
+                retained.append(num)
+            else:
+                logfiles.extend(self.logfiles.pop(num))
+        self.lognums[:i] = retained
+
+        reclaimed = 0
+        index = None
+        while builds or logfiles:
+            batch_builds = builds[:self.batch_size]
+            del builds[:self.batch_size]
+            batch_logfiles = logfiles[:self.batch_size]
+            del logfiles[:self.batch_size]
+            reclaimed += yield threads.deferToThread(self._delete, store,
+                                            batch_builds, batch_logfiles)
+            if batch_builds:
+                index = bs.getBuildIndex()
+                index.remove(batch_builds)
+            log.msg("pruned %d builds and %d logfiles of builder %s"
+                    % (len(batch_builds), len(batch_logfiles), bs.name))
+
+        # the index file is rewritten once per run, not once per batch
+        if index:
+            yield index.rewrite()
+
+        if reclaimed:
+            metrics.MetricCountEvent.log("BuildPruner.reclaimed_bytes",
+                                         reclaimed)
+        timer.stop()
+
+    def _scan(self, store):
+        # runs in a thread
+        numbers = store.getBuildNumbers()
+        logfiles = {}
+        for filename in os.listdir(self.builder_status.basedir):
+            mo = self.build_log_re.match(filename)
+            if not mo:
+                continue
+            for suffix in self.logfile_suffixes[1:]:
+                if filename.endswith(suffix):
+                    filename = filename[:-len(suffix)]
+                    break
+            logfiles.setdefault(int(mo.group(1)), set()).add(filename)
+        return numbers, logfiles
+
+    def _delete(self, store, builds, logfiles):
+        # runs in a thread
+        reclaimed = 0
+        for num in builds:
+            reclaimed += store.deleteBuild(num)
+        basedir = self.builder_status.basedir
+        for name in logfiles:
+            for suffix in self.logfile_suffixes:
+                pathname = os.path.join(basedir, name + suffix)
+                try:
+                    size = os.path.getsize(pathname)
+                    os.unlink(pathname)
+                except OSError:
+                    continue
+                reclaimed += size
+        return reclaimed
@@ -14,6 +14,8 @@
 # Copyright Buildbot Team Members
 
 import os
+import struct
+import zlib
 from cStringIO import StringIO
 from bz2 import BZ2File
 from gzip import GzipFile
@@ -41,6 +43,160 @@ class LogFileScanner(netstrings.NetstringParser):
         if not self.channels or (channel in self.channels):
             self.chunk_cb((channel, line[1:]))
 
+class LogFileIndex:
+    """
+    A sidecar index for a L{LogFile}, stored next to it with an C{.idx}
+    suffix.  It contains one fixed-size record for each netstring chunk in
+    the logfile, so it can be binary-searched without reading it entirely.
+
+    Each record is a tuple (offset, channel, textOffset, lineOffset):
+    C{offset} is the byte offset of the chunk in the (uncompressed) logfile,
+    C{textOffset} is the number of text bytes, and C{lineOffset} the number
+    of newlines, in all chunks (of all channels) preceding this one.
+    """
+
+    record = struct.Struct("!QBQQ")
+
+    def __init__(self, f):
+        self.f = f
+
+    def __len__(self):
+        self.f.seek(0, 2)
+        return self.f.tell() // self.record.size
+
+    def __getitem__(self, i):
+        self.f.seek(i * self.record.size)
+        data = self.f.read(self.record.size)
+        if len(data) < self.record.size:
+            raise IndexError(i)
+        return self.record.unpack(data)
+
+    def append(self, offset, channel, textOffset, lineOffset):
+        self.f.seek(0, 2)
+        self.f.write(self.record.pack(offset, channel, textOffset, lineOffset))
+
+    def _bisect(self, field, value):
+        # return the index of the last record whose field is less than
+        # value, or None if there is no such record
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self[mid][field] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        return lo - 1
+
+    def findLine(self, line):
+        """
+        Find the chunk containing the beginning of the given (zero-based)
+        line.
+
+        @returns: record index, or None if the line starts at the beginning
+        of the logfile
+        """
+        return self._bisect(3, line)
+
+class BlockCompressedFile:
+    """
+    A read-only file-like object for logfiles compressed with the
+    C{zlib-blocks} method.  Such files consist of independently
+    zlib-compressed frames of C{frameSize} bytes of uncompressed data,
+    followed by a table of the offsets of each frame and a trailer.  Seeking
+    is cheap, and reading only decompresses the frames that are touched.
+    """
+
+    magic = "BBLOGZB1"
+    trailer = struct.Struct("!8sQQQQ")
+    tableEntry = struct.Struct("!Q")
+    frameSize = 1024*1024
+
+    def __init__(self, filename):
+        self.f = open(filename, "rb")
+        self.f.seek(-self.trailer.size, 2)
+        (magic, self.frameSize, frameCount, self.tableOffset,
+            self.length) = self.trailer.unpack(self.f.read(self.trailer.size))
+        if magic != self.magic:
+            raise IOError("%s is not a block-compressed logfile" % filename)
+        self.f.seek(self.tableOffset)
+        table = self.f.read(frameCount * self.tableEntry.size)
+        self.frameOffsets = [ self.tableEntry.unpack_from(table, i)[0]
+                for i in xrange(0, len(table), self.tableEntry.size) ]
+        self.pos = 0
+        self.cachedFrame = None
+        self.cachedData = None
+
+    @classmethod
+    def compress(cls, infile, outfile, frameSize=None):
+        """
+        Compress the contents of C{infile} into C{outfile}, which should be
+        opened in binary mode.
+        """
+        frameSize = frameSize or cls.frameSize
+        offsets = []
+        offset = length = 0
+        while True:
+            buf = infile.read(frameSize)
+            if not buf:
+                break
+            frame = zlib.compress(buf)
+            offsets.append(offset)
+            outfile.write(frame)
+            offset += len(frame)
+            length += len(buf)
+            if len(buf) < frameSize:
+                break
+        for o in offsets:
+            outfile.write(cls.tableEntry.pack(o))
+        outfile.write(cls.trailer.pack(cls.magic, frameSize, len(offsets),
+                                       offset, length))
+
+    def _getFrame(self, i):
+        if i != self.cachedFrame:
+            start = self.frameOffsets[i]
+            if i + 1 < len(self.frameOffsets):
+                end = self.frameOffsets[i+1]
+            else:
+                end = self.tableOffset
+            self.f.seek(start)
+            self.cachedData = zlib.decompress(self.f.read(end - start))
+            self.cachedFrame = i
+        return self.cachedData
+
+    def read(self, size=-1):
+        if size < 0:
+            size = self.length - self.pos
+        pieces = []
+        while size > 0 and self.pos < self.length:
+            i, frameOffset = divmod(self.pos, self.frameSize)
+            data = self._getFrame(i)[frameOffset:frameOffset+size]
+            pieces.append(data)
+            self.pos += len(data)
+            size -= len(data)
+        return "".join(pieces)
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += self.length
+        self.pos = max(0, offset)
+
+    def tell(self):
+        return self.pos
+
+    def close(self):
+        self.f.close()
+
+def _afterNewlines(text, count):
+    # return the position just after the count'th newline in text
+    pos = -1
+    for _ in xrange(count):
+        pos = text.index("\n", pos + 1)
+    return pos + 1
+
 class LogFileProducer:
     """What's the plan?
 
@@ -182,8 +338,18 @@ class LogFile:
     is generated (before the LogFile is created) by
     L{BuildStatus.generateLogfileName}.
 
+    Each chunk written to disk is also recorded in a L{LogFileIndex}, so that
+    ranges of lines can be read without scanning the whole file.
+
     @ivar length: length of the data in the logfile (sum of chunk sizes; not
     the length of the on-disk encoding)
+
+    @ivar mergedLength: length of the text written to disk so far
+
+    @ivar mergedLines: number of newlines written to disk so far
+
+    @ivar mergedPartialLine: true if the text written to disk so far does not
+    end with a newline
     """
 
     implements(interfaces.IStatusLog, interfaces.ILogFile)
@@ -194,6 +360,9 @@ class LogFile:
     tailLength = 0
     chunkSize = 10*1000
     runLength = 0
+    mergedLength = 0
+    mergedLines = 0
+    mergedPartialLine = False
     # No max size by default
     # Don't keep a tail buffer by default
     logMaxTailSize = None
@@ -203,6 +372,7 @@ class LogFile:
     BUFFERSIZE = 2048
     filename = None # relative to the Builder's basedir
     openfile = None
+    indexfile = None
 
     def __init__(self, parent, name, logfilename):
         """
@@ -228,6 +398,7 @@ class LogFile:
         if not os.path.exists(dirname):
             os.makedirs(dirname)
         self.openfile = open(fn, "w+")
+        self.indexfile = open(fn + ".idx", "w+b")
         self.runEntries = []
         self.watchers = []
         self.finishedWatchers = []
@@ -252,6 +423,7 @@ class LogFile:
         """
         return os.path.exists(self.getFilename() + '.bz2') or \
             os.path.exists(self.getFilename() + '.gz') or \
+            os.path.exists(self.getFilename() + '.zblk') or \
             os.path.exists(self.getFilename())
 
     def getName(self):
@@ -307,6 +479,10 @@ class LogFile:
             return self.openfile
         # otherwise they get their own read-only handle
         # try a compressed log first
+        try:
+            return BlockCompressedFile(self.getFilename() + ".zblk")
+        except IOError:
+            pass
         try:
             return BZ2File(self.getFilename() + ".bz2", "r")
         except IOError:
@@ -317,6 +493,27 @@ class LogFile:
             pass
         return open(self.getFilename(), "r")
 
+    def getIndex(self):
+        """
+        Get the L{LogFileIndex} for this log.  Logs written by older versions
+        of Buildbot do not have an index, in which case this returns None.
+
+        @returns: L{LogFileIndex} instance or None
+        """
+        if self.indexfile:
+            # as with getFile, this is the filehandle we're writing to
+            return LogFileIndex(self.indexfile)
+        # the index of a finished log is small, so read it into memory rather
+        # than holding a file descriptor open for as long as it is in use
+        try:
+            f = open(self.getFilename() + ".idx", "rb")
+        except IOError:
+            return None
+        try:
+            return LogFileIndex(StringIO(f.read()))
+        finally:
+            f.close()
+
     def getText(self):
         # this produces one ginormous string
         return "".join(self.getChunks([STDOUT, STDERR], onlyText=True))
@@ -324,7 +521,8 @@ class LogFile:
     def getTextWithHeaders(self):
         return "".join(self.getChunks(onlyText=True))
 
-    def getChunks(self, channels=[], onlyText=False):
+    def getChunks(self, channels=[], onlyText=False,
+                  start_line=None, end_line=None):
         # generate chunks for everything that was logged at the time we were
         # first called, so remember how long the file was when we started.
         # Don't read beyond that point. The current contents of
@@ -337,6 +535,10 @@ class LogFile:
         # data, you must insure that nothing will be added to the log during
         # yield() calls.
 
+        # if start_line or end_line are given, only the text of the lines
+        # start_line (inclusive) to end_line (exclusive) is generated.  Lines
+        # are numbered from zero and counted across all channels.
+
         f = self.getFile()
         if not self.finished:
             offset = 0
@@ -347,15 +549,32 @@ class LogFile:
             remaining = None
 
         leftover = None
-        if self.runEntries and (not channels or
-                                (self.runEntries[0][0] in channels)):
+        if self.runEntries:
             leftover = (self.runEntries[0][0],
                         "".join([c[1] for c in self.runEntries]))
 
-        # freeze the state of the LogFile by passing a lot of parameters into
-        # a generator
-        return self._generateChunks(f, offset, remaining, leftover,
-                                    channels, onlyText)
+        if start_line is None and end_line is None:
+            if leftover and channels and leftover[0] not in channels:
+                leftover = None
+            # freeze the state of the LogFile by passing a lot of parameters
+            # into a generator
+            return self._generateChunks(f, offset, remaining, leftover,
+                                        channels, onlyText)
+
+        # use the index to skip directly to the chunk containing start_line
+        line = 0
+        index = None
+        if start_line:
+            index = self.getIndex()
+        if index is not None:
+            i = index.findLine(start_line)
+            if i is not None:
+                offset, _, _, line = index[i]
+                if remaining is not None:
+                    remaining -= offset
+        return self._generateLines(f, offset, remaining, leftover, line,
+                                   channels, onlyText,
+                                   start_line or 0, end_line)
 
     def _generateChunks(self, f, offset, remaining, leftover,
                         channels, onlyText):
@@ -392,10 +611,61 @@ class LogFile:
             else:
                 yield leftover
 
-    def readlines(self):
+    def _generateLines(self, f, offset, remaining, leftover, line,
+                       channels, onlyText, start_line, end_line):
+        # line is the number of the line in progress at offset
+        for channel, text in self._generateChunks(f, offset, remaining,
+                                                  leftover, [], False):
+            if end_line is not None and line >= end_line:
+                break
+            n = text.count("\n")
+            start, end = 0, len(text)
+            if line < start_line:
+                if line + n < start_line:
+                    line += n
+                    continue
+                start = _afterNewlines(text, start_line - line)
+            if end_line is not None and line + n >= end_line:
+                end = _afterNewlines(text, end_line - line)
+            line += n
+
+            if start >= end or (channels and channel not in channels):
+                continue
+            text = text[start:end]
+            if onlyText:
+                yield text
+            else:
+                yield (channel, text)
+
+    def getLineCount(self):
+        """
+        Get the number of lines in this log, counting all channels and
+        including a final line without a trailing newline.  For logs with an
+        index, this does not need to read the log.
+
+        @returns: integer
+        """
+        if self.indexfile or os.path.exists(self.getFilename() + ".idx"):
+            lines, partial = self.mergedLines, self.mergedPartialLine
+            texts = [ text for channel, text in self.runEntries ]
+        else:
+            lines, partial = 0, False
+            texts = self.getChunks(onlyText=True)
+        for text in texts:
+            if text:
+                lines += text.count("\n")
+                partial = not text.endswith("\n")
+        if partial:
+            lines += 1
+        return lines
+
+    def readlines(self, start_line=None, end_line=None):
         """Return an iterator that produces newline-terminated lines,
-        excluding header chunks."""
-        alltext = "".join(self.getChunks([STDOUT], onlyText=True))
+        excluding header chunks.  If C{start_line} or C{end_line} are given,
+        only that range of lines is read; see L{getChunks}."""
+        alltext = "".join(self.getChunks([STDOUT], onlyText=True,
+                                         start_line=start_line,
+                                         end_line=end_line))
         io = StringIO(alltext)
         return io.readlines()
 
@@ -429,13 +699,23 @@ class LogFile:
         assert channel < 10, "channel number must be a single decimal digit"
         f = self.openfile
         f.seek(0, 2)
+        index = None
+        if self.indexfile:
+            index = LogFileIndex(self.indexfile)
         offset = 0
         while offset < len(text):
             size = min(len(text)-offset, self.chunkSize)
+            piece = text[offset:offset+size]
+            if index is not None:
+                index.append(f.tell(), channel, self.mergedLength,
+                             self.mergedLines)
             f.write("%d:%d" % (1 + size, channel))
-            f.write(text[offset:offset+size])
+            f.write(piece)
             f.write(",")
             offset += size
+            self.mergedLength += size
+            self.mergedLines += piece.count("\n")
+            self.mergedPartialLine = not piece.endswith("\n")
         self.runEntries = []
         self.runLength = 0
 
@@ -557,6 +837,9 @@ class LogFile:
             # filehandle will be released and automatically closed.
             self.openfile.flush()
             self.openfile = None
+        if self.indexfile:
+            self.indexfile.flush()
+            self.indexfile = None
         self.finished = True
         watchers = self.finishedWatchers
         self.finishedWatchers = []
@@ -569,14 +852,22 @@ class LogFile:
         logCompressionMethod = self.master.config.logCompressionMethod
         # bail out if there's no compression support
         if logCompressionMethod == "bz2":
-            compressed = self.getFilename() + ".bz2.tmp"
+            filename = self.getFilename() + ".bz2"
         elif logCompressionMethod == "gz":
-            compressed = self.getFilename() + ".gz.tmp"
+            filename = self.getFilename() + ".gz"
+        elif logCompressionMethod == "zlib-blocks":
+            filename = self.getFilename() + ".zblk"
         else:
             return defer.succeed(None)
+        compressed = filename + ".tmp"
 
         def _compressLog():
             infile = self.getFile()
+            if logCompressionMethod == "zlib-blocks":
+                cf = open(compressed, 'wb')
+                BlockCompressedFile.compress(infile, cf)
+                cf.close()
+                return
             if logCompressionMethod == "bz2":
                 cf = BZ2File(compressed, 'w')
             elif logCompressionMethod == "gz":
@@ -591,10 +882,6 @@ class LogFile:
         d = threads.deferToThread(_compressLog)
 
         def _renameCompressedLog(rv):
-            if logCompressionMethod == "bz2":
-                filename = self.getFilename() + '.bz2'
-            else:
-                filename = self.getFilename() + '.gz'
             if runtime.platformType  == 'win32':
                 # windows cannot rename a file on top of an existing one, so
                 # fall back to delete-first. There are ways this can fail and
@@ -627,6 +914,8 @@ class LogFile:
             del d['finished']
         if d.has_key('openfile'):
             del d['openfile']
+        if d.has_key('indexfile'):
+            del d['indexfile']
         return d
 
     def __setstate__(self, d):
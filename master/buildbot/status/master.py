@@ -117,6 +117,23 @@ class Status(config.ReconfigurableServiceMixin, service.MultiService):
     def getMetrics(self):
         return self.master.metrics
 
+    def getCacheMetrics(self):
+        metrics = self.master.caches.get_metrics()
+
+        # each builder has its own cache of builds; report their sum
+        builds = dict(hits=0, refhits=0, misses=0, size=0, bytes=0)
+        for name in self.getBuilderNames():
+            c = self.getBuilder(name).buildCache
+            builds['hits'] += c.hits
+            builds['refhits'] += c.refhits
+            builds['misses'] += c.misses
+            builds['size'] += len(c.cache)
+            builds['bytes'] += c.bytes
+        builds['max_size'] = self.master.config.caches['Builds']
+        builds['max_bytes'] = self.master.config.cacheMaxBytes.get('Builds')
+        metrics['Builds'] = builds
+        return metrics
+
     def getURLForBuild(self, builder_name, build_number):
         prefix = self.getBuildbotURL()
         return prefix + "builders/%s/builds/%d" % (
@@ -238,18 +255,21 @@ class Status(config.ReconfigurableServiceMixin, service.MultiService):
                          for bn in self.getBuilderNames()
                          if want_builder(bn)]
 
-        # 'sources' is a list of generators, one for each Builder we're
-        # using. When the generator is exhausted, it is replaced in this list
-        # with None.
+        # 'sources' is a list of generators of build summaries, one for each
+        # Builder we're using, so that only the builds we yield are loaded.
+        # When the generator is exhausted, it is replaced in this list with
+        # None.
+        builders = []
         sources = []
         for bn in builder_names:
             b = self.getBuilder(bn)
-            g = b.generateFinishedBuilds(branches,
+            g = b.generateFinishedBuildSummaries(branches,
                                          finished_before=finished_before,
                                          max_search=max_search)
+            builders.append(b)
             sources.append(g)
 
-        # next_build the next build from each source
+        # next_build the next build summary from each source
         next_build = [None] * len(sources)
 
         def refill():
@@ -270,16 +290,19 @@ class Status(config.ReconfigurableServiceMixin, service.MultiService):
         while True:
             refill()
             # find the latest build among all the candidates
-            candidates = [(i, b, b.getTimes()[1])
-                          for i,b in enumerate(next_build)
-                          if b is not None]
+            candidates = [(i, s, s['finish'])
+                          for i,s in enumerate(next_build)
+                          if s is not None]
             candidates.sort(lambda x,y: cmp(x[2], y[2]))
             if not candidates:
                 return
 
             # and remove it from the list
-            i, build, finshed_time = candidates[-1]
+            i, summary, finshed_time = candidates[-1]
             next_build[i] = None
+            build = builders[i].getBuild(summary['number'])
+            if build is None:
+                continue
             got += 1
             yield build
             if num_builds is not None:
@@ -25,6 +25,7 @@ from buildbot.status.web.base import HtmlResource, \
      getAndCheckProperties, ActionResource, path_to_authzfail
 from buildbot.schedulers.forcesched import ForceScheduler, TextParameter
 from buildbot.status.web.step import StepsResource
+from buildbot.status.web.logs import log_link
 from buildbot.status.web.tests import TestsResource
 from buildbot import util, interfaces
 
@@ -207,9 +208,11 @@ class StatusResourceBuild(HtmlResource):
             step['logs']= []
             for l in s.getLogs():
                 logname = l.getName()
-                step['logs'].append({ 'link': req.childLink("steps/%s/logs/%s" %
+                step['logs'].append({ 'link': log_link(
+                                        req.childLink("steps/%s/logs/%s" %
                                            (urllib.quote(s.getName(), safe=''),
-                                            urllib.quote(logname, safe=''))), 
+                                            urllib.quote(logname, safe=''))),
+                                        l),
                                       'name': logname })
 
         scheduler = b.getProperty("scheduler", None)
@@ -48,7 +48,23 @@ class ChunkConsumer:
         self.textlog.finished()
 
 
+# logs bigger than this are linked to with ?tail=TAIL_LINES by default
+LARGE_LOG_SIZE = 1024*1024
+TAIL_LINES = 1000
+
+def log_link(link, log):
+    """
+    Return the URL to use when linking to C{log} at C{link}.  Large logs are
+    linked to their tail, so that browsers do not need to load the whole
+    log.
+    """
+    if getattr(log, 'length', 0) > LARGE_LOG_SIZE:
+        return "%s?tail=%d" % (link, TAIL_LINES)
+    return link
+
 # /builders/$builder/builds/$buildnum/steps/$stepname/logs/$logname
+#   ?tail=N shows only the last N lines
+#   ?lines=A-B shows only lines A through B (numbered from 1)
 class TextLog(Resource):
     # a new instance of this Resource is created for each client who views
     # it, so we can afford to track the request in the Resource.
@@ -99,21 +115,67 @@ class TextLog(Resource):
         req.setHeader("content-length", self.original.length)
         return ''
 
+    def _getLineRange(self, req):
+        # returns (start_line, end_line) for getChunks, or None to stream the
+        # whole log; raises ValueError if the arguments are malformed
+        if "tail" in req.args:
+            try:
+                tail = int(req.args["tail"][0])
+            except ValueError:
+                tail = -1
+            if tail < 0:
+                raise ValueError("tail must be a non-negative number of lines")
+            return (max(0, self.original.getLineCount() - tail), None)
+        if "lines" in req.args:
+            end_line = None
+            try:
+                first, last = req.args["lines"][0].split("-", 1)
+                first = int(first)
+                if last:
+                    end_line = int(last)
+            except ValueError:
+                first = 0
+            if first < 1 or (end_line is not None and end_line < first):
+                raise ValueError("lines must be of the form A-B or A-, "
+                                 "with 1 <= A <= B")
+            return (first - 1, end_line)
+        return None
+
     def render_GET(self, req):
         self._setContentType(req)
+        try:
+            line_range = self._getLineRange(req)
+        except ValueError, err:
+            req.setResponseCode(400, err.args[0])
+            return err.args[0]
         self.req = req
 
         if not self.asText:
             self.template = req.site.buildbot_service.templates.get_template("logs.html")                
             
+            texturl = req.childLink("text")
+            fullurl = None
+            if line_range:
+                texturl += "?" + req.uri.split("?", 1)[1]
+                fullurl = req.path
             data = self.template.module.page_header(
                     pageTitle = "Log File contents",
-                    texturl = req.childLink("text"),
+                    texturl = texturl,
+                    fullurl = fullurl,
                     path_to_root = path_to_root(req))
             data = data.encode('utf-8')                   
             req.write(data)
 
-        self.original.subscribeConsumer(ChunkConsumer(req, self))
+        consumer = ChunkConsumer(req, self)
+        if line_range:
+            # only read the requested lines, and don't follow the log
+            start_line, end_line = line_range
+            for chunk in self.original.getChunks(start_line=start_line,
+                                                 end_line=end_line):
+                consumer.writeChunk(chunk)
+            consumer.finish()
+        else:
+            self.original.subscribeConsumer(consumer)
         return server.NOT_DONE_YET
 
     def _setContentType(self, req):
@@ -685,7 +685,9 @@ class MetricsJsonResource(JsonResource):
     def asDict(self, request):
         metrics = self.status.getMetrics()
         if metrics:
-            return metrics.asDict()
+            rv = metrics.asDict()
+            rv['caches'] = self.status.getCacheMetrics()
+            return rv
         else:
             # Metrics are disabled
             return None
@@ -17,7 +17,7 @@
 import urllib
 from buildbot.status.web.base import HtmlResource, path_to_builder, \
      path_to_build, css_classes
-from buildbot.status.web.logs import LogsResource
+from buildbot.status.web.logs import LogsResource, log_link
 from buildbot import util
 from time import ctime
 
@@ -44,7 +44,8 @@ class StatusResourceBuildStep(HtmlResource):
             # step name from the log number.
             logs.append({'has_contents': l.hasContents(),
                          'name': l.getName(),
-                         'link': req.childLink("logs/%s" % urllib.quote(l.getName())) })
+                         'link': log_link(req.childLink("logs/%s" %
+                                           urllib.quote(l.getName())), l) })
 
         start, end = s.getTimes()
         
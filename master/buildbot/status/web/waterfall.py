@@ -29,6 +29,7 @@ from buildbot.changes import changes
 from buildbot.status.web.base import Box, HtmlResource, IBox, ICurrentBox, \
      ITopBox, build_get_class, path_to_build, path_to_step, path_to_root, \
      map_branches
+from buildbot.status.web.logs import log_link
 
 
 def earlier(old, new):
@@ -178,7 +179,8 @@ class StepBox(components.Adapter):
         for num in range(len(logs)):
             name = logs[num].getName()
             if logs[num].hasContents():
-                url = urlbase + "/logs/%s" % urllib.quote(name)
+                url = log_link(urlbase + "/logs/%s" % urllib.quote(name),
+                               logs[num])
             else:
                 url = None
             cxt['logs'].append(dict(name=name, url=url))
@@ -20,6 +20,7 @@ from twisted.spread import pb
 from buildbot.process import buildstep
 from buildbot.status.results import SUCCESS, WARNINGS, FAILURE
 from buildbot.status.logfile import STDOUT, STDERR
+from buildbot.util.linematcher import LineMatcher
 from buildbot import config
 
 # for existing configurations that import WithProperties from here.  We like
@@ -367,10 +368,57 @@ class StringFileWriter(pb.Referenceable):
     def remote_close(self):
         pass
 
+class WarningCountingLogObserver(buildstep.LogObserver):
+    """
+    I hand each line of a log to my step's C{countWarningsInLine} as the
+    output arrives, so that warnings are counted without holding the log in
+    memory.  Lines longer than C{maxLineLength} are truncated, and only
+    their first C{maxLineLength} bytes are matched; the rest of such a line
+    is discarded as it arrives.  Call C{finish} once the log is complete, to
+    count any final line which lacks a newline.
+    """
+
+    maxLineLength = 1024*1024
+
+    def __init__(self):
+        self.outBuffer = self.errBuffer = ''
+
+    def _linesReceived(self, buffer, data):
+        max_length = self.maxLineLength
+        if "\n" not in data:
+            # only copy as much of the line as will be kept
+            if len(buffer) < max_length:
+                buffer += data[:max_length - len(buffer)]
+            return buffer
+        lines = data.split("\n")
+        if len(buffer) < max_length:
+            lines[0] = buffer + lines[0][:max_length - len(buffer)]
+        else:
+            lines[0] = buffer
+        buffer = lines.pop()[:max_length]
+        for line in lines:
+            self.step.countWarningsInLine(line[:max_length])
+        return buffer
+
+    def outReceived(self, data):
+        self.outBuffer = self._linesReceived(self.outBuffer, data)
+
+    def errReceived(self, data):
+        self.errBuffer = self._linesReceived(self.errBuffer, data)
+
+    def finish(self):
+        if self.outBuffer:
+            self.step.countWarningsInLine(self.outBuffer)
+            self.outBuffer = ''
+        if self.errBuffer:
+            self.step.countWarningsInLine(self.errBuffer)
+            self.errBuffer = ''
+
 class WarningCountingShellCommand(ShellCommand):
     renderables = [ 'suppressionFile' ]
 
     warnCount = 0
+    warningObserver = None
     warningPattern = '.*warning[: ].*'
     # The defaults work for GNU Make.
     directoryEnterPattern = (u"make.*: Entering directory " 
@@ -523,58 +571,97 @@ class WarningCountingShellCommand(ShellCommand):
         self.addSuppression(list)
         return ShellCommand.start(self)
 
-    def createSummary(self, log):
+    def startWarningCounting(self):
         """
-        Match log lines against warningPattern.
-
-        Warnings are collected into another log for this step, and the
-        build-wide 'warnings-count' is updated."""
+        Compile the warning and directory patterns, and reset the count of
+        warnings."""
+        # Now compile a regular expression from whichever warning pattern we're
+        # using
+        self.warningRe = self.warningPattern
+        if isinstance(self.warningRe, str):
+            self.warningRe = re.compile(self.warningRe)
+
+        self.directoryEnterRe = self.directoryEnterPattern
+        if (self.directoryEnterRe != None
+                and isinstance(self.directoryEnterRe, basestring)):
+            self.directoryEnterRe = re.compile(self.directoryEnterRe)
+
+        self.directoryLeaveRe = self.directoryLeavePattern
+        if (self.directoryLeaveRe != None
+                and isinstance(self.directoryLeaveRe, basestring)):
+            self.directoryLeaveRe = re.compile(self.directoryLeaveRe)
+
+        # most lines match none of these, so check them all at once
+        self.warningMatcher = LineMatcher()
+        if self.directoryEnterRe:
+            self.warningMatcher.addPattern('enter', self.directoryEnterRe,
+                                           search=True)
+        if self.directoryLeaveRe:
+            self.warningMatcher.addPattern('leave', self.directoryLeaveRe,
+                                           search=True)
+        self.warningMatcher.addPattern('warning', self.warningRe)
 
         self.warnCount = 0
+        self.warnings = []
+        self.warningFailure = None
 
-        # Now compile a regular expression from whichever warning pattern we're
-        # using
-        wre = self.warningPattern
-        if isinstance(wre, str):
-            wre = re.compile(wre)
-
-        directoryEnterRe = self.directoryEnterPattern
-        if (directoryEnterRe != None
-                and isinstance(directoryEnterRe, basestring)):
-            directoryEnterRe = re.compile(directoryEnterRe)
-
-        directoryLeaveRe = self.directoryLeavePattern
-        if (directoryLeaveRe != None
-                and isinstance(directoryLeaveRe, basestring)):
-            directoryLeaveRe = re.compile(directoryLeaveRe)
-
-        # Check if each line in the output from this command matched our
-        # warnings regular expressions. If did, bump the warnings count and
-        # add the line to the collection of lines with warnings
-        warnings = []
-        # TODO: use log.readlines(), except we need to decide about stdout vs
-        # stderr
-        for line in log.getText().split("\n"):
-            if directoryEnterRe:
-                match = directoryEnterRe.search(line)
-                if match:
+    def setupLogfiles(self, cmd, logfiles):
+        # count warnings as the output arrives
+        self.startWarningCounting()
+        self.warningObserver = WarningCountingLogObserver()
+        self.addLogObserver('stdio', self.warningObserver)
+        ShellCommand.setupLogfiles(self, cmd, logfiles)
+
+    def countWarningsInLine(self, line):
+        """
+        Check if a line of output from this command matches our warnings
+        regular expression.  If it does, bump the warnings count and add the
+        line to the collection of lines with warnings."""
+        if self.warningFailure:
+            return
+        try:
+            for name, match in self.warningMatcher.matchAll(line):
+                if name == 'enter':
                     self.directoryStack.append(match.group(1))
-                    continue
-            if (directoryLeaveRe and
-                self.directoryStack and
-                directoryLeaveRe.search(line)):
+                    return
+                elif name == 'leave' and self.directoryStack:
                     self.directoryStack.pop()
-                    continue
+                    return
+                elif name == 'warning':
+                    self.maybeAddWarning(self.warnings, line, match)
+                    return
+        except:
+            # raised from createSummary, so that the step fails
+            self.warningFailure = failure.Failure()
+
+    def createSummary(self, log):
+        """
+        Finish matching log lines against warningPattern.
 
-            match = wre.match(line)
-            if match:
-                self.maybeAddWarning(warnings, line, match)
+        Warnings are collected into another log for this step, and the
+        build-wide 'warnings-count' is updated."""
+
+        observer = self.warningObserver
+        if observer is None:
+            # the output was not observed as it arrived, so scan it now, a
+            # chunk at a time
+            self.startWarningCounting()
+            observer = WarningCountingLogObserver()
+            observer.setStep(self)
+            for channel, text in log.getChunks([STDOUT, STDERR]):
+                if channel == STDOUT:
+                    observer.outReceived(text)
+                else:
+                    observer.errReceived(text)
+        observer.finish()
+        if self.warningFailure:
+            self.warningFailure.raiseException()
 
         # If there were any warnings, make the log if lines with warnings
         # available
         if self.warnCount:
             self.addCompleteLog("warnings (%d)" % self.warnCount,
-                    "\n".join(warnings) + "\n")
+                    "\n".join(self.warnings) + "\n")
 
         warnings_stat = self.step_status.getStatistic('warnings', 0)
         self.step_status.setStatistic('warnings', warnings_stat + self.warnCount)
@@ -311,6 +311,18 @@ class Build(Row):
 
     id_column = 'id'
 
+class CacheInvalidation(Row):
+    table = "cache_invalidations"
+
+    defaults = dict(
+        id = None,
+        cache_name = 'usdicts',
+        cache_key_json = '1',
+        objectid = None,
+        created_at = 1304262222)
+
+    id_column = 'id'
+
 # Fake DB Components
 
 # TODO: test these using the same test methods as are used against the real
@@ -388,6 +400,21 @@ class FakeChangesComponent(FakeDBComponent):
         except KeyError:
             return defer.succeed(None)
 
+        return defer.succeed(self._chdict(row))
+
+    def getChanges(self, changeids):
+        return defer.succeed([ self._chdict(self.changes[id])
+                                    if id in self.changes else None
+                               for id in changeids ])
+
+    def getChangesSince(self, changeid, limit=None):
+        changeids = sorted([ id for id in self.changes if id > changeid ])
+        if limit is not None:
+            changeids = changeids[:limit]
+        return defer.succeed([ self._chdict(self.changes[id])
+                               for id in changeids ])
+
+    def _chdict(self, row):
         chdict = dict(
                 changeid=row.changeid,
                 author=row.author,
@@ -404,7 +431,7 @@ class FakeChangesComponent(FakeDBComponent):
                 codebase=row.codebase,
                 project=row.project)
 
-        return defer.succeed(chdict)
+        return chdict
 
     def getChangeUids(self, changeid):
         try:
@@ -483,6 +510,11 @@ class FakeSchedulersComponent(FakeDBComponent):
                     if k in change_branches and change_branches[k] == branch )
         return defer.succeed(classifications)
 
+    def getAllChangeClassifications(self, objectids):
+        return defer.succeed(dict(
+            (objectid, self.classifications.get(objectid, {}).copy())
+            for objectid in objectids))
+
     # fake methods
 
     def fakeClassifications(self, objectid, classifications):
@@ -592,12 +624,19 @@ class FakeSourceStampsComponent(FakeDBComponent):
             return None
 
     def getSourceStamps(self, sourcestampsetid):
+        return defer.succeed(self._getSourceStamps(sourcestampsetid))
+
+    def _getSourceStamps(self, sourcestampsetid):
         sslist = []
         for ssdict in self.sourcestamps.itervalues():
             if ssdict['sourcestampsetid'] == sourcestampsetid:
                 ssdictcpy = self._getSourceStamp(ssdict['id'])
                 sslist.append(ssdictcpy)
-        return defer.succeed(sslist)
+        return sslist
+
+    def getSourceStampSets(self, sourcestampsetids):
+        return defer.succeed([ self._getSourceStamps(setid)
+                               for setid in sourcestampsetids ])
 
 class FakeBuildsetsComponent(FakeDBComponent):
 
@@ -657,9 +696,14 @@ class FakeBuildsetsComponent(FakeDBComponent):
         row = self.buildsets[bsid]
         return defer.succeed(self._row2dict(row))
 
-    def getBuildsets(self, complete=None):
+    def getBuildsets(self, complete=None, bsids=None):
         rv = []
-        for bs in self.buildsets.itervalues():
+        if bsids is not None:
+            buildsets = [ self.buildsets[bsid] for bsid in bsids
+                          if bsid in self.buildsets ]
+        else:
+            buildsets = self.buildsets.itervalues()
+        for bs in buildsets:
             if complete is not None:
                 if complete and bs['complete']:
                     rv.append(self._row2dict(bs))
@@ -689,6 +733,10 @@ class FakeBuildsetsComponent(FakeDBComponent):
         else:
             return defer.succeed({})
 
+    def getManyBuildsetProperties(self, buildsetids):
+        return defer.gatherResults([ self.getBuildsetProperties(bsid)
+                                     for bsid in buildsetids ])
+
     # fake methods
 
     def fakeBuildsetCompletion(self, bsid, result):
@@ -881,7 +929,7 @@ class FakeBuildRequestsComponent(FakeDBComponent):
             return defer.succeed(None)
 
     def getBuildRequests(self, buildername=None, complete=None, claimed=None,
-                         bsid=None):
+                         bsid=None, after_brid=None, brids=None):
         rv = []
         for br in self.reqs.itervalues():
             if buildername and br.buildername != buildername:
@@ -905,14 +953,25 @@ class FakeBuildRequestsComponent(FakeDBComponent):
             if bsid is not None:
                 if br.buildsetid != bsid:
                     continue
+            if after_brid is not None:
+                if br.id <= after_brid:
+                    continue
+            if brids is not None:
+                if br.id not in brids:
+                    continue
             rv.append(self._brdictFromRow(br))
         return defer.succeed(rv)
 
+    def getLatestBrid(self):
+        if self.reqs:
+            return defer.succeed(max(self.reqs.iterkeys()))
+        return defer.succeed(None)
+
     def claimBuildRequests(self, brids, claimed_at=None):
         for brid in brids:
             if brid not in self.reqs or brid in self.claims:
                 return defer.fail(
-                        failure.Failure(buildrequests.AlreadyClaimedError))
+                        failure.Failure(buildrequests.AlreadyClaimedError()))
 
         claimed_at = datetime2epoch(claimed_at)
         if not claimed_at:
@@ -924,18 +983,55 @@ class FakeBuildRequestsComponent(FakeDBComponent):
                 objectid=self.MASTER_ID, claimed_at=claimed_at)
         return defer.succeed(None)
 
+    @defer.inlineCallbacks
+    def claimAndFetch(self, brids, claimed_at=None):
+        # tests replace claimBuildRequests to simulate claim races
+        if claimed_at is None:
+            yield self.claimBuildRequests(brids)
+        else:
+            yield self.claimBuildRequests(brids, claimed_at=claimed_at)
+
+        rv = []
+        for brid in brids:
+            if brid not in self.reqs:
+                continue
+            brdict = self._brdictFromRow(self.reqs[brid])
+            bsid = brdict['buildsetid']
+            brdict['buildset'] = yield self.db.buildsets.getBuildset(bsid)
+            brdict['buildset_properties'] = \
+                    yield self.db.buildsets.getBuildsetProperties(bsid)
+            sslist = yield self.db.sourcestamps.getSourceStamps(
+                            brdict['buildset']['sourcestampsetid'])
+            for ssdict in sslist:
+                chdicts = []
+                for changeid in sorted(ssdict['changeids']):
+                    chdict = yield self.db.changes.getChange(changeid)
+                    if chdict:
+                        chdicts.append(chdict)
+                ssdict['chdicts'] = chdicts
+            brdict['sourcestamps'] = sslist
+            rv.append(brdict)
+        defer.returnValue(rv)
+
     def reclaimBuildRequests(self, brids):
         for brid in brids:
             if brid not in self.claims:
                 print "trying to reclaim brid %d, but it's not claimed" % brid
                 return defer.fail(
-                        failure.Failure(buildrequests.AlreadyClaimedError))
+                        failure.Failure(buildrequests.AlreadyClaimedError()))
         # now that we've thrown any necessary exceptions, get started
         for brid in brids:
             self.claims[brid] = BuildRequestClaim(brid=brid,
                 objectid=self.MASTER_ID, claimed_at=self._reactor.seconds())
         return defer.succeed(None)
 
+    def unclaimBuildRequests(self, brids):
+        for brid in brids:
+            brc = self.claims.get(brid)
+            if brc and brc.objectid == self.MASTER_ID:
+                del self.claims[brid]
+        return defer.succeed(None)
+
     # Code copied from buildrequests.BuildRequestConnectorComponent
     def _brdictFromRow(self, row):
         claimed = mine = False
@@ -1145,6 +1241,62 @@ class FakeUsersComponent(FakeDBComponent):
                 return defer.succeed(uid)
         return defer.succeed(None)
 
+class FakeInvalidationsComponent(FakeDBComponent):
+
+    def setUp(self):
+        self.invalidations = {}
+
+    def insertTestData(self, rows):
+        for row in rows:
+            if isinstance(row, CacheInvalidation):
+                self.invalidations[row.id] = row
+
+    def addInvalidations(self, cache_name, keys, objectid=None,
+                         _reactor=reactor):
+        for key in keys:
+            id = max(self.invalidations.keys() + [ 0 ]) + 1
+            self.invalidations[id] = CacheInvalidation(id=id,
+                    cache_name=cache_name, cache_key_json=json.dumps(key),
+                    objectid=objectid, created_at=_reactor.seconds())
+        return defer.succeed(None)
+
+    def getInvalidationsSince(self, invalidationid, limit=None):
+        ids = sorted(id for id in self.invalidations if id > invalidationid)
+        if limit is not None:
+            ids = ids[:limit]
+        return defer.succeed([ self._invdict(self.invalidations[id])
+                               for id in ids ])
+
+    def getLatestInvalidationId(self):
+        if not self.invalidations:
+            return defer.succeed(None)
+        return defer.succeed(max(self.invalidations))
+
+    def pruneInvalidations(self, horizon, _reactor=reactor):
+        cutoff = _reactor.seconds() - horizon
+        for id, row in self.invalidations.items():
+            if row.created_at < cutoff:
+                del self.invalidations[id]
+        return defer.succeed(None)
+
+    def _invdict(self, row):
+        key = json.loads(row.cache_key_json)
+        if isinstance(key, list):
+            key = tuple(key)
+        return dict(invalidationid=row.id, cache_name=row.cache_name,
+                key=key, objectid=row.objectid,
+                created_at=epoch2datetime(row.created_at))
+
+    # assertions
+
+    def assertInvalidations(self, expected):
+        """Assert that the recorded invalidations, as a list of (cache_name,
+        key, objectid) tuples in order, match C{expected}"""
+        got = [ (row.cache_name, json.loads(row.cache_key_json), row.objectid)
+                for id, row in sorted(self.invalidations.items()) ]
+        self.t.assertEqual(got, expected)
+
+
 class FakeDBConnector(object):
     """
     A stand-in for C{master.db} that operates without an actual database
@@ -1175,6 +1327,8 @@ class FakeDBConnector(object):
         self._components.append(comp)
         self.users = comp = FakeUsersComponent(self, testcase)
         self._components.append(comp)
+        self.invalidations = comp = FakeInvalidationsComponent(self, testcase)
+        self._components.append(comp)
 
     def setup(self):
         self.is_setup = True
@@ -23,9 +23,10 @@ import mock
 class FakeCache(object):
     """Emulate an L{AsyncLRUCache}, but without any real caching.  This
     I{does} do the weakref part, to catch un-weakref-able objects."""
-    def __init__(self, name, miss_fn):
+    def __init__(self, name, miss_fn, miss_many_fn=None):
         self.name = name
         self.miss_fn = miss_fn
+        self.miss_many_fn = miss_many_fn
 
     def get(self, key, **kwargs):
         d = self.miss_fn(key, **kwargs)
@@ -36,13 +37,26 @@ class FakeCache(object):
         d.addCallback(mkref)
         return d
 
+    def get_many(self, keys, **kwargs):
+        if self.miss_many_fn is None:
+            return defer.gatherResults([ self.get(key, **kwargs)
+                                         for key in keys ])
+        d = self.miss_many_fn(keys, **kwargs)
+        def mkrefs(values):
+            for x in values.itervalues():
+                weakref.ref(x)
+            return [ values.get(key) for key in keys ]
+        d.addCallback(mkrefs)
+        return d
+
 
 class FakeMaster(mock.Mock):
     """
     Create a fake Master instance: a Mock with some convenience
     implementations:
 
-    - Non-caching implementation for C{self.caches}
+    - Non-caching implementation for C{self.caches}, whose C{invalidate}
+      method records its calls
     """
 
     def __init__(self, master_id=fakedb.FakeBuildRequestsComponent.MASTER_ID):
@@ -50,6 +64,8 @@ class FakeMaster(mock.Mock):
         self._master_id = master_id
         self.config = config.MasterConfig()
         self.caches.get_cache = FakeCache
+        self.caches.invalidate = mock.Mock(
+                side_effect=lambda cache_name, keys : defer.succeed(None))
         self.pbmanager = FakePBManager()
 
     def getObjectId(self):
@@ -97,22 +97,40 @@ class FakeLogFile(object):
             for obs in self.step.logobservers[self.name]:
                 obs.errReceived(text)
 
-    def readlines(self):
-        io = StringIO(self.stdout)
+    def readlines(self, start_line=None, end_line=None):
+        io = StringIO(''.join(self.getChunks([STDOUT], onlyText=True,
+                        start_line=start_line, end_line=end_line)))
         return io.readlines()
 
     def getText(self):
         return ''.join([ c for str,c in self.chunks
                            if str in (STDOUT, STDERR)])
 
-    def getChunks(self, channels=[], onlyText=False):
+    def getLineCount(self):
+        text = ''.join([ c for str,c in self.chunks ])
+        return len(text.splitlines())
+
+    def getChunks(self, channels=[], onlyText=False,
+                  start_line=None, end_line=None):
+        chunks = self.chunks
+        if start_line is not None or end_line is not None:
+            # split into one chunk per line, and keep the requested lines
+            chunks = []
+            line = 0
+            for ch, data in self.chunks:
+                for l in data.splitlines(True):
+                    if line >= (start_line or 0) and \
+                            (end_line is None or line < end_line):
+                        chunks.append((ch, l))
+                    if l.endswith('\n'):
+                        line += 1
         if onlyText:
             return [ data
-                        for (ch, data) in self.chunks
+                        for (ch, data) in chunks
                         if not channels or ch in channels ]
         else:
             return [ (ch, data)
-                        for (ch, data) in self.chunks
+                        for (ch, data) in chunks
                         if not channels or ch in channels ]
 
     def finish(self):
@@ -66,7 +66,7 @@ class Tests(interfaces.InterfaceTests):
     def test_signature_readlines(self):
         log = self.makeLogFile()
         @self.assertArgSpecMatches(log.readlines)
-        def readlines(self):
+        def readlines(self, start_line=None, end_line=None):
             pass
 
     def test_signature_getText(self):
@@ -78,7 +78,14 @@ class Tests(interfaces.InterfaceTests):
     def test_signature_getChunks(self):
         log = self.makeLogFile()
         @self.assertArgSpecMatches(log.getChunks)
-        def getChunks(self, channels=[], onlyText=False):
+        def getChunks(self, channels=[], onlyText=False,
+                      start_line=None, end_line=None):
+            pass
+
+    def test_signature_getLineCount(self):
+        log = self.makeLogFile()
+        @self.assertArgSpecMatches(log.getLineCount)
+        def getLineCount(self):
             pass
 
     def test_signature_finish(self):
@@ -97,6 +104,31 @@ class Tests(interfaces.InterfaceTests):
             ''
         ])
 
+    def test_readlines_range(self):
+        log = self.makeLogFile()
+        self.addLogData(log)
+        self.assertEqual(list(log.readlines(start_line=1, end_line=4)), [
+            'embedded newlines\n',
+            'no newlines - newlines\n'
+        ])
+
+    def test_getChunks_range(self):
+        log = self.makeLogFile()
+        self.addLogData(log)
+        self.assertEqual(
+            ''.join(log.getChunks(onlyText=True, start_line=2)),
+            "no newlines - won't see this\nnewlines\nalso hidden")
+
+    def test_getLineCount(self):
+        log = self.makeLogFile()
+        self.addLogData(log)
+        self.assertEqual(log.getLineCount(), 5)
+
+    def test_getLineCount_trailing_newline(self):
+        log = self.makeLogFile()
+        log.addStdout('one\ntwo\n')
+        self.assertEqual(log.getLineCount(), 2)
+
     def test_getText(self):
         log = self.makeLogFile()
         self.addLogData(log)
@@ -14,8 +14,10 @@
 # Copyright Buildbot Team Members
 
 import os
+import mock
 from twisted.trial import unittest
-from twisted.internet import defer
+from twisted.internet import defer, reactor, error
+from twisted.python import failure
 from exceptions import Exception
 from buildbot.changes import gitpoller
 from buildbot.test.util import changesource, gpo
@@ -103,6 +105,54 @@ class GitOutputParsing(gpo.GetProcessOutputMixin, unittest.TestCase):
 
     # _get_changes is tested in TestGitPoller, below
 
+class GitLogParser(unittest.TestCase):
+
+    output = ('\x01' '4423cdbcbb89c14e50dd5f4152415afd686c5241\x00'
+              '1273258009\x00Sammy Jankis <email@example.com>\x00'
+              'first\n\nmultiline\n\x00\n\nfile1\nfile two\n'
+              '\x01' '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a\x00'
+              '1273258010\x00Leonard <l@example.com>\x00'
+              'second\n\x00\n')
+
+    expected = [
+        dict(revision='4423cdbcbb89c14e50dd5f4152415afd686c5241',
+             timestamp=1273258009.0, author=u'Sammy Jankis <email@example.com>',
+             comments=u'first\n\nmultiline', files=['file1', 'file two']),
+        dict(revision='64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a',
+             timestamp=1273258010.0, author=u'Leonard <l@example.com>',
+             comments=u'second', files=[]),
+    ]
+
+    def setUp(self):
+        self.commits = []
+        self.parser = gitpoller.GitLogParser(self.commits.append)
+
+    def test_all_at_once(self):
+        self.parser.feed(self.output)
+        # the last commit is not complete until the output ends
+        self.assertEqual(self.commits, self.expected[:1])
+        self.parser.finish()
+        self.assertEqual(self.commits, self.expected)
+
+    def test_byte_by_byte(self):
+        [ self.parser.feed(c) for c in self.output ]
+        self.parser.finish()
+        self.assertEqual(self.commits, self.expected)
+
+    def test_empty(self):
+        self.parser.feed('')
+        self.parser.finish()
+        self.assertEqual(self.commits, [])
+
+    def test_no_author(self):
+        self.parser.feed('\x01abcd\x001273258009\x00\x00comment\x00\n')
+        self.assertRaises(EnvironmentError, self.parser.finish)
+
+    def test_garbage(self):
+        self.parser.feed('\x01abcd\x00')
+        self.assertRaises(EnvironmentError, self.parser.finish)
+
+
 class TestGitPoller(gpo.GetProcessOutputMixin,
                     changesource.ChangeSourceMixin,
                     unittest.TestCase):
@@ -162,6 +212,7 @@ class TestGitPoller(gpo.GetProcessOutputMixin,
         self.patch(self.poller, '_get_commit_comments', comments)
 
         # do the poll
+        self.poller.bulk_log = False
         d = self.poller.poll()
 
         # check the results
@@ -183,3 +234,220 @@ class TestGitPoller(gpo.GetProcessOutputMixin,
         d.addCallback(check_changes)
 
         return d
+
+    def patchSpawnProcess(self, output, exitCode=0):
+        self.spawned = []
+        self.paused = []
+        def spawnProcess(pp, bin, args, path=None, env=None):
+            self.spawned.append(args)
+            transport = mock.Mock()
+            transport.pauseProducing = lambda : self.paused.append(True)
+            transport.resumeProducing = lambda : self.paused.pop()
+            pp.makeConnection(transport)
+            code = exitCode
+            for chunk in output:
+                if transport.signalProcess.called:
+                    code = 9
+                    break
+                if self.paused:
+                    # the poller should not pause output for long
+                    self.fail("output is paused")
+                pp.outReceived(chunk)
+            if code:
+                reason = error.ProcessTerminated(code)
+            else:
+                reason = error.ProcessDone(0)
+            pp.processEnded(failure.Failure(reason))
+        self.patch(reactor, 'spawnProcess', spawnProcess)
+
+    def test_poll_bulk(self):
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'fetch'),
+                "no interesting output")
+        self.addGetProcessOutputAndValueResult(
+                self.gpoSubcommandPattern('git', 'reset'),
+                ('done', '', 0))
+        output = GitLogParser.output
+        self.patchSpawnProcess([ output[:100], output[100:] ])
+        self.poller.bulk_batch_size = 1
+
+        d = self.poller.poll()
+        def check_changes(_):
+            self.assertEqual(self.spawned, [['git', 'log', '--reverse',
+                '--name-only', gitpoller.GitLogParser.format,
+                'master..origin/master']])
+            self.assertEqual(len(self.changes_added), 2)
+            self.assertEqual(self.changes_added[0]['author'],
+                             'Sammy Jankis <email@example.com>')
+            self.assertEqual(self.changes_added[0]['revision'],
+                             '4423cdbcbb89c14e50dd5f4152415afd686c5241')
+            self.assertEqual(self.changes_added[0]['when_timestamp'],
+                                        epoch2datetime(1273258009))
+            self.assertEqual(self.changes_added[0]['comments'],
+                             'first\n\nmultiline')
+            self.assertEqual(self.changes_added[0]['files'],
+                             [ 'file1', 'file two' ])
+            self.assertEqual(self.changes_added[0]['branch'], 'master')
+            self.assertEqual(self.changes_added[0]['src'], 'git')
+            self.assertEqual(self.changes_added[1]['revision'],
+                             '64a5dc2a4bd4f558b5dd193d47c83c7d7abc9a1a')
+            self.assertEqual(self.changes_added[1]['files'], [])
+            self.assertEqual(self.poller.changeCount, 2)
+            self.assertEqual(self.paused, [])
+        d.addCallback(check_changes)
+        return d
+
+    def test_poll_bulk_pauses_output(self):
+        self.patchSpawnProcess([ GitLogParser.output, '' ])
+        self.poller.bulk_batch_size = 1
+        added = []
+        def addChange(**kwargs):
+            added.append(self.paused[:])
+            return defer.succeed(None)
+        self.master.addChange = addChange
+
+        d = self.poller._process_changes(None)
+        def check(_):
+            # the second commit is only complete once git exits
+            self.assertEqual(added, [[True], []])
+        d.addCallback(check)
+        return d
+
+    def test_poll_bulk_git_fails(self):
+        self.patchSpawnProcess([], exitCode=128)
+        d = self.poller._process_changes(None)
+        def cb(_):
+            self.fail("should have failed")
+        def eb(f):
+            f.trap(EnvironmentError)
+            self.assertEqual(self.changes_added, [])
+        d.addCallbacks(cb, eb)
+        return d
+
+    def test_poll_bulk_addChange_fails(self):
+        self.patchSpawnProcess([ GitLogParser.output, '' ])
+        self.poller.bulk_batch_size = 1
+        def addChange(**kwargs):
+            return defer.fail(RuntimeError('oh noes'))
+        self.master.addChange = addChange
+
+        d = self.poller._process_changes(None)
+        def cb(_):
+            self.fail("should have failed")
+        def eb(f):
+            f.trap(RuntimeError)
+            self.assertEqual(self.paused, [])
+        d.addCallbacks(cb, eb)
+        return d
+
+class TestGitPollerBranches(gpo.GetProcessOutputMixin,
+                    changesource.ChangeSourceMixin,
+                    unittest.TestCase):
+
+    def setUp(self):
+        self.setUpGetProcessOutput()
+        d = self.setUpChangeSource()
+        def create_poller(_):
+            self.poller = gitpoller.GitPoller('git@example.com:foo/baz.git',
+                    branches=['master', 'release/*'])
+            self.poller.master = self.master
+        d.addCallback(create_poller)
+        return d
+
+    def tearDown(self):
+        self.tearDownGetProcessOutput()
+        return self.tearDownChangeSource()
+
+    def test_describe(self):
+        self.assertSubstring("branches: master, release/*",
+                             self.poller.describe())
+
+    def test_poll(self):
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'fetch'),
+                "no interesting output")
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'for-each-ref'),
+                '\n'.join([
+                    'aaaa refs/heads/master',
+                    'bbbb refs/heads/release/1',
+                    'cccc refs/remotes/origin/HEAD',
+                    'cccc refs/remotes/origin/master',
+                    'bbbb refs/remotes/origin/release/1',
+                    'dddd refs/remotes/origin/release/2',
+                    'eeee refs/remotes/origin/feature',
+                    ]))
+        updated = []
+        def update_ref(bin, args, **kwargs):
+            updated.append(args[1:])
+            return ('', '', 0)
+        self.addGetProcessOutputAndValueResult(
+                self.gpoSubcommandPattern('git', 'update-ref'), update_ref)
+        self.addGetProcessOutputAndValueResult(
+                self.gpoSubcommandPattern('git', 'update-ref'), update_ref)
+
+        spawned = []
+        def spawnProcess(pp, bin, args, path=None, env=None):
+            spawned.append(args[-1])
+            pp.makeConnection(mock.Mock())
+            pp.outReceived(GitLogParser.output)
+            pp.processEnded(failure.Failure(error.ProcessDone(0)))
+        self.patch(reactor, 'spawnProcess', spawnProcess)
+
+        d = self.poller.poll()
+        def check(_):
+            # only master has new revisions; release/2 is new, so it is
+            # just recorded, and feature is not tracked
+            self.assertEqual(spawned, ['aaaa..cccc'])
+            self.assertEqual(updated, [['refs/heads/master', 'cccc'],
+                                       ['refs/heads/release/2', 'dddd']])
+            self.assertEqual([ (c['branch'], c['revision'][:4])
+                               for c in self.changes_added ],
+                             [('master', '4423'), ('master', '64a5')])
+        d.addCallback(check)
+        return d
+
+    def test_poll_failed_branch(self):
+        self.addGetProcessOutputResult(
+                self.gpoSubcommandPattern('git', 'for-each-ref'),
+                '\n'.join([
+                    'aaaa refs/heads/master',
+                    'cccc refs/remotes/origin/master',
+                    ]))
+        def spawnProcess(pp, bin, args, path=None, env=None):
+            pp.makeConnection(mock.Mock())
+            pp.processEnded(failure.Failure(error.ProcessTerminated(128)))
+        self.patch(reactor, 'spawnProcess', spawnProcess)
+
+        d = self.poller._process_changes(None)
+        def check(_):
+            # the branch is not updated, so it is retried on the next poll
+            self.assertEqual(self.changes_added, [])
+            self.assertEqual(len(self.flushLoggedErrors(EnvironmentError)), 1)
+        d.addCallback(check)
+        return d
+
+class GitProcessLimit(gpo.GetProcessOutputMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.setUpGetProcessOutput()
+        self.addCleanup(gitpoller.setGitProcessLimit, 10)
+
+    def test_limit(self):
+        gitpoller.setGitProcessLimit(1)
+        first = defer.Deferred()
+        started = []
+        def run(bin, args, **kwargs):
+            started.append(args[0])
+            if args[0] == 'first':
+                return first
+            return 'output'
+        self.addGetProcessOutputResult(self.gpoAnyPattern(), run)
+        self.addGetProcessOutputResult(self.gpoAnyPattern(), run)
+
+        d1 = gitpoller.getProcessOutput('git', ['first'])
+        d2 = gitpoller.getProcessOutput('git', ['second'])
+        self.assertEqual(started, ['first'])
+        first.callback('done')
+        self.assertEqual(started, ['first', 'second'])
+        return defer.gatherResults([d1, d2])
@@ -0,0 +1,124 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+from twisted.trial import unittest
+from buildbot.changes import router
+from buildbot.changes.filter import ChangeFilter
+
+class Change(object):
+    project = ''
+    repository = ''
+    branch = None
+    category = None
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class OverridingFilter(ChangeFilter):
+    # also accepts changes on the 'extra' branch
+    def filter_change(self, change):
+        return (change.branch == 'extra' or
+                ChangeFilter.filter_change(self, change))
+
+class ChangeRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = router.ChangeRouter('changes')
+        self.delivered = []
+
+    def subscribe(self, name, change_filter=None):
+        def cb(change):
+            self.delivered.append((name, change))
+        return self.router.subscribe(cb, change_filter)
+
+    def deliver(self, **kwargs):
+        change = Change(**kwargs)
+        self.delivered = []
+        self.router.deliver(change)
+        return sorted(name for name, ch in self.delivered)
+
+    def test_unfiltered(self):
+        self.subscribe('all')
+        self.assertEqual(self.deliver(branch='x'), ['all'])
+
+    def test_indexed(self):
+        evaluated = []
+        for i in range(10):
+            self.subscribe(i, ChangeFilter(branch='b%d' % i,
+                    filter_fn=lambda c, i=i : evaluated.append(i) or True))
+        self.assertEqual(self.deliver(branch='b3'), [3])
+        # only the matching filter was evaluated
+        self.assertEqual(evaluated, [3])
+
+    def test_indexed_filter_still_applied(self):
+        self.subscribe('f', ChangeFilter(branch='trunk', project_re='^bb'))
+        self.assertEqual(self.deliver(branch='trunk', project='bb'), ['f'])
+        self.assertEqual(self.deliver(branch='trunk', project='xx'), [])
+        self.assertEqual(self.deliver(branch='other', project='bb'), [])
+
+    def test_shortest_list(self):
+        cf = ChangeFilter(branch=['a', 'b', 'c'], category='cat')
+        sub = self.subscribe('f', cf)
+        self.assertEqual(sub.index_key, ('category', frozenset(['cat'])))
+        self.assertEqual(self.deliver(branch='b', category='cat'), ['f'])
+        self.assertEqual(self.deliver(branch='d', category='cat'), [])
+
+    def test_none_branch(self):
+        self.subscribe('default', ChangeFilter(branch=None))
+        self.subscribe('trunk', ChangeFilter(branch='trunk'))
+        self.assertEqual(self.deliver(branch=None), ['default'])
+        self.assertEqual(self.deliver(branch='trunk'), ['trunk'])
+
+    def test_regex_and_fn_filters(self):
+        self.subscribe('re', ChangeFilter(branch_re='rel.*'))
+        self.subscribe('fn', ChangeFilter(filter_fn=lambda c : c.project == 'p'))
+        self.assertEqual(self.deliver(branch='release'), ['re'])
+        self.assertEqual(self.deliver(branch='x', project='p'), ['fn'])
+
+    def test_other_filter(self):
+        cf = mock.Mock()
+        cf.filter_change = lambda c : c.branch == 'yes'
+        self.subscribe('mock', cf)
+        self.assertEqual(self.deliver(branch='yes'), ['mock'])
+        self.assertEqual(self.deliver(branch='no'), [])
+
+    def test_overridden_filter_change(self):
+        sub = self.subscribe('o', OverridingFilter(branch='trunk'))
+        self.assertEqual(sub.index_key, None)
+        self.assertEqual(self.deliver(branch='trunk'), ['o'])
+        self.assertEqual(self.deliver(branch='extra'), ['o'])
+        self.assertEqual(self.deliver(branch='other'), [])
+
+    def test_unhashable_value(self):
+        self.subscribe('f', ChangeFilter(category='cat'))
+        self.assertEqual(self.deliver(category=['cat']), [])
+
+    def test_unsubscribe(self):
+        sub1 = self.subscribe('a', ChangeFilter(branch=['x', 'y']))
+        sub2 = self.subscribe('b', ChangeFilter(branch='x'))
+        sub3 = self.subscribe('c')
+        sub1.unsubscribe()
+        self.assertEqual(self.deliver(branch='x'), ['b', 'c'])
+        self.assertEqual(self.deliver(branch='y'), ['c'])
+        sub2.unsubscribe()
+        sub3.unsubscribe()
+        self.assertEqual(self.router.index, {})
+        self.assertEqual(self.deliver(branch='x'), [])
+
+    def test_filter_exception(self):
+        self.subscribe('bad', ChangeFilter(filter_fn=lambda c : 1/0))
+        self.subscribe('good')
+        self.assertEqual(self.deliver(branch='x'), ['good'])
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
@@ -43,9 +43,11 @@ global_defaults = dict(
     logCompressionMethod='bz2',
     logMaxTailSize=None,
     logMaxSize=None,
+    buildStatusStore='pickle',
     properties=properties.Properties(),
     mergeRequests=None,
     prioritizeBuilders=None,
+    builderDispatchConcurrency=1,
     slavePortnum=None,
     multiMaster=False,
     debugPassword=None,
@@ -154,6 +156,7 @@ class MasterConfig(ConfigErrorsMixin, dirs.DirsMixin, unittest.TestCase):
                 db_poll_interval=None),
             metrics = None,
             caches = dict(Changes=10, Builds=15),
+            cacheMaxBytes = {},
             schedulers = {},
             builders = [],
             slaves = [],
@@ -360,10 +363,25 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
         self.do_test_load_global(dict(logCompressionMethod='gz'),
                                  logCompressionMethod='gz')
 
+    def test_load_global_logCompressionMethod_zlib_blocks(self):
+        self.do_test_load_global(dict(logCompressionMethod='zlib-blocks'),
+                                 logCompressionMethod='zlib-blocks')
+
     def test_load_global_logCompressionMethod_invalid(self):
         self.cfg.load_global(self.filename,
                 dict(logCompressionMethod='foo'), self.errors)
-        self.assertConfigError(self.errors, "must be 'bz2' or 'gz'")
+        self.assertConfigError(self.errors,
+                "must be 'bz2', 'gz' or 'zlib-blocks'")
+
+    def test_load_global_buildStatusStore(self):
+        self.do_test_load_global(dict(buildStatusStore='sqlite'),
+                                 buildStatusStore='sqlite')
+
+    def test_load_global_buildStatusStore_invalid(self):
+        self.cfg.load_global(self.filename,
+                dict(buildStatusStore='foo'), self.errors)
+        self.assertConfigError(self.errors,
+                "must be 'pickle' or 'sqlite'")
 
     def test_load_global_logMaxSize(self):
         self.do_test_load_global(dict(logMaxSize=123), logMaxSize=123)
@@ -406,6 +424,15 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                 dict(prioritizeBuilders='yes'), self.errors)
         self.assertConfigError(self.errors, "must be a callable")
 
+    def test_load_global_builderDispatchConcurrency(self):
+        self.do_test_load_global(dict(builderDispatchConcurrency=4),
+                builderDispatchConcurrency=4)
+
+    def test_load_global_builderDispatchConcurrency_invalid(self):
+        self.cfg.load_global(self.filename,
+                dict(builderDispatchConcurrency=0), self.errors)
+        self.assertConfigError(self.errors, "must be a positive int")
+
     def test_load_global_slavePortnum_int(self):
         self.do_test_load_global(dict(slavePortnum=123),
                 slavePortnum='tcp:123')
@@ -546,6 +573,22 @@ class MasterConfig_loaders(ConfigErrorsMixin, unittest.TestCase):
                 self.errors)
         self.assertResults(caches=dict(Changes=10, Builds=15, foo=1))
 
+    def test_load_caches_cacheMaxBytes(self):
+        self.cfg.load_caches(self.filename,
+                dict(cacheMaxBytes=dict(Builds=2**20)),
+                self.errors)
+        self.assertResults(cacheMaxBytes=dict(Builds=2**20))
+
+    def test_load_caches_cacheMaxBytes_invalid(self):
+        self.cfg.load_caches(self.filename,
+                dict(cacheMaxBytes=13), self.errors)
+        self.assertConfigError(self.errors, "must be a dictionary")
+
+    def test_load_caches_cacheMaxBytes_invalid_value(self):
+        self.cfg.load_caches(self.filename,
+                dict(cacheMaxBytes=dict(Builds=0)), self.errors)
+        self.assertConfigError(self.errors, "must be a positive int")
+
 
     def test_load_schedulers_defaults(self):
         self.cfg.load_schedulers(self.filename, {}, self.errors)
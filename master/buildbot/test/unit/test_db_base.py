@@ -63,15 +63,31 @@ class TestCachedDecorator(unittest.TestCase):
             self.invocations.append(key)
             return defer.succeed(key * 2)
 
-    def get_cache(self, cache_name, miss_fn):
+        @base.cached_many("mycache")
+        def getThings(self, keys):
+            if self.invocations is None:
+                self.invocations = []
+            self.invocations.append(keys)
+            return defer.succeed(dict((key, key * 2) for key in keys
+                                      if key != 'missing'))
+
+    def get_cache(self, cache_name, miss_fn, miss_many_fn=None):
         self.assertEqual(cache_name, "mycache")
         cache = mock.Mock(name="mycache")
         if self.cache_get_raises_exception:
             def ex(key):
                 raise RuntimeError("cache.get called unexpectedly")
             cache.get = ex
+            cache.get_many = ex
         else:
             cache.get = miss_fn
+            if miss_many_fn:
+                def get_many(keys):
+                    d = miss_many_fn(keys)
+                    d.addCallback(lambda values :
+                            [ values.get(key) for key in keys ])
+                    return d
+                cache.get_many = get_many
         return cache
 
     # tests
@@ -104,3 +120,39 @@ class TestCachedDecorator(unittest.TestCase):
         comp = self.TestConnectorComponent(connector)
 
         yield comp.getThing("foo", no_cache=1)
+
+    @defer.inlineCallbacks
+    def test_cached_many(self):
+        connector = mock.Mock(name="connector")
+        connector.master.caches.get_cache = self.get_cache
+
+        comp = self.TestConnectorComponent(connector)
+
+        res = yield comp.getThings(["foo", "missing", "bar"])
+
+        self.assertEqual((res, comp.invocations),
+                    (['foofoo', None, 'barbar'],
+                     [["foo", "missing", "bar"]]))
+
+    @defer.inlineCallbacks
+    def test_cached_many_single_miss_fn(self):
+        # the single-key miss function given to the cache by a cached_many
+        # method uses the batched method
+        connector = mock.Mock(name="connector")
+        connector.master.caches.get_cache = self.get_cache
+
+        comp = self.TestConnectorComponent(connector)
+
+        res = yield comp.getThings.cache.get("foo")
+        self.assertEqual((res, comp.invocations), ('foofoo', [["foo"]]))
+
+    @defer.inlineCallbacks
+    def test_cached_many_no_cache(self):
+        connector = mock.Mock(name="connector")
+        connector.master.caches.get_cache = self.get_cache
+        self.cache_get_raises_exception = True
+
+        comp = self.TestConnectorComponent(connector)
+
+        res = yield comp.getThings(["foo", "missing"], no_cache=1)
+        self.assertEqual(res, ['foofoo', None])
@@ -17,7 +17,7 @@ import datetime
 import sqlalchemy as sa
 from twisted.trial import unittest
 from twisted.internet import task, defer
-from buildbot.db import buildrequests
+from buildbot.db import buildrequests, buildsets, sourcestamps, changes
 from buildbot.test.util import connector_component, db
 from buildbot.test.fake import fakedb
 from buildbot.util import UTC, epoch2datetime
@@ -47,13 +47,19 @@ class TestBuildsetsConnectorComponent(
         self.MASTER_ID = fakedb.FakeBuildRequestsComponent.MASTER_ID
         self.OTHER_MASTER_ID = self.MASTER_ID + 1111
         d = self.setUpConnectorComponent(
-            table_names=[ 'patches', 'changes', 'sourcestamp_changes',
+            table_names=[ 'patches', 'changes', 'change_files',
+                'change_properties', 'sourcestamp_changes',
                 'buildsets', 'buildset_properties', 'buildrequests',
                 'objects', 'buildrequest_claims', 'sourcestamps', 'sourcestampsets' ])
 
         def finish_setup(_):
             self.db.buildrequests = \
                     buildrequests.BuildRequestsConnectorComponent(self.db)
+            # claimAndFetch uses these components, too
+            self.db.buildsets = buildsets.BuildsetsConnectorComponent(self.db)
+            self.db.sourcestamps = \
+                    sourcestamps.SourceStampsConnectorComponent(self.db)
+            self.db.changes = changes.ChangesConnectorComponent(self.db)
             self.db.master.getObjectId = lambda : defer.succeed(self.MASTER_ID)
         d.addCallback(finish_setup)
 
@@ -245,6 +251,44 @@ class TestBuildsetsConnectorComponent(
         d.addCallback(check)
         return d
 
+    def test_getBuildRequests_after_brid_arg(self):
+        return self.do_test_getBuildRequests_claim_args(
+                claimed=False, after_brid=51,
+                expected=[52])
+
+    def test_getBuildRequests_after_brid_arg_all(self):
+        return self.do_test_getBuildRequests_claim_args(
+                after_brid=50,
+                expected=[51, 52, 53])
+
+    def test_getBuildRequests_brids_arg(self):
+        return self.do_test_getBuildRequests_claim_args(
+                claimed=False, brids=[50, 52, 53, 99],
+                expected=[52])
+
+    def test_getBuildRequests_brids_arg_empty(self):
+        return self.do_test_getBuildRequests_claim_args(
+                brids=[], expected=[])
+
+    def test_getBuildRequests_brids_arg_batches(self):
+        return self.do_test_getBuildRequests_claim_args(
+                brids=range(1, 300), expected=[50, 51, 52, 53])
+
+    def test_getLatestBrid(self):
+        d = self.insertTestData([
+            fakedb.BuildRequest(id=70, buildsetid=self.BSID),
+            fakedb.BuildRequest(id=72, buildsetid=self.BSID),
+        ])
+        d.addCallback(lambda _ :
+                self.db.buildrequests.getLatestBrid())
+        d.addCallback(lambda brid : self.assertEqual(brid, 72))
+        return d
+
+    def test_getLatestBrid_empty(self):
+        d = self.db.buildrequests.getLatestBrid()
+        d.addCallback(lambda brid : self.assertEqual(brid, None))
+        return d
+
     def test_getBuildRequests_combo(self):
         d = self.insertTestData([
             # 44: everything we want
@@ -371,6 +415,83 @@ class TestBuildsetsConnectorComponent(
             ], 1300305712, [ 44 ],
             expfailure=buildrequests.AlreadyClaimedError)
 
+    @defer.inlineCallbacks
+    def test_claimAndFetch(self):
+        clock = task.Clock()
+        clock.advance(1300305712)
+        yield self.insertTestData([
+            fakedb.Patch(id=3, patch_base64='aGVsbG8sIHdvcmxk',
+                patchlevel=1, subdir='sub', patch_author='me',
+                patch_comment='c'),
+            fakedb.SourceStampSet(id=235),
+            fakedb.SourceStamp(id=235, sourcestampsetid=235, codebase='a',
+                branch='br', revision='abc'),
+            fakedb.SourceStamp(id=236, sourcestampsetid=235, codebase='b',
+                patchid=3),
+            fakedb.Change(changeid=13, branch='br', revision='9'),
+            fakedb.ChangeFile(changeid=13, filename='f'),
+            fakedb.Change(changeid=14, branch='br', revision='10'),
+            fakedb.ChangeProperty(changeid=14, property_name='p',
+                property_value='["v", "Change"]'),
+            fakedb.SourceStampChange(sourcestampid=235, changeid=14),
+            fakedb.SourceStampChange(sourcestampid=235, changeid=13),
+            fakedb.Buildset(id=self.BSID2, sourcestampsetid=235,
+                reason='because'),
+            fakedb.BuildsetProperty(buildsetid=self.BSID2,
+                property_name='prop', property_value='[22, "fakedb"]'),
+            fakedb.BuildRequest(id=44, buildsetid=self.BSID2,
+                buildername='bbb'),
+            fakedb.BuildRequest(id=45, buildsetid=self.BSID),
+            fakedb.BuildRequest(id=46, buildsetid=self.BSID2,
+                buildername='bbb'),
+        ])
+
+        brdicts = yield self.db.buildrequests.claimAndFetch([ 46, 44 ],
+                                                            _reactor=clock)
+
+        self.assertEqual([ br['brid'] for br in brdicts ], [ 46, 44 ])
+        br = brdicts[1]
+        self.assertEqual((br['buildername'], br['claimed'], br['mine'],
+                          br['claimed_at']),
+                         ('bbb', True, True, epoch2datetime(1300305712)))
+        self.assertEqual(br['buildset']['reason'], 'because')
+        self.assertEqual(br['buildset_properties'],
+                         dict(prop=(22, 'fakedb')))
+
+        sslist = sorted(br['sourcestamps'], key=lambda ss : ss['ssid'])
+        self.assertEqual([ (ss['ssid'], ss['codebase']) for ss in sslist ],
+                         [ (235, 'a'), (236, 'b') ])
+        self.assertEqual(sslist[0]['changeids'], set([13, 14]))
+        self.assertEqual([ (ch['changeid'], ch['files'], ch['properties'])
+                           for ch in sslist[0]['chdicts'] ],
+                         [ (13, ['f'], {}),
+                           (14, [], dict(p=('v', 'Change'))) ])
+        self.assertEqual((sslist[1]['patch_body'], sslist[1]['patch_level'],
+                          sslist[1]['patch_subdir'], sslist[1]['chdicts']),
+                         ('hello, world', 1, 'sub', []))
+
+        # and the requests were actually claimed
+        brlist = yield self.db.buildrequests.getBuildRequests(claimed='mine')
+        self.assertEqual(sorted([ br['brid'] for br in brlist ]), [ 44, 46 ])
+
+    @defer.inlineCallbacks
+    def test_claimAndFetch_other_master_claim(self):
+        yield self.insertTestData([
+            fakedb.BuildRequest(id=44, buildsetid=self.BSID),
+            fakedb.BuildRequest(id=45, buildsetid=self.BSID),
+            fakedb.BuildRequestClaim(brid=45,
+                objectid=self.OTHER_MASTER_ID, claimed_at=1300103810),
+        ])
+        try:
+            yield self.db.buildrequests.claimAndFetch([ 44, 45 ])
+        except buildrequests.AlreadyClaimedError:
+            pass
+        else:
+            self.fail("claimAndFetch did not fail")
+
+        brlist = yield self.db.buildrequests.getBuildRequests(claimed='mine')
+        self.assertEqual(brlist, [])
+
     @db.skip_for_dialect('mysql')
     def test_claimBuildRequests_other_master_claim_stress(self):
         d = self.do_test_claimBuildRequests(
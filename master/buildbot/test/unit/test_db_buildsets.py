@@ -154,6 +154,27 @@ class TestBuildsetsConnectorComponent(
         "returns an empty dict even if no such buildset exists"
         return self.do_test_getBuildsetProperties(91, [], dict())
 
+    def test_getManyBuildsetProperties(self):
+        d = self.insertTestData([
+            fakedb.Buildset(id=91, sourcestampsetid=234, complete=0,
+                    results=-1, submitted_at=0),
+            fakedb.BuildsetProperty(buildsetid=91, property_name='prop1',
+                    property_value='["one", "fake1"]'),
+            fakedb.Buildset(id=92, sourcestampsetid=234, complete=0,
+                    results=-1, submitted_at=0),
+            fakedb.Buildset(id=93, sourcestampsetid=234, complete=0,
+                    results=-1, submitted_at=0),
+            fakedb.BuildsetProperty(buildsetid=93, property_name='prop2',
+                    property_value='["two", "fake2"]'),
+        ])
+        d.addCallback(lambda _ :
+                self.db.buildsets.getManyBuildsetProperties([93, 92, 91, 94]))
+        def check(props):
+            self.assertEqual(props, [ dict(prop2=("two", "fake2")), dict(),
+                                      dict(prop1=("one", "fake1")), dict() ])
+        d.addCallback(check)
+        return d
+
     def test_getBuildset_incomplete_None(self):
         d = self.insertTestData([
             fakedb.Buildset(id=91, sourcestampsetid=234, complete=0,
@@ -289,6 +310,36 @@ class TestBuildsetsConnectorComponent(
         d.addCallback(check)
         return d
 
+    def test_getBuildsets_bsids(self):
+        d = self.insert_test_getBuildsets_data()
+        d.addCallback(lambda _ :
+                self.db.buildsets.getBuildsets(bsids=[92, 93, 91]))
+        def check(bsdictlist):
+            self.assertEqual([ bsdict['bsid'] for bsdict in bsdictlist ],
+                             [92, 91])
+        d.addCallback(check)
+        return d
+
+    def test_getBuildsets_bsids_complete(self):
+        d = self.insert_test_getBuildsets_data()
+        d.addCallback(lambda _ :
+                self.db.buildsets.getBuildsets(complete=False,
+                                               bsids=[91, 92]))
+        def check(bsdictlist):
+            self.assertEqual([ bsdict['bsid'] for bsdict in bsdictlist ],
+                             [91])
+        d.addCallback(check)
+        return d
+
+    def test_getBuildsets_bsids_empty(self):
+        d = self.insert_test_getBuildsets_data()
+        d.addCallback(lambda _ :
+                self.db.buildsets.getBuildsets(bsids=[]))
+        def check(bsdictlist):
+            self.assertEqual(bsdictlist, [])
+        d.addCallback(check)
+        return d
+
     def test_completeBuildset(self):
         d = self.insert_test_getBuildsets_data()
         d.addCallback(lambda _ :
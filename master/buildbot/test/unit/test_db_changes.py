@@ -140,6 +140,18 @@ class TestChangesConnectorComponent(
         d.addCallback(check14)
         return d
 
+    def test_getChanges(self):
+        d = self.insertTestData(self.change13_rows + self.change14_rows)
+        d.addCallback(lambda _ :
+                self.db.changes.getChanges([14, 99, 13]))
+        def check(chdicts):
+            self.assertEqual(len(chdicts), 3)
+            self.assertEqual(chdicts[0], self.change14_dict)
+            self.assertEqual(chdicts[1], None)
+            self.assertEqual(chdicts[2]['changeid'], 13)
+        d.addCallback(check)
+        return d
+
     def test_Change_fromChdict_with_chdict(self):
         # test that the chdict getChange returns works with Change.fromChdict
         d = Change.fromChdict(mock.Mock(), self.change14_dict)
@@ -452,6 +464,46 @@ class TestChangesConnectorComponent(
         d.addCallback(check)
         return d
 
+    def test_getChangesSince(self):
+        d = self.insertTestData([
+            fakedb.Change(changeid=11),
+            fakedb.Change(changeid=12),
+        ] + self.change13_rows + self.change14_rows)
+        d.addCallback(lambda _ :
+                self.db.changes.getChangesSince(11))
+        def check(changes):
+            self.assertEqual([ c['changeid'] for c in changes ],
+                             [12, 13, 14])
+            self.assertEqual(changes[0]['files'], [])
+            self.assertEqual(sorted(changes[1]['files']),
+                        sorted(['master/README.txt', 'slave/README.txt']))
+            self.assertEqual(changes[1]['properties'],
+                        { 'notest' : ('no', 'Change') })
+            self.assertEqual(changes[2], self.change14_dict)
+        d.addCallback(check)
+        return d
+
+    def test_getChangesSince_limit(self):
+        d = self.insertTestData([
+            fakedb.Change(changeid=11),
+            fakedb.Change(changeid=12),
+        ] + self.change13_rows + self.change14_rows)
+        d.addCallback(lambda _ :
+                self.db.changes.getChangesSince(10, limit=2))
+        def check(changes):
+            self.assertEqual([ c['changeid'] for c in changes ], [11, 12])
+        d.addCallback(check)
+        return d
+
+    def test_getChangesSince_empty(self):
+        d = self.insertTestData(self.change13_rows)
+        d.addCallback(lambda _ :
+                self.db.changes.getChangesSince(13))
+        def check(changes):
+            self.assertEqual(changes, [])
+        d.addCallback(check)
+        return d
+
     def test_getRecentChanges_subset(self):
         d = self.insertTestData([
             fakedb.Change(changeid=8),
@@ -71,11 +71,28 @@ class DBConnector(db.RealDatabaseMixin, unittest.TestCase):
     def test_doCleanup_configured(self):
         self.db.changes.pruneChanges = mock.Mock(
                         return_value=defer.succeed(None))
+        self.db.invalidations.pruneInvalidations = mock.Mock(
+                        return_value=defer.succeed(None))
         d = self.startService()
         @d.addCallback
         def check(_):
             self.db._doCleanup()
             self.assertTrue(self.db.changes.pruneChanges.called)
+            self.assertFalse(self.db.invalidations.pruneInvalidations.called)
+        return d
+
+    def test_doCleanup_multiMaster(self):
+        self.db.changes.pruneChanges = mock.Mock(
+                        return_value=defer.succeed(None))
+        self.db.invalidations.pruneInvalidations = mock.Mock(
+                        return_value=defer.succeed(None))
+        d = self.startService()
+        @d.addCallback
+        def check(_):
+            self.master.config.multiMaster = True
+            self.db._doCleanup()
+            self.db.invalidations.pruneInvalidations.assert_called_with(
+                    self.db.INVALIDATION_HORIZON)
         return d
 
     def test_setup_check_version_bad(self):
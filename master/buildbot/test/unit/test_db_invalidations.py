@@ -0,0 +1,124 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+from twisted.trial import unittest
+from twisted.internet import task
+from buildbot.db import invalidations
+from buildbot.test.util import connector_component
+from buildbot.test.fake import fakedb
+from buildbot.util import epoch2datetime
+
+class TestInvalidationsConnectorComponent(
+            connector_component.ConnectorComponentMixin,
+            unittest.TestCase):
+
+    def setUp(self):
+        d = self.setUpConnectorComponent(
+            table_names=['cache_invalidations' ])
+
+        def finish_setup(_):
+            self.db.invalidations = \
+                    invalidations.InvalidationsConnectorComponent(self.db)
+        d.addCallback(finish_setup)
+
+        return d
+
+    def tearDown(self):
+        return self.tearDownConnectorComponent()
+
+    # common sample data
+
+    background_data = [
+        fakedb.CacheInvalidation(id=10, cache_name='usdicts',
+                cache_key_json='3', objectid=1, created_at=1000),
+        fakedb.CacheInvalidation(id=11, cache_name='usdicts',
+                cache_key_json='4', objectid=2, created_at=2000),
+        fakedb.CacheInvalidation(id=12, cache_name='other',
+                cache_key_json='["a", 1]', objectid=1, created_at=3000),
+    ]
+
+    # tests
+
+    def test_addInvalidations(self):
+        clock = task.Clock()
+        clock.advance(1234)
+        d = self.db.invalidations.addInvalidations('usdicts', [ 1, (2, 'x') ],
+                objectid=9, _reactor=clock)
+        def check(_):
+            def thd(conn):
+                tbl = self.db.model.cache_invalidations
+                rows = conn.execute(tbl.select(order_by=tbl.c.id)).fetchall()
+                self.assertEqual(
+                    [ (r.cache_name, r.cache_key_json, r.objectid,
+                       r.created_at) for r in rows ],
+                    [ ('usdicts', '1', 9, 1234),
+                      ('usdicts', '[2, "x"]', 9, 1234) ])
+            return self.db.pool.do(thd)
+        d.addCallback(check)
+        return d
+
+    def test_getInvalidationsSince(self):
+        d = self.insertTestData(self.background_data)
+        d.addCallback(lambda _ :
+                self.db.invalidations.getInvalidationsSince(10))
+        def check(invdicts):
+            self.assertEqual(invdicts, [
+                dict(invalidationid=11, cache_name='usdicts', key=4,
+                     objectid=2, created_at=epoch2datetime(2000)),
+                dict(invalidationid=12, cache_name='other', key=('a', 1),
+                     objectid=1, created_at=epoch2datetime(3000)),
+            ])
+        d.addCallback(check)
+        return d
+
+    def test_getInvalidationsSince_limit(self):
+        d = self.insertTestData(self.background_data)
+        d.addCallback(lambda _ :
+                self.db.invalidations.getInvalidationsSince(0, limit=2))
+        def check(invdicts):
+            self.assertEqual([ i['invalidationid'] for i in invdicts ],
+                             [ 10, 11 ])
+        d.addCallback(check)
+        return d
+
+    def test_getLatestInvalidationId(self):
+        d = self.insertTestData(self.background_data)
+        d.addCallback(lambda _ :
+                self.db.invalidations.getLatestInvalidationId())
+        def check(invalidationid):
+            self.assertEqual(invalidationid, 12)
+        d.addCallback(check)
+        return d
+
+    def test_getLatestInvalidationId_empty(self):
+        d = self.db.invalidations.getLatestInvalidationId()
+        def check(invalidationid):
+            self.assertEqual(invalidationid, None)
+        d.addCallback(check)
+        return d
+
+    def test_pruneInvalidations(self):
+        clock = task.Clock()
+        clock.advance(3500)
+        d = self.insertTestData(self.background_data)
+        d.addCallback(lambda _ :
+                self.db.invalidations.pruneInvalidations(1000, _reactor=clock))
+        d.addCallback(lambda _ :
+                self.db.invalidations.getInvalidationsSince(0))
+        def check(invdicts):
+            self.assertEqual([ i['invalidationid'] for i in invdicts ],
+                             [ 12 ])
+        d.addCallback(check)
+        return d
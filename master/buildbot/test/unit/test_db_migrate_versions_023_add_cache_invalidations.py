@@ -0,0 +1,52 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import sqlalchemy as sa
+from twisted.trial import unittest
+from buildbot.test.util import migration
+
+class Migration(migration.MigrateTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        return self.setUpMigrateTest()
+
+    def tearDown(self):
+        return self.tearDownMigrateTest()
+
+    # tests
+
+    def test_update(self):
+        def setup_thd(conn):
+            pass
+
+        def verify_thd(conn):
+            metadata = sa.MetaData()
+            metadata.bind = conn
+
+            tbl = sa.Table('cache_invalidations', metadata, autoload=True)
+            conn.execute(tbl.insert(), cache_name='usdicts',
+                    cache_key_json='13', objectid=None, created_at=1000)
+            res = conn.execute(sa.select([ tbl.c.id, tbl.c.cache_name,
+                    tbl.c.cache_key_json, tbl.c.objectid, tbl.c.created_at ]))
+            self.assertEqual([ tuple(r) for r in res.fetchall() ],
+                    [ (1, 'usdicts', '13', None, 1000) ])
+
+            insp = sa.engine.reflection.Inspector.from_engine(conn)
+            indexes = insp.get_indexes('cache_invalidations')
+            self.assertEqual(
+                sorted([ i['name'] for i in indexes ]),
+                [ 'cache_invalidations_created_at' ])
+
+        return self.do_test_migration(22, 23, setup_thd, verify_thd)
@@ -53,6 +53,7 @@ class TestSchedulersConnectorComponent(
     change6 = fakedb.Change(changeid=6, branch='sql')
 
     scheduler24 = fakedb.Object(id=24)
+    scheduler25 = fakedb.Object(id=25, name='other')
 
     def addClassifications(self, _, objectid, *classifications):
         def thd(conn):
@@ -148,6 +149,24 @@ class TestSchedulersConnectorComponent(
         d.addCallback(check)
         return d
 
+    def test_getAllChangeClassifications(self):
+        d = self.insertTestData([ self.change3, self.change4, self.change5,
+                                  self.change6, self.scheduler24,
+                                  self.scheduler25 ])
+        d.addCallback(self.addClassifications, 24,
+                (3, 1), (4, 0), (5, 1))
+        d.addCallback(self.addClassifications, 25,
+                (4, 1), (6, 0))
+        d.addCallback(lambda _ :
+            self.db.schedulers.getAllChangeClassifications([24, 25, 26]))
+        def check(cls):
+            self.assertEqual(cls, {
+                24 : { 3 : True, 4 : False, 5 : True },
+                25 : { 4 : True, 6 : False },
+                26 : {} })
+        d.addCallback(check)
+        return d
+
     def test_getChangeClassifications_branch(self):
         d = self.insertTestData([ self.change3, self.change4, self.change5,
                                   self.change6, self.scheduler24 ])
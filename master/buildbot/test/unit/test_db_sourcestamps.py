@@ -204,6 +204,44 @@ class TestSourceStampsConnectorComponent(
         d.addCallback(check)
         return d
 
+    def test_getSourceStamps(self):
+        d = self.insertTestData([
+            fakedb.SourceStampSet(id=234),
+            fakedb.SourceStamp(id=235, sourcestampsetid=234, codebase='b'),
+            fakedb.SourceStamp(id=234, sourcestampsetid=234, codebase='a'),
+            fakedb.SourceStampChange(sourcestampid=235, changeid=16),
+        ])
+        d.addCallback(lambda _ :
+                self.db.sourcestamps.getSourceStamps(234))
+        def check(sslist):
+            self.assertEqual([ (ss['ssid'], ss['codebase'], ss['changeids'])
+                               for ss in sslist ],
+                             [ (234, 'a', set()), (235, 'b', set([16])) ])
+        d.addCallback(check)
+        return d
+
+    def test_getSourceStampSets(self):
+        d = self.insertTestData([
+            fakedb.Patch(id=99, patch_base64='aGVsbG8sIHdvcmxk',
+                patch_author='bar', patch_comment='foo', subdir='/foo',
+                patchlevel=3),
+            fakedb.SourceStampSet(id=234),
+            fakedb.SourceStamp(id=234, sourcestampsetid=234, patchid=99),
+            fakedb.SourceStampSet(id=235),
+            fakedb.SourceStamp(id=235, sourcestampsetid=235, codebase='a'),
+            fakedb.SourceStamp(id=236, sourcestampsetid=235, codebase='b'),
+            fakedb.SourceStampSet(id=237),
+        ])
+        d.addCallback(lambda _ :
+                self.db.sourcestamps.getSourceStampSets([235, 237, 234]))
+        def check(sslists):
+            self.assertEqual([ [ ss['ssid'] for ss in sslist ]
+                               for sslist in sslists ],
+                             [ [235, 236], [], [234] ])
+            self.assertEqual(sslists[2][0]['patch_body'], 'hello, world')
+        d.addCallback(check)
+        return d
+
     def test_getSourceStamp_nosuch(self):
         d = self.db.sourcestamps.getSourceStamp(234)
         def check(ssdict):
@@ -330,6 +330,18 @@ class TestUsersConnectorComponent(connector_component.ConnectorComponentMixin,
         d.addCallback(check1)
         return d
 
+    def test_updateUser_invalidates(self):
+        d = self.insertTestData(self.user1_rows)
+        def update1(_):
+            return self.db.users.updateUser(
+                uid=1, identifier='lye')
+        d.addCallback(update1)
+        def check(_):
+            self.db.master.caches.invalidate.assert_called_with(
+                    'usdicts', [1])
+        d.addCallback(check)
+        return d
+
     def test_updateUser_bb(self):
         d = self.insertTestData(self.user3_rows)
         def update3(_):
@@ -446,6 +458,10 @@ class TestUsersConnectorComponent(connector_component.ConnectorComponentMixin,
                 self.assertEqual(len(r), 0)
             return self.db.pool.do(thd)
         d.addCallback(check1)
+        def check_invalidated(_):
+            self.db.master.caches.invalidate.assert_called_with(
+                    'usdicts', [1])
+        d.addCallback(check_invalidated)
         return d
 
     def test_removeNoMatch(self):
@@ -499,6 +499,44 @@ class Polling(dirs.DirsMixin, misc.PatcherMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_pollDatabaseChanges_batches(self):
+        self.db.insertTestData([
+            fakedb.Object(id=53, name=self.master_name,
+                          class_name='buildbot.master.BuildMaster'),
+            fakedb.ObjectState(objectid=53, name='last_processed_change',
+                               value_json='10'),
+        ] + [ fakedb.Change(changeid=id) for id in range(10, 18) ])
+        self.master.change_poll_batch_size = 3
+        self.patch(self.db.changes, 'getChangesSince',
+                mock.Mock(wraps=self.db.changes.getChangesSince))
+        d = self.master.pollDatabaseChanges()
+        def check(_):
+            self.assertEqual([ ch.number for ch in self.gotten_changes],
+                             range(11, 18))
+            self.assertEqual(self.db.changes.getChangesSince.call_count, 3)
+            self.db.state.assertState(53, last_processed_change=17)
+        d.addCallback(check)
+        return d
+
+    def test_pollDatabaseChanges_gap(self):
+        self.db.insertTestData([
+            fakedb.Object(id=53, name=self.master_name,
+                          class_name='buildbot.master.BuildMaster'),
+            fakedb.ObjectState(objectid=53, name='last_processed_change',
+                               value_json='10'),
+            fakedb.Change(changeid=10),
+            fakedb.Change(changeid=11),
+            fakedb.Change(changeid=13),
+        ])
+        d = self.master.pollDatabaseChanges()
+        def check(_):
+            # 12 may not be committed yet, so polling stops before it
+            self.assertEqual([ ch.number for ch in self.gotten_changes],
+                             [ 11 ])
+            self.db.state.assertState(53, last_processed_change=11)
+        d.addCallback(check)
+        return d
+
     def test_pollDatabaseChanges_nothing_new(self):
         self.db.insertTestData([
             fakedb.Object(id=53, name='master',
@@ -516,6 +554,104 @@ class Polling(dirs.DirsMixin, misc.PatcherMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_pollDatabaseBuildRequests_after_brid(self):
+        self.master.UNCLAIMED_RESCAN_INTERVAL = 1000
+        self.master.UNCLAIMED_POLL_LOOKBACK = 5
+        self.db.insertTestData([
+            fakedb.SourceStampSet(id=127),
+            fakedb.SourceStamp(id=127, sourcestampsetid=127),
+            fakedb.Buildset(id=99, sourcestampsetid=127),
+            fakedb.BuildRequest(id=2, buildsetid=9, buildername='two'),
+            fakedb.BuildRequest(id=11, buildsetid=9, buildername='eleventy'),
+            fakedb.BuildRequest(id=12, buildsetid=9, buildername='twelvety'),
+        ])
+        self.db.buildrequests.fakeClaimBuildRequest(2)
+        self.db.buildrequests.fakeClaimBuildRequest(12)
+        getBuildRequests = mock.Mock(
+                wraps=self.db.buildrequests.getBuildRequests)
+        self.patch(self.db.buildrequests, 'getBuildRequests',
+                getBuildRequests)
+        d = self.master.pollDatabaseBuildRequests()
+        def insert2_and_unclaim(_):
+            self.gotten_buildrequest_additions.append('MARK')
+            self.db.insertTestData([
+                fakedb.BuildRequest(id=20, buildsetid=9,
+                                        buildername='twenty'),
+            ])
+            self.db.buildrequests.fakeUnclaimBuildRequest(2)
+            self.db.buildrequests.fakeUnclaimBuildRequest(12)
+        d.addCallback(insert2_and_unclaim)
+        d.addCallback(lambda _ : self.master.pollDatabaseBuildRequests())
+        def rescan(_):
+            self.gotten_buildrequest_additions.append('MARK')
+            self.master._last_unclaimed_rescan -= 1000
+        d.addCallback(rescan)
+        d.addCallback(lambda _ : self.master.pollDatabaseBuildRequests())
+        def check(_):
+            adds = self.gotten_buildrequest_additions
+            self.assertEqual(adds[:2], [
+                dict(bsid=9, brid=11, buildername='eleventy'),
+                'MARK',
+            ])
+            # only requests above 12 - 5 are read, so the unclaimed request
+            # 12 and the new request 20 are seen, but not request 2..
+            self.assertEqual(sorted(adds[2:4]), [
+                dict(bsid=9, brid=12, buildername='twelvety'),
+                dict(bsid=9, brid=20, buildername='twenty'),
+            ])
+            self.assertEqual(adds[4:], [
+                'MARK',
+                # ..until the next rescan
+                dict(bsid=9, brid=2, buildername='two'),
+            ])
+            self.assertEqual(
+                [ c[1] for c in getBuildRequests.call_args_list ], [
+                dict(claimed=False),
+                dict(claimed=False, after_brid=7),
+                dict(claimed=False),
+            ])
+        d.addCallback(check)
+        return d
+
+    def test_pollDatabaseBuildRequests_out_of_order(self):
+        self.master.UNCLAIMED_RESCAN_INTERVAL = 1000
+        self.db.insertTestData([
+            fakedb.SourceStampSet(id=127),
+            fakedb.SourceStamp(id=127, sourcestampsetid=127),
+            fakedb.Buildset(id=99, sourcestampsetid=127),
+            fakedb.BuildRequest(id=11, buildsetid=9, buildername='eleventy'),
+            fakedb.BuildRequest(id=13, buildsetid=9, buildername='thirteen'),
+        ])
+        d = self.master.pollDatabaseBuildRequests()
+        def insert_lower(_):
+            self.gotten_buildrequest_additions = []
+            # a request whose transaction committed after that of 13
+            self.db.insertTestData([
+                fakedb.BuildRequest(id=12, buildsetid=9,
+                                        buildername='twelvety'),
+            ])
+        d.addCallback(insert_lower)
+        d.addCallback(lambda _ : self.master.pollDatabaseBuildRequests())
+        def claim(_):
+            self.gotten_buildrequest_additions.append('MARK')
+            self.db.buildrequests.fakeClaimBuildRequest(11)
+        d.addCallback(claim)
+        d.addCallback(lambda _ : self.master.pollDatabaseBuildRequests())
+        def unclaim(_):
+            self.gotten_buildrequest_additions.append('MARK')
+            self.db.buildrequests.fakeUnclaimBuildRequest(11)
+        d.addCallback(unclaim)
+        d.addCallback(lambda _ : self.master.pollDatabaseBuildRequests())
+        def check(_):
+            self.assertEqual(self.gotten_buildrequest_additions, [
+                dict(bsid=9, brid=12, buildername='twelvety'),
+                'MARK',
+                'MARK',
+                dict(bsid=9, brid=11, buildername='eleventy'),
+            ])
+        d.addCallback(check)
+        return d
+
     def test_pollDatabaseBuildRequests_empty(self):
         d = self.master.pollDatabaseBuildRequests()
         def check(_):
@@ -540,6 +676,8 @@ class Polling(dirs.DirsMixin, misc.PatcherMixin, unittest.TestCase):
         return d
 
     def test_pollDatabaseBuildRequests_incremental(self):
+        # rescan all unclaimed requests on every poll
+        self.master.UNCLAIMED_RESCAN_INTERVAL = 0
         d = defer.succeed(None)
         def insert1(_):
             self.db.insertTestData([
@@ -577,3 +715,44 @@ class Polling(dirs.DirsMixin, misc.PatcherMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+
+    @defer.inlineCallbacks
+    def test_pollDatabaseCacheInvalidations_first(self):
+        # the first poll catches up to the latest invalidation, clearing the
+        # caches rather than processing the invalidations
+        self.db.insertTestData([
+            fakedb.CacheInvalidation(id=5, cache_name='usdicts',
+                                     cache_key_json='3', objectid=99),
+        ])
+        self.master.caches = mock.Mock()
+        yield self.master.pollDatabaseCacheInvalidations()
+        self.assertTrue(self.master.caches.clear.called)
+        self.assertFalse(self.master.caches.evict.called)
+        self.assertEqual(self.master._last_processed_invalidation, 5)
+
+    @defer.inlineCallbacks
+    def test_pollDatabaseCacheInvalidations(self):
+        self.db.insertTestData([
+            fakedb.Object(id=22, name=self.master_name,
+                          class_name='buildbot.master.BuildMaster'),
+            fakedb.CacheInvalidation(id=5, cache_name='usdicts',
+                                     cache_key_json='3', objectid=99),
+        ])
+        self.master.caches = mock.Mock()
+        self.master.invalidation_poll_batch_size = 2
+        yield self.master.pollDatabaseCacheInvalidations()
+        self.db.insertTestData([
+            fakedb.CacheInvalidation(id=6, cache_name='usdicts',
+                                     cache_key_json='4', objectid=99),
+            # made by this master, and already applied
+            fakedb.CacheInvalidation(id=7, cache_name='usdicts',
+                                     cache_key_json='5', objectid=22),
+            fakedb.CacheInvalidation(id=8, cache_name='other',
+                                     cache_key_json='[1, "a"]', objectid=99),
+        ])
+        yield self.master.pollDatabaseCacheInvalidations()
+        self.assertEqual(self.master.caches.evict.call_args_list, [
+            (('usdicts', [4]), {}),
+            (('other', [(1, 'a')]), {}),
+        ])
+        self.assertEqual(self.master._last_processed_invalidation, 8)
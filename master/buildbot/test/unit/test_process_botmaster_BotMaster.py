@@ -22,6 +22,29 @@ from buildbot.process.botmaster import BotMaster
 from buildbot import config, interfaces
 from buildbot.test.fake import fakemaster
 
+class TestBuildRequestAdded(unittest.TestCase):
+
+    def setUp(self):
+        self.master = mock.Mock()
+        self.botmaster = BotMaster(self.master)
+        self.botmaster.maybeStartBuildsForBuilder = mock.Mock()
+        self.botmaster.startService()
+        self.callback = self.master.subscribeToBuildRequests.call_args[0][0]
+
+    def tearDown(self):
+        return self.botmaster.stopService()
+
+    def test_known_builder(self):
+        bldr = mock.Mock()
+        self.botmaster.builders = { 'bldr' : bldr }
+        self.callback(dict(bsid=1, brid=13, buildername='bldr'))
+        bldr.addPendingRequest.assert_called_with(13)
+        self.botmaster.maybeStartBuildsForBuilder.assert_called_with('bldr')
+
+    def test_unknown_builder(self):
+        self.callback(dict(bsid=1, brid=13, buildername='bldr'))
+        self.botmaster.maybeStartBuildsForBuilder.assert_called_with('bldr')
+
 class TestCleanShutdown(unittest.TestCase):
     def setUp(self):
         self.botmaster = BotMaster(mock.Mock())
@@ -31,6 +31,7 @@ class Test(unittest.TestCase):
             return sorted(builders, lambda b1,b2 : cmp(b1.name, b2.name))
         self.master = self.botmaster.master = mock.Mock(name='master')
         self.master.config.prioritizeBuilders = prioritizeBuilders
+        self.master.config.builderDispatchConcurrency = 1
         self.brd = botmaster.BuildRequestDistributor(self.botmaster)
         self.brd.startService()
 
@@ -149,6 +150,76 @@ class Test(unittest.TestCase):
         self.quiet_deferred.addCallback(check)
         return self.quiet_deferred
 
+    def addManualBuilders(self, names):
+        # builders whose maybeStartBuild calls finish only when the test says
+        self.addBuilders(names)
+        self.running_calls = {}
+        for name in names:
+            def maybeStartBuild(n=name):
+                self.maybeStartBuild_calls.append(n)
+                d = self.running_calls[n] = defer.Deferred()
+                return d
+            self.builders[name].maybeStartBuild = maybeStartBuild
+
+    def finishBuilder(self, name):
+        self.running_calls.pop(name).callback(None)
+
+    def test_maybeStartBuildsOn_concurrency(self):
+        self.master.config.builderDispatchConcurrency = 2
+        self.addManualBuilders(['bldr1', 'bldr2', 'bldr3', 'bldr4'])
+        self.brd.maybeStartBuildsOn(['bldr4', 'bldr3', 'bldr2', 'bldr1'])
+
+        # the two highest-priority builders start right away
+        self.assertEqual(self.maybeStartBuild_calls, ['bldr1', 'bldr2'])
+
+        # and the next starts when either finishes
+        self.finishBuilder('bldr2')
+        self.assertEqual(self.maybeStartBuild_calls,
+                ['bldr1', 'bldr2', 'bldr3'])
+        self.finishBuilder('bldr1')
+        self.assertEqual(self.maybeStartBuild_calls,
+                ['bldr1', 'bldr2', 'bldr3', 'bldr4'])
+
+        self.finishBuilder('bldr3')
+        self.finishBuilder('bldr4')
+        return self.quiet_deferred
+
+    def test_maybeStartBuildsOn_concurrency_same_builder(self):
+        self.master.config.builderDispatchConcurrency = 2
+        self.addManualBuilders(['bldr1', 'bldr2'])
+        self.brd.maybeStartBuildsOn(['bldr1'])
+        self.assertEqual(self.maybeStartBuild_calls, ['bldr1'])
+
+        # bldr1 is still running, so bldr2 is started ahead of it
+        self.brd.maybeStartBuildsOn(['bldr1', 'bldr2'])
+        self.assertEqual(self.maybeStartBuild_calls, ['bldr1', 'bldr2'])
+
+        # and bldr1 runs again once the first invocation is done
+        self.finishBuilder('bldr1')
+        self.assertEqual(self.maybeStartBuild_calls,
+                ['bldr1', 'bldr2', 'bldr1'])
+
+        self.finishBuilder('bldr1')
+        self.finishBuilder('bldr2')
+        return self.quiet_deferred
+
+    def test_stopService_concurrency(self):
+        self.master.config.builderDispatchConcurrency = 2
+        self.addManualBuilders(['bldr1', 'bldr2', 'bldr3'])
+        self.brd.maybeStartBuildsOn(['bldr1', 'bldr2', 'bldr3'])
+
+        stopped = []
+        stop_d = self.brd.stopService()
+        stop_d.addCallback(lambda _ : stopped.append(True))
+
+        # stopService waits for both running builders, and bldr3 never starts
+        self.finishBuilder('bldr1')
+        self.assertEqual(stopped, [])
+        self.finishBuilder('bldr2')
+        self.assertEqual(stopped, [True])
+        self.assertEqual(self.maybeStartBuild_calls, ['bldr1', 'bldr2'])
+        return self.quiet_deferred
+
     def do_test_sortBuilders(self, prioritizeBuilders, oldestRequestTimes,
             expected, returnDeferred=False):
         self.addBuilders(oldestRequestTimes.keys())
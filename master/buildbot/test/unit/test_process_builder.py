@@ -17,13 +17,22 @@ import mock
 import random
 from twisted.trial import unittest
 from twisted.python import failure
-from twisted.internet import defer
-from buildbot import config
+from twisted.internet import defer, task
+from buildbot import config, buildslave
 from buildbot.test.fake import fakedb, fakemaster
-from buildbot.process import builder
+from buildbot.process import builder, buildrequest, slavebuilder
 from buildbot.db import buildrequests
 from buildbot.util import epoch2datetime
 
+def forbidRescans(db):
+    # allow fetching particular build requests, but not scanning the table
+    getBuildRequests = db.buildrequests.getBuildRequests
+    def get(**kwargs):
+        if kwargs.get('brids') is None:
+            raise AssertionError("unexpected rescan")
+        return getBuildRequests(**kwargs)
+    db.buildrequests.getBuildRequests = get
+
 class TestBuilderBuildCreation(unittest.TestCase):
 
     def setUp(self):
@@ -300,6 +309,9 @@ class TestBuilderBuildCreation(unittest.TestCase):
             # ..and fail
             return defer.fail(buildrequests.AlreadyClaimedError())
         self.db.buildrequests.claimBuildRequests = claimBuildRequests
+        # the requests are re-checked with one query
+        self.db.buildrequests.getBuildRequest = mock.Mock(
+                side_effect=AssertionError("fetched one request at a time"))
 
         self.setSlaveBuilders({'test-slave1':1, 'test-slave2':1})
         rows = self.base_rows + [
@@ -311,6 +323,202 @@ class TestBuilderBuildCreation(unittest.TestCase):
         yield self.do_test_maybeStartBuild(rows=rows,
                 exp_claims=[11], exp_builds=[('test-slave2', [11])])
 
+    def setUpSharedSlave(self):
+        # set up self.bldr and a second builder, bldr2, sharing a slave with
+        # max_builds=1, and with claims that do not complete until
+        # self.finishClaims is called
+        slave = buildslave.BuildSlave('slv', 'pw', max_builds=1)
+        slave.locks = [] # normally set by reconfigService
+        def startBuildFor(slavebuilder, buildrequests):
+            self.builds_started.append((slavebuilder, buildrequests))
+            slavebuilder.buildStarted()
+            return defer.succeed(True)
+
+        bldr2 = builder.Builder('bldr2', _addServices=False)
+        bldr2.master = self.master
+        bldr2.botmaster = self.master.botmaster
+        bldr2._startBuildFor = startBuildFor
+        bldr2.startService()
+        self.bldr._startBuildFor = startBuildFor
+
+        for bldr in self.bldr, bldr2:
+            sb = slavebuilder.SlaveBuilder()
+            sb.name = sb.builder_name = bldr.name
+            sb.slave = slave
+            sb.state = slavebuilder.IDLE
+            slave.addSlaveBuilder(sb)
+            bldr.slaves = [ sb ]
+
+        self.claims = []
+        claimAndFetch = self.db.buildrequests.claimAndFetch
+        def delayedClaimAndFetch(brids):
+            d = defer.Deferred()
+            d.addCallback(lambda _ : claimAndFetch(brids))
+            self.claims.append(d)
+            return d
+        self.db.buildrequests.claimAndFetch = delayedClaimAndFetch
+
+        mastercfg = config.MasterConfig()
+        mastercfg.builders = [ config.BuilderConfig(name='bldr2',
+                slavename="slv", builddir="bdir2", slavebuilddir="sbdir2",
+                factory=self.factory) ]
+        d = bldr2.reconfigService(mastercfg)
+        d.addCallback(lambda _ : bldr2)
+        return d
+
+    def finishClaims(self):
+        while self.claims:
+            self.claims.pop(0).callback(None)
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_shared_slave_max_builds(self):
+        # two builders dispatched at once, as with
+        # builderDispatchConcurrency=2, cannot both start builds on a slave
+        # with max_builds=1
+        yield self.makeBuilder()
+        bldr2 = yield self.setUpSharedSlave()
+        yield self.db.insertTestData(self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr"),
+            fakedb.BuildRequest(id=11, buildsetid=11, buildername="bldr2"),
+        ])
+
+        d1 = self.bldr.maybeStartBuild()
+        d2 = bldr2.maybeStartBuild()
+        self.assertEqual(len(self.claims), 1)
+        self.finishClaims()
+        yield defer.gatherResults([ d1, d2 ])
+
+        self.db.buildrequests.assertMyClaims([10])
+        self.assertBuildsStarted([('bldr', [10])])
+        self.assertFalse(self.bldr.slaves[0].reserved)
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_shared_slave_claim_fails(self):
+        yield self.makeBuilder()
+        bldr2 = yield self.setUpSharedSlave()
+        yield self.db.insertTestData(self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr"),
+            fakedb.BuildRequest(id=11, buildsetid=11, buildername="bldr2"),
+        ])
+
+        d1 = self.bldr.maybeStartBuild()
+        # another master claims the request in the meantime
+        self.db.buildrequests.fakeClaimBuildRequest(10, objectid=9999)
+        self.finishClaims()
+        yield d1
+
+        # so the slave is free again for the other builder
+        self.assertFalse(self.bldr.slaves[0].reserved)
+        d2 = bldr2.maybeStartBuild()
+        self.finishClaims()
+        yield d2
+
+        self.db.buildrequests.assertMyClaims([11])
+        self.assertBuildsStarted([('bldr2', [11])])
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_pending_queue_no_rescan(self):
+        yield self.makeBuilder(mergeRequests=False)
+        self.bldr._reactor = task.Clock()
+
+        self.setSlaveBuilders({'test-slave1':1})
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr",
+                submitted_at=130000),
+            fakedb.BuildRequest(id=11, buildsetid=11, buildername="bldr",
+                submitted_at=135000),
+        ]
+        yield self.do_test_maybeStartBuild(rows=rows,
+                exp_claims=[10], exp_builds=[('test-slave1', [10])])
+
+        # a request added without a notification is not seen, and the
+        # remaining request comes from the queue rather than the database
+        forbidRescans(self.db)
+        yield self.do_test_maybeStartBuild(rows=[
+                fakedb.BuildRequest(id=12, buildsetid=11, buildername="bldr",
+                    submitted_at=120000) ],
+                exp_claims=[10, 11],
+                exp_builds=[('test-slave1', [10]), ('test-slave1', [11])])
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_pending_queue_addPendingRequest(self):
+        yield self.makeBuilder(mergeRequests=False)
+        self.bldr._reactor = task.Clock()
+
+        self.setSlaveBuilders({'test-slave1':0})
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr",
+                submitted_at=130000),
+        ]
+        yield self.db.insertTestData(rows)
+        yield self.bldr._getPendingRequests()
+
+        yield self.db.insertTestData([
+            fakedb.BuildRequest(id=11, buildsetid=11, buildername="bldr",
+                submitted_at=120000),
+            fakedb.BuildRequest(id=12, buildsetid=11, buildername="other",
+                submitted_at=120000),
+        ])
+        self.bldr.addPendingRequest(11)
+        self.bldr.addPendingRequest(12) # wrong builder; ignored
+        forbidRescans(self.db)
+        # and the added requests are fetched with one query
+        self.db.buildrequests.getBuildRequest = mock.Mock(
+                side_effect=AssertionError("fetched one request at a time"))
+
+        self.setSlaveBuilders({'test-slave1':1})
+        yield self.do_test_maybeStartBuild(
+                exp_claims=[11], exp_builds=[('test-slave1', [11])])
+        self.assertEqual([ br['brid'] for br in self.bldr._pending_requests ],
+                         [10])
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_pending_queue_reconciled(self):
+        yield self.makeBuilder(mergeRequests=False)
+        clock = self.bldr._reactor = task.Clock()
+
+        self.setSlaveBuilders({'test-slave1':1})
+        yield self.do_test_maybeStartBuild(rows=self.base_rows,
+                exp_claims=[], exp_builds=[])
+
+        # added behind the builder's back, e.g., unclaimed by another master
+        yield self.db.insertTestData([
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr",
+                submitted_at=130000),
+        ])
+        clock.advance(self.bldr.PENDING_RECONCILE_INTERVAL - 1)
+        yield self.do_test_maybeStartBuild(exp_claims=[], exp_builds=[])
+
+        clock.advance(1)
+        yield self.do_test_maybeStartBuild(
+                exp_claims=[10], exp_builds=[('test-slave1', [10])])
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_pending_queue_requeue_not_started(self):
+        yield self.makeBuilder(mergeRequests=False)
+        self.bldr._reactor = task.Clock()
+
+        starts = [ False, True ]
+        def _startBuildFor(slavebuilder, buildrequests):
+            self.builds_started.append((slavebuilder, buildrequests))
+            return defer.succeed(starts.pop(0))
+        self.bldr._startBuildFor = _startBuildFor
+
+        self.setSlaveBuilders({'test-slave1':1})
+        rows = self.base_rows + [
+            fakedb.BuildRequest(id=10, buildsetid=11, buildername="bldr",
+                submitted_at=130000),
+        ]
+        yield self.do_test_maybeStartBuild(rows=rows,
+                exp_claims=[], exp_builds=[('test-slave1', [10])])
+        self.assertEqual([ br['brid'] for br in self.bldr._pending_requests ],
+                         [10])
+
+        # the request is retried from the queue
+        forbidRescans(self.db)
+        yield self.do_test_maybeStartBuild(exp_claims=[10],
+                exp_builds=[('test-slave1', [10]), ('test-slave1', [10])])
+
     @defer.inlineCallbacks
     def test_maybeStartBuild_builder_stopped(self):
         yield self.makeBuilder()
@@ -624,6 +832,127 @@ class TestBuilderBuildCreation(unittest.TestCase):
                                              mergeRequests_fn)
         self.assertEqual(res, [ brdicts[0], brdicts[1], brdicts[2] ])
 
+    @defer.inlineCallbacks
+    def test_mergeRequests_default_by_key(self):
+        yield self.makeBuilder()
+
+        # 19 and 21 are on the same branch; 20 is on another branch, and 22
+        # has a patch, so can't be merged with anything
+        yield self.db.insertTestData([
+                fakedb.Patch(id=1, patch_base64='YWJj', patchlevel=1),
+            ])
+        for brid, branch, patchid in [ (19, 'br', None), (20, 'other', None),
+                                       (21, 'br', None), (22, 'br', 1) ]:
+            yield self.db.insertTestData([
+                fakedb.SourceStampSet(id=brid),
+                fakedb.SourceStamp(id=brid, sourcestampsetid=brid,
+                    branch=branch, revision='rev', patchid=patchid),
+                fakedb.Buildset(id=brid, sourcestampsetid=brid, reason='foo',
+                    submitted_at=1300305712, results=-1),
+                fakedb.BuildRequest(id=brid, buildsetid=brid,
+                    buildername='bldr', submitted_at=1300305712, results=-1),
+            ])
+
+        brdicts = yield defer.gatherResults([
+                self.db.buildrequests.getBuildRequest(id)
+                for id in (19, 20, 21, 22)
+            ])
+
+        # the pairwise comparison is never used
+        def canBeMergedWith(self, other):
+            raise AssertionError("should not be called")
+        self.patch(buildrequest.BuildRequest, 'canBeMergedWith',
+                canBeMergedWith)
+        # and the keys are calculated from source stamps fetched in a batch,
+        # without looking up each request's buildset and source stamps
+        self.db.buildsets.getBuildset = mock.Mock(
+                side_effect=AssertionError("fetched one buildset at a time"))
+        self.db.sourcestamps.getSourceStamps = mock.Mock(
+                side_effect=AssertionError("fetched one sourcestamp set"))
+        mergeRequests_fn = self.bldr._getMergeRequestsFn()
+
+        res = yield self.bldr._mergeRequests(brdicts[0], brdicts,
+                                             mergeRequests_fn)
+        self.assertEqual(res, [ brdicts[0], brdicts[2] ])
+        res = yield self.bldr._mergeRequests(brdicts[1], brdicts,
+                                             mergeRequests_fn)
+        self.assertEqual(res, [ brdicts[1] ])
+        res = yield self.bldr._mergeRequests(brdicts[3], brdicts,
+                                             mergeRequests_fn)
+        self.assertEqual(res, [ brdicts[3] ])
+
+        # no BuildRequest objects were needed
+        self.assertEqual([ 'brobj' in brdict for brdict in brdicts ],
+                         [ False ] * 4)
+
+    @defer.inlineCallbacks
+    def test_maybeStartBuild_default_merge_uses_claim_data(self):
+        yield self.makeBuilder()
+        self.setSlaveBuilders({'test-slave1':1})
+        rows = self.base_rows[:]
+        for brid in 10, 11, 12:
+            rows.append(fakedb.BuildRequest(id=brid, buildsetid=11,
+                            buildername="bldr", submitted_at=130000 + brid))
+        yield self.db.insertTestData(rows)
+
+        # each merged request is constructed once, from the data fetched
+        # with the claim
+        fromBrdict = buildrequest.BuildRequest.fromBrdict
+        constructed = []
+        def wrappedFromBrdict(master, brdict):
+            constructed.append((brdict['brid'], 'buildset' in brdict))
+            return fromBrdict(master, brdict)
+        self.patch(buildrequest.BuildRequest, 'fromBrdict',
+                staticmethod(wrappedFromBrdict))
+        yield self.do_test_maybeStartBuild(exp_claims=[10, 11, 12],
+                exp_builds=[('test-slave1', [10, 11, 12])])
+        self.assertEqual(sorted(constructed),
+                         [ (10, True), (11, True), (12, True) ])
+
+    @defer.inlineCallbacks
+    def test_mergeRequestsByKey(self):
+        yield self.makeBuilder()
+
+        yield self.db.insertTestData([
+                fakedb.SourceStampSet(id=234),
+                fakedb.SourceStamp(id=234, sourcestampsetid=234),
+                fakedb.Buildset(id=30, sourcestampsetid=234, reason='foo',
+                    submitted_at=1300305712, results=-1),
+            ] + [
+                fakedb.BuildRequest(id=id, buildsetid=30, buildername='bldr',
+                    priority=13, submitted_at=1300305712, results=-1)
+                for id in (19, 20, 21, 22) ])
+
+        brdicts = yield defer.gatherResults([
+                self.db.buildrequests.getBuildRequest(id)
+                for id in (19, 20, 21, 22)
+            ])
+
+        calls = []
+        def keyfn(builder, breq):
+            calls.append(breq.id)
+            # merge evens with evens, odds with odds, but never merge 21
+            if breq.id == 21:
+                return None
+            return breq.id % 2
+        mergeRequests_fn = builder.mergeRequestsByKey(keyfn)
+
+        odds = yield self.bldr._mergeRequests(brdicts[0], brdicts,
+                                              mergeRequests_fn)
+        self.assertEqual(odds, [ brdicts[0] ])
+        evens = yield self.bldr._mergeRequests(brdicts[3], brdicts,
+                                               mergeRequests_fn)
+        self.assertEqual(evens, [ brdicts[3], brdicts[1] ])
+
+        # keys are calculated once for each request
+        self.assertEqual(sorted(calls), [19, 20, 21, 22])
+
+        # and the result is usable as a pairwise function, too
+        self.assertTrue(mergeRequests_fn(self.bldr,
+                brdicts[1]['brobj'], brdicts[3]['brobj']))
+        self.assertFalse(mergeRequests_fn(self.bldr,
+                brdicts[2]['brobj'], brdicts[2]['brobj']))
+
     @defer.inlineCallbacks
     def test_mergeRequests_no_merging(self):
         yield self.makeBuilder()
@@ -734,6 +1063,28 @@ class TestGetOldestRequestTime(unittest.TestCase):
         d.addCallback(check)
         return d
 
+    @defer.inlineCallbacks
+    def test_gort_from_pending_queue(self):
+        yield self.makeBuilder(name='bldr1')
+        self.bldr._reactor = task.Clock()
+        yield self.db.insertTestData(self.base_rows)
+        rqtime = yield self.bldr.getOldestRequestTime()
+        self.assertEqual(rqtime, epoch2datetime(1000))
+
+        # later calls do not scan the buildrequests table
+        forbidRescans(self.db)
+        rqtime = yield self.bldr.getOldestRequestTime()
+        self.assertEqual(rqtime, epoch2datetime(1000))
+
+        # but do see requests that are added, or unclaimed again
+        yield self.db.insertTestData([
+            fakedb.BuildRequest(id=555, submitted_at=500,
+                        buildername='bldr1', buildsetid=11),
+        ])
+        self.bldr.addPendingRequest(555)
+        rqtime = yield self.bldr.getOldestRequestTime()
+        self.assertEqual(rqtime, epoch2datetime(500))
+
     def test_gort_all_claimed(self):
         d = self.makeBuilder(name='bldr2')
         d.addCallback(lambda _ : self.db.insertTestData(self.base_rows))
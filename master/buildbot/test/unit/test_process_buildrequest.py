@@ -14,6 +14,7 @@
 # Copyright Buildbot Team Members
 
 from twisted.trial import unittest
+from twisted.internet import defer
 from buildbot.test.fake import fakedb, fakemaster
 from buildbot.process import buildrequest
 
@@ -26,6 +27,9 @@ class FakeSource:
     def canBeMergedWith(self, other):
         return self.mergeable
 
+    def getMergeKey(self):
+        return self.mergeable and ('key',) or None
+
 class TestBuildRequest(unittest.TestCase):
 
     def test_fromBrdict(self):
@@ -69,6 +73,41 @@ class TestBuildRequest(unittest.TestCase):
         d.addCallback(check)
         return d
 
+    @defer.inlineCallbacks
+    def test_fromBrdict_claimAndFetch(self):
+        master = fakemaster.make_master()
+        master.db = fakedb.FakeDBConnector(self)
+        master.db.insertTestData([
+            fakedb.Change(changeid=13, branch='trunk', revision='9283',
+                        repository='svn://...', project='world-domination'),
+            fakedb.SourceStampSet(id=234),
+            fakedb.SourceStamp(id=234, sourcestampsetid=234, branch='trunk',
+                        revision='9284', repository='svn://...',
+                        project='world-domination'),
+            fakedb.SourceStampChange(sourcestampid=234, changeid=13),
+            fakedb.Buildset(id=539, reason='triggered', sourcestampsetid=234),
+            fakedb.BuildsetProperty(buildsetid=539, property_name='x',
+                        property_value='[1, "X"]'),
+            fakedb.BuildRequest(id=288, buildsetid=539, buildername='bldr',
+                        priority=13, submitted_at=1200000000),
+        ])
+        brdicts = yield master.db.buildrequests.claimAndFetch([288])
+
+        # nothing more should be fetched from the database
+        def fail(*args, **kwargs):
+            raise AssertionError("unexpected db access")
+        for meth in ('getBuildset', 'getBuildsetProperties'):
+            setattr(master.db.buildsets, meth, fail)
+        master.db.sourcestamps.getSourceStamps = fail
+        master.db.changes.getChange = fail
+
+        br = yield buildrequest.BuildRequest.fromBrdict(master, brdicts[0])
+        self.assertEqual(br.source.ssid, 234)
+        self.assertEqual([ ch.number for ch in br.source.changes], [13])
+        self.assertEqual(br.reason, 'triggered')
+        self.assertEqual(br.properties.getProperty('x'), 1)
+        self.assertEqual(br.id, 288)
+
     def test_fromBrdict_submittedAt_NULL(self):
         master = fakemaster.make_master()
         master.db = fakedb.FakeDBConnector(self)
@@ -343,3 +382,32 @@ class TestBuildRequest(unittest.TestCase):
         self.assertFalse(mergeable, "Request containing different codebases " +
                                     "should always be able to merge")
 
+    def test_getMergeKey(self):
+        r1 = buildrequest.BuildRequest()
+        r1.sources = {"A": FakeSource(), "B": FakeSource()}
+        r2 = buildrequest.BuildRequest()
+        r2.sources = {"A": FakeSource()}
+        self.assertEqual(r1.getMergeKey(), (('key',), ('key',)))
+        self.assertNotEqual(r1.getMergeKey(), r2.getMergeKey())
+
+    def test_getMergeKey_unmergeable(self):
+        r1 = buildrequest.BuildRequest()
+        r1.sources = {"A": FakeSource(), "B": FakeSource(mergeable=False)}
+        self.assertEqual(r1.getMergeKey(), None)
+
+    def mkssdict(self, codebase, patch_body=None):
+        return dict(branch='dev', revision='xyz', project='p',
+                    repository='r', codebase=codebase,
+                    patch_body=patch_body, changeids=set())
+
+    def test_getMergeKeyFromSsdicts(self):
+        key = buildrequest.BuildRequest.getMergeKeyFromSsdicts(
+                [ self.mkssdict('B'), self.mkssdict('A') ])
+        self.assertEqual(key, (('A', 'r', 'dev', 'p', False, 'xyz'),
+                               ('B', 'r', 'dev', 'p', False, 'xyz')))
+
+    def test_getMergeKeyFromSsdicts_unmergeable(self):
+        self.assertEqual(buildrequest.BuildRequest.getMergeKeyFromSsdicts(
+                [ self.mkssdict('A'), self.mkssdict('B', 'diff') ]), None)
+        self.assertEqual(
+                buildrequest.BuildRequest.getMergeKeyFromSsdicts([]), None)
@@ -14,11 +14,12 @@
 # Copyright Buildbot Team Members
 
 import re
+import zlib
 import mock
 from twisted.trial import unittest
 from twisted.internet import defer, reactor
 from twisted.python import log
-from buildbot.process import buildstep
+from buildbot.process import buildstep, metrics
 from buildbot.process.buildstep import regex_log_evaluator
 from buildbot.status.results import FAILURE, SUCCESS, WARNINGS, EXCEPTION
 from buildbot.test.fake import fakebuild
@@ -70,6 +71,21 @@ class TestRegexLogEvaluator(unittest.TestCase):
         new_status = regex_log_evaluator(cmd, step_status, r)
         self.assertEqual(new_status, WARNINGS, "regex_log_evaluator returned %d, should've returned %d" % (new_status, WARNINGS))
 
+    def test_worst_status_wins(self):
+        cmd = FakeCmd("a warning\nan error\n", "")
+        step_status = FakeStepStatus()
+        r = [("error", FAILURE), (re.compile("warn"), WARNINGS),
+             (re.compile(r"(n)\1"), EXCEPTION)]
+        new_status = regex_log_evaluator(cmd, step_status, r)
+        self.assertEqual(new_status, FAILURE)
+
+    def test_multiline_string(self):
+        cmd = FakeCmd("first line\nsecond line", "")
+        step_status = FakeStepStatus()
+        r = [("line.second", FAILURE)]
+        new_status = regex_log_evaluator(cmd, step_status, r)
+        self.assertEqual(new_status, FAILURE)
+
 
 class TestBuildStep(steps.BuildStepMixin, unittest.TestCase):
 
@@ -226,3 +242,54 @@ class TestCustomStepExecution(steps.BuildStepMixin, unittest.TestCase):
         self.expectOutcome(result=FAILURE, status_text=["generic"])
         return self.runStep()
 
+
+
+class TestRemoteCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.cmd = buildstep.RemoteCommand('shell', {})
+        self.cmd.buildslave = mock.Mock()
+        self.cmd.active = True
+        self.cmd.updates = {}
+        self.cmd._decompressors = {}
+        self.got_updates = []
+        self.cmd.remoteUpdate = self.got_updates.append
+
+    def test_remote_update(self):
+        self.cmd.remote_update([ [{'stdout' : 'abc'}, 0],
+                                 [{'rc' : 0}, 0] ])
+        self.assertEqual(self.got_updates, [ {'stdout' : 'abc'}, {'rc' : 0} ])
+
+    def test_remote_update_compressed(self):
+        log_events = []
+        self.patch(metrics.MetricCountEvent, 'log',
+                classmethod(lambda cls, name, count :
+                    log_events.append((name, count))))
+        compressors = {}
+        def compress(stream, data):
+            c = compressors.setdefault(stream, zlib.compressobj())
+            return c.compress(data) + c.flush(zlib.Z_SYNC_FLUSH)
+        out1 = compress('stdout', 'hello ' * 10)
+        out2 = compress('stdout', 'world\n')
+        log1 = compress('x.log', 'logged')
+        self.cmd.remote_update([
+            [{'stdout' : out1, 'compressed' : 'zlib'}, 0],
+            [{'stdout' : out2, 'log' : ('x.log', log1),
+              'compressed' : 'zlib'}, 0],
+        ])
+        self.assertEqual(self.got_updates, [
+            {'stdout' : 'hello ' * 10},
+            {'stdout' : 'world\n', 'log' : ('x.log', 'logged')},
+        ])
+        self.assertEqual(log_events, [
+            ('RemoteCommand.compressed_output_bytes', len(out1)),
+            ('RemoteCommand.output_bytes', 60),
+            ('RemoteCommand.compressed_output_bytes', len(out2) + len(log1)),
+            ('RemoteCommand.output_bytes', 12),
+        ])
+
+    def test_remote_update_unknown_compression(self):
+        self.cmd._finished = mock.Mock()
+        self.cmd.remote_update([ [{'stdout' : 'abc', 'compressed' : 'xz'}, 0] ])
+        self.assertEqual(self.got_updates, [])
+        self.assertTrue(self.cmd._finished.called)
@@ -15,7 +15,9 @@
 
 import mock
 from twisted.trial import unittest
+from twisted.internet import defer
 from buildbot.process import cache
+from buildbot.test.fake import fakemaster, fakedb
 
 class CacheManager(unittest.TestCase):
 
@@ -25,6 +27,8 @@ class CacheManager(unittest.TestCase):
     def make_config(self, **kwargs):
         cfg = mock.Mock()
         cfg.caches = kwargs
+        cfg.cacheMaxBytes = {}
+        cfg.multiMaster = False
         return cfg
 
     def test_get_cache_idempotency(self):
@@ -45,9 +49,93 @@ class CacheManager(unittest.TestCase):
             self.assertEqual((foo_cache.max_size, bar_cache.max_size),
                             (5, 6))
 
+    def test_reconfigService_max_bytes(self):
+        foo_cache = self.caches.get_cache("foo", None)
+        cfg = self.make_config(foo=5)
+        cfg.cacheMaxBytes = dict(foo=1000, bar=2000)
+        d = self.caches.reconfigService(cfg)
+        @d.addCallback
+        def check(_):
+            bar_cache = self.caches.get_cache("bar", None)
+            self.assertEqual((foo_cache.max_bytes, bar_cache.max_bytes),
+                            (1000, 2000))
+        return d
+
     def test_get_metrics(self):
         self.caches.get_cache("foo", None)
         self.assertIn('foo', self.caches.get_metrics())
         metric = self.caches.get_metrics()['foo']
-        for k in 'hits', 'refhits', 'misses', 'max_size':
+        for k in ('hits', 'refhits', 'misses', 'max_size', 'size', 'bytes',
+                  'max_bytes'):
             self.assertIn(k, metric)
+
+    @defer.inlineCallbacks
+    def test_get_metrics_bytes(self):
+        values = dict(a=set(['A']), b=set(['B']))
+        foo_cache = self.caches.get_cache("foo",
+                lambda key : defer.succeed(values[key]),
+                size_fn=lambda value : 100)
+        yield foo_cache.get('a')
+        yield foo_cache.get('b')
+        # the default cache size is 1, so only 'b' is counted
+        metric = self.caches.get_metrics()['foo']
+        self.assertEqual((metric['size'], metric['bytes']), (1, 100))
+
+    def test_get_cache_miss_many_fn(self):
+        miss_many_fn = lambda keys : None
+        foo_cache = self.caches.get_cache("foo", None)
+        self.assertEqual(foo_cache.miss_many_fn, None)
+        foo_cache2 = self.caches.get_cache("foo", None, miss_many_fn)
+        self.assertIdentical(foo_cache, foo_cache2)
+        self.assertIdentical(foo_cache.miss_many_fn, miss_many_fn)
+
+    def make_cache(self, name):
+        values = dict(a=set(['A']), b=set(['B']))
+        self.calls = []
+        def miss_fn(key):
+            self.calls.append(key)
+            return defer.succeed(values[key])
+        return self.caches.get_cache(name, miss_fn)
+
+    @defer.inlineCallbacks
+    def test_evict(self):
+        foo_cache = self.make_cache("foo")
+        a = yield foo_cache.get('a')
+        self.caches.evict("foo", ['a'])
+        self.caches.evict("nosuch", ['a'])
+        yield foo_cache.get('a')
+        self.assertEqual(self.calls, ['a', 'a'])
+        del a
+
+    @defer.inlineCallbacks
+    def test_clear(self):
+        foo_cache = self.make_cache("foo")
+        a = yield foo_cache.get('a')
+        self.caches.clear()
+        yield foo_cache.get('a')
+        self.assertEqual(self.calls, ['a', 'a'])
+        del a
+
+    @defer.inlineCallbacks
+    def do_test_invalidate(self, multiMaster, exp_invalidations):
+        master = fakemaster.make_master()
+        master.db = fakedb.FakeDBConnector(self)
+        self.caches = cache.CacheManager(master)
+        cfg = self.make_config()
+        cfg.multiMaster = multiMaster
+        yield self.caches.reconfigService(cfg)
+
+        foo_cache = self.make_cache("foo")
+        a = yield foo_cache.get('a')
+        yield self.caches.invalidate("foo", ['a'])
+        yield foo_cache.get('a')
+        self.assertEqual(self.calls, ['a', 'a'])
+        master.db.invalidations.assertInvalidations(exp_invalidations)
+        del a
+
+    def test_invalidate(self):
+        return self.do_test_invalidate(False, [])
+
+    def test_invalidate_multiMaster(self):
+        return self.do_test_invalidate(True,
+                [ ('foo', 'a', fakedb.FakeBuildRequestsComponent.MASTER_ID) ])
@@ -0,0 +1,81 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+from twisted.trial import unittest
+from twisted.internet import defer
+from buildbot.process import slavebuilder
+
+class SlaveBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.sb = slavebuilder.SlaveBuilder()
+        self.sb.builder_name = 'bldr'
+        self.remote = mock.Mock()
+        self.remote.callRemote = mock.Mock(
+                side_effect=lambda *args : defer.succeed(None))
+        self.slave = mock.Mock()
+        self.slave.slavename = 'sl'
+        self.slave.compress_output = False
+
+    @defer.inlineCallbacks
+    def do_test_attached(self, commands, exp_calls):
+        yield self.sb.attached(self.slave, self.remote, commands)
+        self.assertEqual(self.remote.callRemote.call_args_list,
+                [ (args, {}) for args in exp_calls ])
+        self.assertEqual(self.sb.state, slavebuilder.IDLE)
+
+    def test_attached_update_window(self):
+        return self.do_test_attached(dict(shell='2.16'), [
+            ('setMaster', self.sb),
+            ('setUpdateWindow', self.sb.updateWindow),
+            ('print', 'attached'),
+        ])
+
+    def test_attached_old_slave(self):
+        return self.do_test_attached(dict(shell='2.15'), [
+            ('setMaster', self.sb),
+            ('print', 'attached'),
+        ])
+
+    def test_attached_no_commands(self):
+        return self.do_test_attached(None, [
+            ('setMaster', self.sb),
+            ('print', 'attached'),
+        ])
+
+    def test_attached_no_update_window(self):
+        self.sb.updateWindow = None
+        return self.do_test_attached(dict(shell='2.16'), [
+            ('setMaster', self.sb),
+            ('print', 'attached'),
+        ])
+
+    def test_attached_compress_output(self):
+        self.slave.compress_output = True
+        return self.do_test_attached(dict(shell='2.17'), [
+            ('setMaster', self.sb),
+            ('setUpdateWindow', self.sb.updateWindow),
+            ('setOutputCompression', 'zlib'),
+            ('print', 'attached'),
+        ])
+
+    def test_attached_compress_output_old_slave(self):
+        self.slave.compress_output = True
+        return self.do_test_attached(dict(shell='2.16'), [
+            ('setMaster', self.sb),
+            ('setUpdateWindow', self.sb.updateWindow),
+            ('print', 'attached'),
+        ])
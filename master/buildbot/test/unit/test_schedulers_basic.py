@@ -133,6 +133,61 @@ class BaseBasicScheduler(CommonStuffMixin,
         d.addCallback(lambda _ : sched.stopService())
         return d
 
+    def test_startService_preloaded(self):
+        sched = self.makeScheduler(self.Subclass, treeStableTimer=10)
+        self.master.db.insertTestData([
+            fakedb.Change(changeid=20),
+            fakedb.SchedulerChange(objectid=self.OBJECTID,
+                                                changeid=20, important=1)
+        ])
+        chdicts = {}
+        d = self.db.changes.getChange(20)
+        d.addCallback(lambda chdict : chdicts.update({ 20 : chdict }))
+
+        # the preloaded data is used instead of querying the db
+        patches = []
+        def preload(_):
+            patches.extend([
+                self.patch(self.db.schedulers, 'getChangeClassifications', None),
+                self.patch(self.db.changes, 'getChanges', None),
+                self.patch(self.db.schedulers, 'classifyChanges', None) ])
+            sched.preloadClassifiedChanges({ 20 : True }, chdicts)
+            return sched.startService(_returnDeferred=True)
+        d.addCallback(preload)
+
+        def check(_):
+            for p in patches:
+                p.restore()
+            self.assertTrue(sched.timer_started)
+            self.assertNotEqual(sched._stable_timers['xxx'], None)
+            self.assertEqual(sched._preloaded_classifications, None)
+        d.addCallback(check)
+        d.addCallback(lambda _ : self.clock.advance(10))
+        d.addCallback(lambda _ :
+                self.assertEqual(self.events, [ 'B[20]@10' ]))
+        d.addCallback(lambda _ : sched.stopService())
+        return d
+
+    def test_startService_unimportant_classified_changes(self):
+        sched = self.makeScheduler(self.Subclass, treeStableTimer=10)
+        self.master.db.insertTestData([
+            fakedb.Change(changeid=20),
+            fakedb.Change(changeid=21),
+            fakedb.SchedulerChange(objectid=self.OBJECTID,
+                                                changeid=20, important=0),
+            fakedb.SchedulerChange(objectid=self.OBJECTID,
+                                                changeid=21, important=0),
+        ])
+
+        d = sched.startService(_returnDeferred=True)
+        def check(_):
+            # no important changes, so the timer is not started
+            self.assertTrue(sched.timer_started)
+            self.assertEqual(sched._stable_timers['xxx'], None)
+        d.addCallback(check)
+        d.addCallback(lambda _ : sched.stopService())
+        return d
+
     def test_gotChange_no_treeStableTimer_unimportant(self):
         sched = self.makeScheduler(self.Subclass, treeStableTimer=None, branch='master')
 
@@ -13,8 +13,9 @@
 #
 # Copyright Buildbot Team Members
 
+import mock
 from twisted.trial import unittest
-from twisted.internet import defer
+from twisted.internet import defer, task
 from buildbot import config
 from buildbot.schedulers import dependent, base
 from buildbot.status.results import SUCCESS, WARNINGS, FAILURE
@@ -42,6 +43,7 @@ class Dependent(scheduler.SchedulerMixin, unittest.TestCase):
 
         sched = dependent.Dependent(name='n', builderNames=['b'],
                                     upstream=upstream)
+        self.clock = sched._reactor = task.Clock()
         self.attachScheduler(sched, self.OBJECTID)
         return sched
 
@@ -131,6 +133,61 @@ class Dependent(scheduler.SchedulerMixin, unittest.TestCase):
     def test_unrelated_buildset(self):
         return self.do_test('unrelated', False, SUCCESS, False)
 
+    def test_unrelated_buildset_completion_no_lookup(self):
+        sched = self.makeScheduler()
+        sched.startService()
+        callbacks = self.master.getSubscriptionCallbacks()
+
+        self.db.insertTestData([
+            fakedb.Buildset(id=44, sourcestampsetid=1093),
+        ])
+        self.db.buildsets.fakeBuildsetCompletion(bsid=44, result=SUCCESS)
+
+        # completions of buildsets we do not track should not hit the db
+        getBuildset = mock.Mock(wraps=self.db.buildsets.getBuildset)
+        getBuildsets = mock.Mock(wraps=self.db.buildsets.getBuildsets)
+        self.patch(self.db.buildsets, 'getBuildset', getBuildset)
+        self.patch(self.db.buildsets, 'getBuildsets', getBuildsets)
+        callbacks['buildset_completion'](44, SUCCESS)
+
+        self.assertFalse(getBuildset.called)
+        self.assertFalse(getBuildsets.called)
+        self.db.buildsets.assertBuildsets(1)
+
+    def test_catch_up_completed_elsewhere(self):
+        sched = self.makeScheduler()
+        sched.startService()
+        callbacks = self.master.getSubscriptionCallbacks()
+
+        self.db.insertTestData([
+            fakedb.SourceStamp(id=93, sourcestampsetid=1093),
+            fakedb.Buildset(id=44, sourcestampsetid=1093),
+            fakedb.Buildset(id=45, sourcestampsetid=1093),
+        ])
+        for bsid in 44, 45:
+            callbacks['buildsets'](bsid=bsid,
+                properties=dict(scheduler=(self.UPSTREAM_NAME, 'Scheduler')))
+
+        # buildset 44 completes, but no completion is announced here, as if
+        # it had completed on another master
+        self.db.buildsets.completeBuildset(bsid=44, results=SUCCESS,
+                                           complete_at=12345679)
+
+        getBuildsets = mock.Mock(wraps=self.db.buildsets.getBuildsets)
+        self.patch(self.db.buildsets, 'getBuildsets', getBuildsets)
+        self.clock.advance(sched.catchUpInterval)
+
+        # only the completed buildsets were fetched
+        getBuildsets.assert_called_once_with(bsids=[44, 45], complete=True)
+        self.db.buildsets.assertBuildsets(3)
+        self.assertBuildsetSubscriptions([45])
+
+        d = sched.stopService()
+        def check(_):
+            self.assertFalse(sched._catch_up_loop.running)
+        d.addCallback(check)
+        return d
+
     @defer.inlineCallbacks
     def test_getUpstreamBuildsets_missing(self):
         sched = self.makeScheduler()
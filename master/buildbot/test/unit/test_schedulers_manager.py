@@ -79,6 +79,12 @@ class SchedulerManager(unittest.TestCase):
     class ReconfigSched2(ReconfigSched):
         pass
 
+    class PreloadSched(Sched):
+        preloaded = None
+        def preloadClassifiedChanges(self, classifications, chdicts):
+            assert not self.already_started
+            self.preloaded = (classifications, chdicts)
+
     def makeSched(self, cls, name, attr='alpha'):
         sch = cls(name=name, builderNames=['x'], properties={})
         sch.attr = attr
@@ -86,6 +92,36 @@ class SchedulerManager(unittest.TestCase):
 
     # tests
 
+    @defer.inlineCallbacks
+    def test_reconfigService_preload(self):
+        queries = []
+        def getChanges(changeids):
+            queries.append(sorted(changeids))
+            return defer.succeed([ dict(changeid=changeid)
+                                   for changeid in changeids ])
+        self.master.db.changes.getChanges = getChanges
+
+        sch1 = self.makeSched(self.PreloadSched, 'sch1')
+        sch2 = self.makeSched(self.PreloadSched, 'sch2')
+        sch3 = self.makeSched(self.Sched, 'sch3')
+        classifications = [ { 1 : True, 2 : False }, { 2 : True } ]
+        def getAllChangeClassifications(objectids):
+            queries.append(len(objectids))
+            return defer.succeed(dict(zip(objectids, classifications)))
+        self.master.db.schedulers.getAllChangeClassifications = \
+                getAllChangeClassifications
+        self.new_config.schedulers = dict(sch1=sch1, sch2=sch2, sch3=sch3)
+
+        yield self.sm.reconfigService(self.new_config)
+
+        # one query for the classifications, and one for the changes
+        self.assertEqual(queries, [2, [1, 2]])
+        chdicts = { 1 : dict(changeid=1), 2 : dict(changeid=2) }
+        self.assertEqual(sorted([sch1.preloaded, sch2.preloaded]),
+                         sorted([ (classifications[0], chdicts),
+                                  (classifications[1], chdicts) ]))
+        self.assertTrue(sch1.already_started and sch3.already_started)
+
     @defer.inlineCallbacks
     def test_reconfigService_add_and_change_and_remove(self):
         sch1 = self.makeSched(self.ReconfigSched, 'sch1', attr='alpha')
@@ -171,4 +171,41 @@ class TestBuilderBuildCreation(unittest.TestCase):
                 project='p', repository='r', codebase='cbA', changes=[])
         ss2 = sourcestamp.SourceStamp(branch='dev', revision='xyz',
                 project='p', repository='r', codebase='cbB', changes=[])
-        self.assertFalse(ss1.canBeMergedWith(ss2))        
\ No newline at end of file
+        self.assertFalse(ss1.canBeMergedWith(ss2))
+
+    def test_getMergeKey_matches_canBeMergedWith(self):
+        c1 = mock.Mock()
+        c1.codebase = 'cb'
+        def mkss(**kwargs):
+            args = dict(branch='dev', revision='xyz', project='p',
+                        repository='r', codebase='cb')
+            args.update(kwargs)
+            return sourcestamp.SourceStamp(**args)
+        stamps = [ mkss(), mkss(), mkss(revision='abc'), mkss(branch='rel'),
+                   mkss(project='q'), mkss(repository='s'),
+                   mkss(codebase='cbB'), mkss(changes=[c1]),
+                   mkss(changes=[c1], revision='abc'),
+                   mkss(patch=(1, 'diff')) ]
+        for ss1 in stamps:
+            for ss2 in stamps:
+                key1 = ss1.getMergeKey()
+                self.assertEqual(key1 is not None
+                                    and key1 == ss2.getMergeKey(),
+                                 ss1.canBeMergedWith(ss2))
+
+    def test_getMergeKeyFromSsdict(self):
+        ssdict = dict(branch='dev', revision='xyz', project='p',
+                      repository='r', codebase='cb', patch_body=None,
+                      changeids=set())
+        self.assertEqual(
+                sourcestamp.SourceStamp.getMergeKeyFromSsdict(ssdict),
+                sourcestamp.SourceStamp(branch='dev', revision='xyz',
+                    project='p', repository='r',
+                    codebase='cb').getMergeKey())
+        ssdict['changeids'] = set([13])
+        self.assertEqual(
+                sourcestamp.SourceStamp.getMergeKeyFromSsdict(ssdict),
+                ('cb', 'r', 'dev', 'p', True, None))
+        ssdict['patch_body'] = 'diff'
+        self.assertEqual(
+                sourcestamp.SourceStamp.getMergeKeyFromSsdict(ssdict), None)
@@ -71,3 +71,30 @@ class TestBuildStatus(unittest.TestCase):
                              'propval%d' % build.number)
             self.assertEqual(b.buildCache.hits, hits+1)
             hits = hits + 1
+
+    def testBuildCacheMaxBytes(self):
+        b = self.setupBuilder('builder_1')
+        builds = []
+        for i in xrange(3):
+            build = b.newBuild()
+            builds.append(build)
+            build.buildStarted(build)
+            build.buildFinished()
+        self.assertEqual(sorted(b.buildCache.keys()), [0, 1, 2])
+
+        # the size estimate accounts for the steps, and is updated when the
+        # build finishes
+        self.assertEqual(b.buildCache.sizes[2],
+                         builder.estimateBuildSize(builds[2]))
+
+        # with a budget of little more than one build, only the most recent
+        # build stays cached
+        b.setCacheMaxBytes(b.buildCache.sizes[2] + 1)
+        self.assertEqual(b.buildCache.keys(), [2])
+
+    def testEstimateBuildSize(self):
+        b = self.setupBuilder('builder_1')
+        build = b.newBuild()
+        small = builder.estimateBuildSize(build)
+        build.setProperty('propkey', 'x' * 10000, 'test')
+        self.assertTrue(builder.estimateBuildSize(build) > small + 10000)
@@ -0,0 +1,382 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import os
+import mock
+from twisted.trial import unittest
+from twisted.internet import defer
+from buildbot.process import metrics
+from buildbot.status import builder, buildstore
+from buildbot.sourcestamp import SourceStamp
+from buildbot.test.fake import fakemaster
+
+class BuildStoreMixin(object):
+
+    kind = None
+
+    def setUp(self):
+        self.master = fakemaster.make_master()
+        self.master.config.buildStatusStore = self.kind
+        self.bs = builder.BuilderStatus(buildername='bldr', category=None,
+                                        master=self.master)
+        self.bs.basedir = os.path.abspath(self.mktemp())
+        os.mkdir(self.bs.basedir)
+        self.bs.determineNextBuildNumber()
+        self.bs.currentBigState = 'idle'
+        self.bs.status = 'idle'
+
+    def tearDown(self):
+        self.bs.getBuildStore().close()
+
+    def makeBuild(self, results=0, branch=None, logs=False):
+        build = self.bs.newBuild()
+        build.setSourceStamp(SourceStamp(branch=branch, revision='abcd'))
+        build.buildStarted(build)
+        step = build.addStepWithName('compile')
+        step.stepStarted()
+        step.setText(['compiling'])
+        step.setStatistic('warnings', 3)
+        if logs:
+            l = step.addLog('stdio')
+            l.addStdout('compiling\n')
+            l.finish()
+        step.stepFinished(results)
+        build.setResults(results)
+        build.buildFinished()
+        return build
+
+    def test_store_kind(self):
+        self.assertEqual(self.bs.getBuildStore().kind, self.kind)
+
+    def test_save_load(self):
+        build = self.makeBuild()
+        store = self.bs.getBuildStore()
+        self.assertEqual(store.getBuildNumbers(), [0])
+        loaded = store.loadBuild(0)
+        self.assertEqual(loaded.number, 0)
+        self.assertEqual([ s.getName() for s in loaded.getSteps() ],
+                         [ s.getName() for s in build.getSteps() ])
+
+    def test_loadBuild_missing(self):
+        self.assertRaises(IndexError,
+                          lambda : self.bs.getBuildStore().loadBuild(10))
+
+    def test_deleteBuild(self):
+        self.makeBuild()
+        self.makeBuild()
+        store = self.bs.getBuildStore()
+        store.deleteBuild(0)
+        self.assertEqual(store.getBuildNumbers(), [1])
+
+    def test_determineNextBuildNumber(self):
+        self.makeBuild()
+        self.makeBuild()
+        self.bs.determineNextBuildNumber()
+        self.assertEqual(self.bs.nextBuildNumber, 2)
+
+    def test_getBuildSummary(self):
+        self.makeBuild(results=builder.FAILURE)
+        self.bs.buildCache.clear()
+        summary = self.bs.getBuildSummary(0)
+        self.assertEqual(summary['number'], 0)
+        self.assertEqual(summary['results'], builder.FAILURE)
+        self.assertNotEqual(summary['finish'], None)
+        self.assertEqual(self.bs.getBuildSummary(1), None)
+
+    def test_getBuildStepSummaries(self):
+        self.makeBuild()
+        self.bs.buildCache.clear()
+        steps = self.bs.getBuildStepSummaries(-1)
+        self.assertEqual([ (s['name'], s['text'], s['statistics'])
+                           for s in steps ],
+                         [ ('compile', ['compiling'], {'warnings' : 3}) ])
+
+    def test_generateFinishedBuilds(self):
+        for i in range(4):
+            self.makeBuild()
+        self.bs.buildCache.clear()
+        self.assertEqual([ b.number for b in
+                           self.bs.generateFinishedBuilds(max_buildnum=2) ],
+                         [2, 1, 0])
+
+    def test_generateFinishedBuildSummaries(self):
+        for branch in ('a', 'b', 'a'):
+            self.makeBuild(branch=branch)
+        self.bs.buildCache.clear()
+        self.bs.getBuildStore().loadBuild = \
+                lambda number : self.fail("build loaded")
+        summaries = list(self.bs.generateFinishedBuildSummaries(
+                                                    branches=['a']))
+        self.assertEqual([ (s['number'], s['branch'], s['revision'])
+                           for s in summaries ],
+                         [ (2, 'a', 'abcd'), (0, 'a', 'abcd') ])
+
+    def test_generateFinishedBuildSummaries_backfill(self):
+        self.makeBuild()
+        self.makeBuild()
+        # lose the index, as for builds from before it existed
+        os.unlink(os.path.join(self.bs.basedir, 'builds.index'))
+        self.bs.buildIndex = None
+        self.assertEqual([ s['number'] for s in
+                           self.bs.generateFinishedBuildSummaries() ],
+                         [1, 0])
+        index = buildstore.BuildSummaryIndex(self.bs.basedir)
+        self.assertEqual(index.get(0)['number'], 0)
+
+    def logfiles(self):
+        return sorted(f for f in os.listdir(self.bs.basedir) if '-log-' in f)
+
+    @defer.inlineCallbacks
+    def test_prune_updates_index(self):
+        self.master.config.buildHorizon = 2
+        for i in range(4):
+            self.makeBuild()
+        self.bs.buildCache.clear()
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildStore().getBuildNumbers(), [2, 3])
+        index = buildstore.BuildSummaryIndex(self.bs.basedir)
+        self.assertEqual(index.get(0), None)
+        self.assertEqual(index.get(3)['number'], 3)
+
+    @defer.inlineCallbacks
+    def test_prune_rewrites_index_once(self):
+        self.master.config.buildHorizon = 1
+        self.patch(buildstore.BuildPruner, 'batch_size', 1)
+        for i in range(4):
+            self.makeBuild()
+        # let any prunes started as the builds finished complete
+        yield self.bs.prune()
+        self.bs.buildCache.clear()
+        rewrite = mock.Mock(wraps=self.bs.getBuildIndex().rewrite)
+        self.patch(self.bs.getBuildIndex(), 'rewrite', rewrite)
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildStore().getBuildNumbers(), [3])
+        self.assertEqual(rewrite.call_count, 1)
+
+    @defer.inlineCallbacks
+    def test_prune_logs(self):
+        self.master.config.buildHorizon = 3
+        self.master.config.logHorizon = 1
+        for i in range(4):
+            self.makeBuild(logs=True)
+        self.bs.buildCache.clear()
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildStore().getBuildNumbers(), [1, 2, 3])
+        self.assertEqual(self.logfiles(),
+                ['3-log-compile-stdio', '3-log-compile-stdio.idx'])
+
+    @defer.inlineCallbacks
+    def test_prune_keeps_cached(self):
+        self.master.config.buildHorizon = 1
+        for i in range(3):
+            self.makeBuild(logs=True)
+        self.bs.buildCache.clear()
+        self.bs.getBuild(0)
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildStore().getBuildNumbers(), [0, 2])
+        self.assertEqual(self.logfiles(),
+                ['0-log-compile-stdio', '0-log-compile-stdio.idx',
+                 '2-log-compile-stdio', '2-log-compile-stdio.idx'])
+
+        # once it is no longer cached, the build is pruned
+        self.bs.buildCache.clear()
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildStore().getBuildNumbers(), [2])
+        self.assertEqual(self.logfiles(),
+                ['2-log-compile-stdio', '2-log-compile-stdio.idx'])
+
+    @defer.inlineCallbacks
+    def test_prune_incremental(self):
+        self.master.config.buildHorizon = 2
+        for i in range(3):
+            self.makeBuild(logs=True)
+        yield self.bs.prune()
+        self.assertTrue(self.bs.getBuildPruner().scanned)
+
+        # after the first run, builds are tracked without scanning
+        def listdir(path):
+            raise AssertionError("directory scanned")
+        self.patch(os, 'listdir', listdir)
+        for i in range(2):
+            self.makeBuild(logs=True)
+        self.bs.buildCache.clear()
+        yield self.bs.prune()
+        self.assertEqual(self.bs.getBuildPruner().oldest_build, 3)
+        self.assertEqual(self.bs.getBuildPruner().lognums, [3, 4])
+
+    @defer.inlineCallbacks
+    def test_prune_metrics(self):
+        reported = []
+        self.patch(metrics.MetricCountEvent, 'log',
+                   classmethod(lambda cls, name, count :
+                               reported.append((name, count))))
+        self.master.config.buildHorizon = 1
+        self.makeBuild(logs=True)
+        self.makeBuild(logs=True)
+        self.bs.buildCache.clear()
+        yield self.bs.prune()
+        self.assertEqual([ name for name, count in reported ],
+                         [ 'BuildPruner.reclaimed_bytes' ])
+        self.assertTrue(reported[0][1] > 0)
+
+class TestBuildPruner(unittest.TestCase):
+
+    def test_prune_coalesces(self):
+        pruner = buildstore.BuildPruner(mock.Mock(name='builder_status'))
+        runs = []
+        def _prune(earliest_build, earliest_log):
+            d = defer.Deferred()
+            runs.append((earliest_build, d))
+            return d
+        pruner._prune = _prune
+
+        d1 = pruner.prune(1, 1)
+        d2 = pruner.prune(2, 2)
+        d3 = pruner.prune(3, 3)
+        self.assertEqual([ r[0] for r in runs ], [1])
+
+        # requests made during a run are served by one more run, with the
+        # latest horizons
+        runs[0][1].callback(None)
+        self.assertEqual([ r[0] for r in runs ], [1, 3])
+        self.assertTrue(d1.called)
+        self.assertFalse(d2.called or d3.called)
+
+        runs[1][1].callback(None)
+        self.assertTrue(d2.called and d3.called)
+        self.assertFalse(pruner.running)
+
+class TestBuildSummaryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.basedir = os.path.abspath(self.mktemp())
+        os.mkdir(self.basedir)
+
+    def summary(self, number, **kwargs):
+        summary = dict(number=number, start=10, finish=20, results=0,
+                       branch=None, revision=None, slavename='sl',
+                       text=['build', 'successful'], reason='because')
+        summary.update(kwargs)
+        return summary
+
+    def test_empty(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        self.assertEqual(index.get(1), None)
+
+    def test_add_get(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        index.add(self.summary(1, branch='br'))
+        self.assertEqual(index.get(1), dict(number=1, start=10, finish=20,
+                results=0, branch='br', revision=None, slavename='sl'))
+
+    def test_persistence(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        index.add(self.summary(1))
+        index.add(self.summary(2))
+        index.add(self.summary(1, results=2))
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        self.assertEqual(index.get(1)['results'], 2)
+        self.assertEqual(index.get(2)['results'], 0)
+
+    @defer.inlineCallbacks
+    def test_remove(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        for i in range(3):
+            index.add(self.summary(i))
+        index.remove([0, 1])
+        self.assertEqual(index.get(1), None)
+        # the file is unchanged until it is rewritten
+        self.assertEqual(
+                buildstore.BuildSummaryIndex(self.basedir).get(1)['number'], 1)
+        yield index.rewrite()
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        self.assertEqual(index.get(1), None)
+        self.assertEqual(index.get(2)['number'], 2)
+
+    @defer.inlineCallbacks
+    def test_rewrite_keeps_concurrent_adds(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        index.add(self.summary(0))
+        index.add(self.summary(1))
+        written = defer.Deferred()
+        def deferToThread(fn, *args):
+            return written.addCallback(lambda _ : fn(*args))
+        self.patch(buildstore.threads, 'deferToThread', deferToThread)
+        index.remove([0])
+        d = index.rewrite()
+        # records added or removed while the file is being rewritten
+        index.add(self.summary(2))
+        index.add(self.summary(3))
+        index.remove([3])
+        written.callback(None)
+        yield d
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        self.assertEqual([ index.get(i) and i for i in range(4) ],
+                         [None, 1, 2, None])
+
+    def test_truncated(self):
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        index.add(self.summary(1))
+        index.add(self.summary(2))
+        path = os.path.join(self.basedir, 'builds.index')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        index = buildstore.BuildSummaryIndex(self.basedir)
+        self.assertEqual(index.get(1)['number'], 1)
+        self.assertEqual(index.get(2), None)
+
+class TestPickleBuildStore(BuildStoreMixin, unittest.TestCase):
+
+    kind = 'pickle'
+
+    def test_partial_loads_unsupported(self):
+        self.makeBuild()
+        store = self.bs.getBuildStore()
+        self.assertEqual(store.loadBuildSummary(0), None)
+        self.assertEqual(store.loadBuildSteps(0), None)
+
+class TestSqliteBuildStore(BuildStoreMixin, unittest.TestCase):
+
+    kind = 'sqlite'
+
+    def test_partial_loads(self):
+        build = self.makeBuild()
+        store = self.bs.getBuildStore()
+        self.assertEqual(store.loadBuildSummary(0),
+                         buildstore.summarizeBuild(build))
+        self.assertEqual(store.loadBuildSteps(0),
+                         buildstore.summarizeSteps(build))
+        self.assertFalse(os.path.exists(os.path.join(self.bs.basedir, '0')))
+
+    def test_getBuildSummary_no_full_load(self):
+        self.makeBuild()
+        self.bs.buildCache.clear()
+        store = self.bs.getBuildStore()
+        store.loadBuild = lambda number : self.fail("full build loaded")
+        self.assertEqual(self.bs.getBuildSummary(0)['number'], 0)
+
+    def test_reads_legacy_pickles(self):
+        # builds saved before switching stores are still found
+        self.master.config.buildStatusStore = 'pickle'
+        self.makeBuild()
+        self.master.config.buildStatusStore = 'sqlite'
+        self.makeBuild()
+        self.bs.buildCache.clear()
+        store = self.bs.getBuildStore()
+        self.assertEqual(store.kind, 'sqlite')
+        self.assertEqual(store.getBuildNumbers(), [0, 1])
+        self.assertEqual(store.loadBuildSummary(0), None)
+        self.assertEqual(self.bs.getBuildSummary(0)['number'], 0)
+        self.assertEqual(self.bs.getBuild(0).number, 0)
@@ -16,6 +16,7 @@
 from __future__ import with_statement
 
 import os
+import __builtin__
 import cStringIO, cPickle
 import mock
 from twisted.trial import unittest
@@ -334,3 +335,197 @@ class TestLogFile(unittest.TestCase, dirs.DirsMixin):
         self.config.logCompressionMethod = None
         return self.do_test_compressLog('', expect_comp=False)
 
+
+    def fill_logfile(self):
+        self.logfile.chunkSize = 8
+        for chan, txt in [(0, 'line0\nline1\n'), (2, 'hdr2\n'),
+                          (0, 'line3\nli'), (1, 'ne4\nline5\n'),
+                          (0, 'line6')]:
+            self.logfile.addEntry(chan, txt)
+
+    def test_index_written(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        index = self.logfile.getIndex()
+        self.assertEqual(list(index), [
+            (0, 0, 0, 0), (12, 0, 8, 1), (20, 2, 12, 2), (29, 0, 17, 3),
+            (41, 1, 25, 4), (53, 1, 33, 5), (59, 0, 35, 6) ])
+        # and each offset points to the beginning of a netstring
+        fp = self.logfile.getFile()
+        for offset, channel, _, _ in index:
+            fp.seek(offset)
+            self.assertEqual(fp.read(4).split(':')[1][0], str(channel))
+
+    def test_index_findLine(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        index = self.logfile.getIndex()
+        self.assertEqual(index.findLine(0), None)
+        self.assertEqual(index.findLine(1), 0)
+        self.assertEqual(index.findLine(4), 3)
+        self.assertEqual(index.findLine(7), 6)
+
+    def do_test_getChunks_lines(self, start_line, end_line, expected,
+                                **kwargs):
+        got = ''.join(self.logfile.getChunks(onlyText=True,
+                            start_line=start_line, end_line=end_line,
+                            **kwargs))
+        self.assertEqual(got, expected)
+
+    def test_getChunks_lines(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.do_test_getChunks_lines(0, 1, 'line0\n')
+        self.do_test_getChunks_lines(2, 5, 'hdr2\nline3\nline4\n')
+        self.do_test_getChunks_lines(4, None, 'line4\nline5\nline6')
+        self.do_test_getChunks_lines(None, 2, 'line0\nline1\n')
+        self.do_test_getChunks_lines(6, 100, 'line6')
+        self.do_test_getChunks_lines(7, 100, '')
+
+    def test_getChunks_lines_channels(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.do_test_getChunks_lines(2, 5, 'line3\nli',
+                                     channels=[logfile.STDOUT])
+
+    def test_getChunks_lines_tuples(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.assertEqual(list(self.logfile.getChunks(start_line=3,
+                                                     end_line=5)),
+                [ (0, 'line3\nli'), (1, 'ne4\n') ])
+
+    def test_getIndex_closes_file(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        opened = []
+        real_open = open
+        def tracking_open(*args):
+            f = real_open(*args)
+            opened.append(f)
+            return f
+        self.patch(__builtin__, 'open', tracking_open)
+        index = self.logfile.getIndex()
+        self.assertEqual(len(index), 7)
+        self.assertEqual([ f.closed for f in opened ], [ True ])
+
+    def test_getChunks_lines_no_index(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        os.unlink(self.logfile.getFilename() + '.idx')
+        self.assertEqual(self.logfile.getIndex(), None)
+        self.do_test_getChunks_lines(2, 5, 'hdr2\nline3\nline4\n')
+
+    def test_getChunks_lines_unfinished(self):
+        self.fill_logfile()
+        self.logfile.addEntry(1, '\nl7\n')
+        # some of that is still in runEntries
+        self.assertNotEqual(self.logfile.runEntries, [])
+        self.do_test_getChunks_lines(5, 8, 'line5\nline6\nl7\n')
+
+    def test_getChunks_lines_pickled(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.pickle_and_restore()
+        self.do_test_getChunks_lines(3, 4, 'line3\n')
+
+    def test_getLineCount(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.assertEqual(self.logfile.getLineCount(), 7)
+
+    def test_getLineCount_unfinished(self):
+        self.fill_logfile()
+        self.logfile.addEntry(1, '\nl7\n')
+        self.assertEqual(self.logfile.getLineCount(), 8)
+
+    def test_getLineCount_no_index(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        os.unlink(self.logfile.getFilename() + '.idx')
+        self.pickle_and_restore()
+        self.logfile.mergedLines = 0 # as for a log from an older version
+        self.assertEqual(self.logfile.getLineCount(), 7)
+
+    def test_readlines_range(self):
+        self.fill_logfile()
+        self.logfile.finish()
+        self.assertEqual(self.logfile.readlines(start_line=1, end_line=4),
+                         ['line1\n', 'line3\n'])
+
+    def test_compressLog_zlib_blocks(self):
+        self.config.logCompressionMethod = 'zlib-blocks'
+        return self.do_test_compressLog('.zblk')
+
+    def test_getChunks_lines_zlib_blocks(self):
+        self.config.logCompressionMethod = 'zlib-blocks'
+        self.fill_logfile()
+        self.logfile.finish()
+        d = self.logfile.compressLog()
+        def check(_):
+            self.assertFalse(os.path.exists(self.logfile.getFilename()))
+            self.assertTrue(self.logfile.hasContents())
+            self.assertTrue(isinstance(self.logfile.getFile(),
+                                       logfile.BlockCompressedFile))
+            self.do_test_getChunks_lines(4, None, 'line4\nline5\nline6')
+        d.addCallback(check)
+        return d
+
+class TestBlockCompressedFile(unittest.TestCase, dirs.DirsMixin):
+
+    contents = ''.join([ '%05d' % i for i in range(1000) ])
+
+    def setUp(self):
+        self.setUpDirs('basedir')
+        self.filename = os.path.join('basedir', 'log.zblk')
+        with open(self.filename, 'wb') as f:
+            logfile.BlockCompressedFile.compress(
+                    cStringIO.StringIO(self.contents), f, frameSize=64)
+        self.f = logfile.BlockCompressedFile(self.filename)
+
+    def tearDown(self):
+        self.f.close()
+        self.tearDownDirs()
+
+    def test_read_all(self):
+        self.assertEqual(self.f.read(), self.contents)
+        self.assertEqual(self.f.read(), '')
+
+    def test_read_pieces(self):
+        pieces = []
+        while True:
+            data = self.f.read(100)
+            if not data:
+                break
+            pieces.append(data)
+        self.assertEqual(''.join(pieces), self.contents)
+
+    def test_seek_tell(self):
+        self.f.seek(4990)
+        self.assertEqual(self.f.tell(), 4990)
+        self.assertEqual(self.f.read(10), '0099800999')
+        self.f.seek(-5, 2)
+        self.assertEqual(self.f.read(), '00999')
+        self.f.seek(10)
+        self.f.seek(5, 1)
+        self.assertEqual(self.f.read(5), '00003')
+
+    def test_only_touched_frames(self):
+        decompress = mock.Mock(side_effect=logfile.zlib.decompress)
+        self.patch(logfile.zlib, 'decompress', decompress)
+        self.f.seek(-5, 2)
+        self.f.read()
+        self.assertEqual(decompress.call_count, 1)
+
+    def test_empty(self):
+        with open(self.filename, 'wb') as f:
+            logfile.BlockCompressedFile.compress(cStringIO.StringIO(''), f)
+        f = logfile.BlockCompressedFile(self.filename)
+        self.assertEqual(f.read(), '')
+        f.close()
+
+    def test_not_block_compressed(self):
+        with open(self.filename, 'wb') as f:
+            f.write('x' * 100)
+        self.assertRaises(IOError,
+                lambda : logfile.BlockCompressedFile(self.filename))
@@ -48,6 +48,41 @@ class TestStatus(unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def test_getCacheMetrics(self):
+        s = self.makeStatus()
+        m = s.master
+        m.caches.get_metrics.return_value = dict(chdicts=dict(hits=3))
+        m.config.caches = dict(Builds=15)
+        m.config.cacheMaxBytes = dict(Builds=1000)
+        m.botmaster.builderNames = [ 'a', 'b' ]
+        m.botmaster.builders = {}
+        for name, size in ('a', 2), ('b', 3):
+            bldr = m.botmaster.builders[name] = mock.Mock()
+            cache = bldr.builder_status.buildCache
+            cache.hits = cache.refhits = cache.misses = size
+            cache.cache = range(size)
+            cache.bytes = size * 100
+
+        self.assertEqual(s.getCacheMetrics(), dict(
+            chdicts=dict(hits=3),
+            Builds=dict(hits=5, refhits=5, misses=5, size=5, bytes=500,
+                        max_size=15, max_bytes=1000)))
+
+    def test_generateFinishedBuilds(self):
+        s = self.makeStatus()
+        builders = {}
+        for name, finishes in ('a', [30, 10]), ('b', [40, 20]):
+            bldr = builders[name] = mock.Mock(name=name)
+            summaries = [ dict(number=n, finish=f)
+                          for n, f in zip([5, 4], finishes) ]
+            bldr.generateFinishedBuildSummaries.return_value = iter(summaries)
+            bldr.getBuild = lambda number, name=name : (name, number)
+        s.getBuilderNames = lambda : sorted(builders)
+        s.getBuilder = builders.get
+
+        builds = list(s.generateFinishedBuilds(num_builds=3))
+        self.assertEqual(builds, [ ('b', 5), ('a', 5), ('b', 4) ])
+
     @defer.inlineCallbacks
     def test_reconfigService(self):
         m = mock.Mock(name='master')
@@ -0,0 +1,114 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import mock
+from twisted.trial import unittest
+from buildbot.status.web import logs
+from buildbot.test.fake.web import FakeRequest
+from buildbot.test.fake import remotecommand
+
+class TestTextLog(unittest.TestCase):
+
+    def setUp(self):
+        step = mock.Mock(name='fake step')
+        step.logobservers = []
+        self.log = remotecommand.FakeLogFile('stdio', step)
+        for i in range(10):
+            self.log.addStdout('line%d\n' % i)
+        self.log.subscribeConsumer = mock.Mock()
+
+    def render(self, args):
+        resource = logs.TextLog(self.log)
+        resource.asText = True
+        req = FakeRequest(args)
+        req.method = 'GET'
+        d = req.test_render(resource)
+        d.addCallback(lambda _ : req.written)
+        return d
+
+    def test_tail(self):
+        d = self.render({'tail' : ['3']})
+        def check(written):
+            self.assertEqual(written, 'line7\nline8\nline9\n')
+            self.assertFalse(self.log.subscribeConsumer.called)
+        d.addCallback(check)
+        return d
+
+    def test_tail_bigger_than_log(self):
+        d = self.render({'tail' : ['300']})
+        d.addCallback(lambda written :
+            self.assertEqual(written, ''.join([ 'line%d\n' % i
+                                                for i in range(10) ])))
+        return d
+
+    def test_lines(self):
+        d = self.render({'lines' : ['2-4']})
+        d.addCallback(lambda written :
+            self.assertEqual(written, 'line1\nline2\nline3\n'))
+        return d
+
+    def test_lines_open_ended(self):
+        d = self.render({'lines' : ['9-']})
+        d.addCallback(lambda written :
+            self.assertEqual(written, 'line8\nline9\n'))
+        return d
+
+    def do_test_invalid(self, args):
+        resource = logs.TextLog(self.log)
+        resource.asText = True
+        req = FakeRequest(args)
+        req.method = 'GET'
+        d = req.test_render(resource)
+        def check(_):
+            self.assertEqual(req.setResponseCode.call_args[0][0], 400)
+            self.assertNotIn('line0', req.written)
+            self.assertFalse(self.log.subscribeConsumer.called)
+        d.addCallback(check)
+        return d
+
+    def test_invalid_tail(self):
+        return self.do_test_invalid({'tail' : ['abc']})
+
+    def test_negative_tail(self):
+        return self.do_test_invalid({'tail' : ['-3']})
+
+    def test_lines_without_dash(self):
+        return self.do_test_invalid({'lines' : ['5']})
+
+    def test_lines_not_numbers(self):
+        return self.do_test_invalid({'lines' : ['a-b']})
+
+    def test_lines_zero(self):
+        return self.do_test_invalid({'lines' : ['0-4']})
+
+    def test_lines_backwards(self):
+        return self.do_test_invalid({'lines' : ['5-2']})
+
+class TestLogLink(unittest.TestCase):
+
+    def test_small(self):
+        log = mock.Mock()
+        log.length = 100
+        self.assertEqual(logs.log_link('logs/stdio', log), 'logs/stdio')
+
+    def test_large(self):
+        log = mock.Mock()
+        log.length = logs.LARGE_LOG_SIZE + 1
+        self.assertEqual(logs.log_link('logs/stdio', log),
+                         'logs/stdio?tail=%d' % logs.TAIL_LINES)
+
+    def test_no_length(self):
+        log = mock.Mock(spec=['getName'])
+        self.assertEqual(logs.log_link('logs/stdio', log), 'logs/stdio')
@@ -15,13 +15,14 @@
 
 import re
 import textwrap
+import mock
 from twisted.trial import unittest
 from buildbot.steps import shell
 from buildbot.status.results import SKIPPED, SUCCESS, WARNINGS, FAILURE
 from buildbot.status.results import EXCEPTION
 from buildbot.test.util import steps, compat
 from buildbot.test.fake.remotecommand import ExpectShell, Expect
-from buildbot.test.fake.remotecommand import ExpectRemoteRef
+from buildbot.test.fake.remotecommand import ExpectRemoteRef, FakeLogFile
 from buildbot import config
 from buildbot.process import properties
 
@@ -488,6 +489,82 @@ class WarningCountingShellCommand(steps.BuildStepMixin, unittest.TestCase):
         self.expectLogfile("warnings (2)", "scary: foo\nscary: bar\n")
         return self.runStep()
 
+    def test_streaming(self):
+        # warnings are counted as the output arrives, across chunk boundaries
+        # and on stderr, without reading back the whole log
+        self.patch(FakeLogFile, 'getText',
+                   lambda self : self.fail("log read back"))
+        self.setupStep(shell.WarningCountingShellCommand(command=['make']))
+        self.expectCommands(
+            ExpectShell(workdir='wkdir', usePTY='slave-config',
+                        command=["make"])
+            + ExpectShell.log('stdio', stdout='normal\nwarn')
+            + ExpectShell.log('stdio', stdout='ing: split\nnormal\n')
+            + ExpectShell.log('stdio', stderr='warning: on stderr')
+            + 0
+        )
+        self.expectOutcome(result=WARNINGS, status_text=["'make'", "warnings"])
+        self.expectProperty("warnings-count", 2)
+        self.expectLogfile("warnings (2)",
+                "warning: split\nwarning: on stderr\n")
+        return self.runStep()
+
+    def test_long_lines(self):
+        # overlong lines are truncated rather than buffered in full, both
+        # when complete and while still arriving
+        self.patch(shell.WarningCountingLogObserver, 'maxLineLength', 10)
+        self.setupStep(shell.WarningCountingShellCommand(command=['make']))
+        self.expectCommands(
+            ExpectShell(workdir='wkdir', usePTY='slave-config',
+                        command=["make"])
+            + ExpectShell.log('stdio', stdout='warning: one two\nwarn')
+            + ExpectShell.log('stdio', stdout='ing: three')
+            + ExpectShell.log('stdio', stdout=' four\nnot a warning:\n')
+            + ExpectShell.log('stdio', stderr='warning: ' + 'x' * 100)
+            + 0
+        )
+        self.expectOutcome(result=WARNINGS, status_text=["'make'", "warnings"])
+        self.expectProperty("warnings-count", 3)
+        self.expectLogfile("warnings (3)",
+                "warning: o\nwarning: t\nwarning: x\n")
+        d = self.runStep()
+        def check(_):
+            observer = self.step.warningObserver
+            self.assertEqual((observer.outBuffer, observer.errBuffer),
+                             ('', ''))
+        d.addCallback(check)
+        return d
+
+    def test_long_lines_no_newlines(self):
+        # output without newlines is not copied once the line is full
+        self.patch(shell.WarningCountingLogObserver, 'maxLineLength', 10)
+        observer = shell.WarningCountingLogObserver()
+        observer.setStep(mock.Mock())
+        observer.outReceived('warn')
+        observer.outReceived('ing: xyz')
+        full = observer.outBuffer
+        self.assertEqual(full, 'warning: x')
+        for i in range(1000):
+            observer.outReceived('y' * 100)
+            self.assertIdentical(observer.outBuffer, full)
+        observer.outReceived('yyy\nwarning: again\nwarn')
+        self.assertEqual(observer.outBuffer, 'warn')
+        observer.finish()
+        calls = observer.step.countWarningsInLine.call_args_list
+        self.assertEqual([ c[0][0] for c in calls ],
+                         ['warning: x', 'warning: a', 'warn'])
+
+    def test_createSummary_unobserved(self):
+        # if the output was not observed, createSummary scans the log chunks
+        step = self.setupStep(
+                shell.WarningCountingShellCommand(command=['make']))
+        loog = FakeLogFile('stdio', step)
+        loog.addStdout('warning: one\nnormal\n')
+        loog.addStderr('warning: two')
+        step.createSummary(loog)
+        self.assertEqual(step.warnCount, 2)
+        self.assertEqual(step.warnings, ['warning: one', 'warning: two'])
+
     def test_maxWarnCount(self):
         self.setupStep(shell.WarningCountingShellCommand(command=['make'],
             maxWarnCount=9))
@@ -0,0 +1,86 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import re
+from twisted.trial import unittest
+from buildbot.util import linematcher
+
+class LineMatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.m = linematcher.LineMatcher()
+
+    def test_no_patterns(self):
+        self.assertEqual(self.m.match("foo"), (None, None))
+        self.assertEqual(self.m.matchAll("foo"), [])
+        self.assertFalse(self.m.matchesAny("foo"))
+
+    def test_match_anchored(self):
+        self.m.addPattern('w', '.*warning: (.*)')
+        self.m.addPattern('e', 'error')
+        name, match = self.m.match("x.c:3: warning: unused")
+        self.assertEqual((name, match.group(1)), ('w', 'unused'))
+        # 'error' is not at the start of the line
+        self.assertEqual(self.m.match("an error"), (None, None))
+
+    def test_search(self):
+        self.m.addPattern('e', 'error', search=True)
+        name, match = self.m.match("an error")
+        self.assertEqual((name, match.group(0)), ('e', 'error'))
+
+    def test_first_pattern_wins(self):
+        self.m.addPattern('a', 'abc', search=True)
+        self.m.addPattern('b', 'b(c)', search=True)
+        name, match = self.m.match("xabcx")
+        self.assertEqual(name, 'a')
+        self.assertEqual([ (n, m.group(0)) for n, m in self.m.matchAll("xabc") ],
+                         [('a', 'abc'), ('b', 'bc')])
+        self.assertEqual([ n for n, m in self.m.matchAll("bc") ], ['b'])
+
+    def test_groups_are_per_pattern(self):
+        self.m.addPattern('a', '(a+)(x)', search=True)
+        self.m.addPattern('b', '(b+)', search=True)
+        name, match = self.m.match("--bbb")
+        self.assertEqual((name, match.groups()), ('b', ('bbb',)))
+
+    def test_mixed_flags(self):
+        self.m.addPattern('a', re.compile('^abc$', re.I))
+        self.m.addPattern('b', re.compile('^def$', re.M), search=True)
+        self.assertEqual(self.m.match("ABC")[0], 'a')
+        self.assertEqual(self.m.match("x\ndef\ny")[0], 'b')
+        self.assertEqual(self.m.match("DEF")[0], None)
+        self.assertEqual(len(self.m._compilePrefilters()), 2)
+
+    def test_backreference_not_combined(self):
+        self.m.addPattern('a', '(x)y', search=True)
+        self.m.addPattern('b', r'(.)\1', search=True)
+        self.assertEqual(self.m._compilePrefilters(), None)
+        self.assertEqual(self.m.match("abba")[0], 'b')
+        self.assertEqual(self.m.match("abcd")[0], None)
+        self.assertTrue(self.m.matchesAny("abba"))
+        self.assertFalse(self.m.matchesAny("abcd"))
+
+    def test_many_groups(self):
+        for i in range(30):
+            self.m.addPattern(i, 'p%d(a)(b)(c)(d)' % i, search=True)
+        self.assertTrue(len(self.m._compilePrefilters()) > 1)
+        self.assertEqual(self.m.match("--p29abcd")[0], 29)
+        self.assertEqual(self.m.match("--p29abc")[0], None)
+
+    def test_pattern_added_later(self):
+        self.m.addPattern('a', 'a')
+        self.assertEqual(self.m.match("b")[0], None)
+        self.m.addPattern('b', 'b')
+        self.assertEqual(self.m.match("b")[0], 'b')
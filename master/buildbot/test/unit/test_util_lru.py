@@ -246,6 +246,95 @@ class LRUCacheTest(unittest.TestCase):
         self.assertEqual(self.lru.get('p'), set(['PPP']))
         self.assertEqual(self.lru.get('q'), set(['QQQ'])) # not updated
 
+    def test_evict(self):
+        self.lru.size_fn = self.size_fn
+        a = self.lru.get('a')
+        self.lru.get('b')
+        self.lru.get('a')
+        self.lru.evict('a')
+        self.assertEqual((self.lru.keys(), self.lru.bytes), (['b'], 3))
+        self.lru.inv()
+
+        # 'a' is fetched again, even though it is still referenced
+        self.lru.miss_fn = long
+        self.check_result(self.lru.get('a'), long('a'), 1, 3, 0)
+        self.assertNotEqual(a, long('a'))
+
+    def test_evict_missing(self):
+        self.lru.get('a')
+        self.lru.evict('z')
+        self.assertEqual(self.lru.keys(), ['a'])
+        self.lru.inv()
+
+    def test_clear(self):
+        self.lru.size_fn = self.size_fn
+        held = [ self.lru.get(c) for c in 'ab' ]
+        self.lru.clear()
+        self.assertEqual((self.lru.keys(), self.lru.bytes), ([], 0))
+        self.lru.inv()
+
+        self.lru.miss_fn = long
+        self.check_result(self.lru.get('a'), long('a'), 0, 3, 0)
+        del held
+
+    def size_fn(self, value):
+        # the size of a value is the length of its (only) element
+        return len(list(value)[0])
+
+    def test_max_bytes(self):
+        self.lru = lru.LRUCache(short, 10, max_bytes=9, size_fn=self.size_fn)
+        self.lru.get('a')
+        self.lru.get('b')
+        self.assertEqual(self.lru.bytes, 6)
+        self.lru.get('c')
+        self.lru.miss_fn = long
+        self.lru.get('d')
+        self.assertEqual((sorted(self.lru.keys()), self.lru.bytes),
+                         (['c', 'd'], 9))
+        self.lru.inv()
+
+    def test_max_bytes_one_large_value(self):
+        # a value larger than max_bytes stays in the cache, by itself
+        self.lru = lru.LRUCache(long, 10, max_bytes=5, size_fn=self.size_fn)
+        self.lru.get('a')
+        self.lru.get('b')
+        self.assertEqual((self.lru.keys(), self.lru.bytes), (['b'], 6))
+        self.lru.inv()
+
+    def test_set_max_bytes(self):
+        self.lru = lru.LRUCache(short, 10, size_fn=self.size_fn)
+        for c in 'abcd':
+            self.lru.get(c)
+        self.lru.set_max_bytes(6)
+        self.assertEqual((sorted(self.lru.keys()), self.lru.bytes),
+                         (['c', 'd'], 6))
+        self.lru.inv()
+
+    def test_put_max_bytes(self):
+        self.lru = lru.LRUCache(short, 10, max_bytes=9, size_fn=self.size_fn)
+        self.lru.get('a')
+        self.lru.get('b')
+        self.lru.put('b', set(['BBBBBBB']))
+        self.assertEqual((self.lru.keys(), self.lru.bytes), (['b'], 7))
+        self.lru.inv()
+
+    def test_no_size_fn(self):
+        self.lru.get('a')
+        self.assertEqual(self.lru.bytes, 0)
+
+    def test_estimate_size(self):
+        class Thing(object):
+            pass
+        small = Thing()
+        small.attr = 'x'
+        large = Thing()
+        large.attr = [ 'x' * 1000 ] * 10 + [ dict(y='y' * 1000) ]
+        self.assertTrue(lru.estimate_size(large) >
+                        lru.estimate_size(small) + 2000)
+        # objects that are not the argument are not followed
+        self.assertTrue(lru.estimate_size([ large ]) <
+                        lru.estimate_size(small) + 1000)
+
 
 class AsyncLRUCacheTest(unittest.TestCase):
 
@@ -574,3 +663,139 @@ class AsyncLRUCacheTest(unittest.TestCase):
         self.assertEqual((yield self.lru.get('p')), short('p'))
         self.lru.put('p', set(['P2P2']))
         self.assertEqual((yield self.lru.get('p')), set(['P2P2']))
+
+    @defer.inlineCallbacks
+    def test_evict(self):
+        a = yield self.lru.get('a')
+        self.lru.evict('a')
+        self.lru.miss_fn = self.long_miss_fn
+        res = yield self.lru.get('a')
+        self.check_result(res, long('a'), 0, 2, 0)
+        del a
+
+    def slow_miss_fn(self, key):
+        d = defer.Deferred()
+        self.pending.append((d, key))
+        return d
+
+    @defer.inlineCallbacks
+    def test_evict_during_fetch(self):
+        # a value fetched before the eviction may be stale, so it is returned
+        # to the waiting callers but not cached
+        self.pending = []
+        self.lru.miss_fn = self.slow_miss_fn
+        d = self.lru.get('a')
+        self.lru.evict('a')
+        fetch_d, key = self.pending.pop()
+        fetch_d.callback(short(key))
+        res = yield d
+        self.check_result(res, short('a'))
+        self.assertEqual((self.lru.keys(), self.lru.evicted), ([], set()))
+        del res
+
+        self.lru.miss_fn = self.long_miss_fn
+        res = yield self.lru.get('a')
+        self.check_result(res, long('a'), 0, 2)
+
+    @defer.inlineCallbacks
+    def test_clear_during_fetch(self):
+        self.pending = []
+        yield self.lru.get('a')
+        self.lru.miss_fn = self.slow_miss_fn
+        d = self.lru.get_many(['b', 'c'])
+        self.lru.clear()
+        for fetch_d, key in self.pending:
+            fetch_d.callback(short(key))
+        res = yield d
+        self.check_result(res, [ short('b'), short('c') ])
+        self.assertEqual((self.lru.keys(), self.lru.evicted), ([], set()))
+        self.lru.inv()
+
+    def short_miss_many_fn(self, keys):
+        self.many_calls.append(keys)
+        return defer.succeed(dict((k, short(k)) for k in keys))
+
+    @defer.inlineCallbacks
+    def test_get_many(self):
+        self.many_calls = []
+        self.lru.miss_many_fn = self.short_miss_many_fn
+        self.assertEqual((yield self.lru.get('a')), short('a'))
+
+        res = yield self.lru.get_many(['a', 'b', 'c'])
+        self.check_result(res, [ short('a'), short('b'), short('c') ],
+                          1, 3)
+        self.assertEqual(self.many_calls, [ ['b', 'c'] ])
+
+    @defer.inlineCallbacks
+    def test_get_many_duplicates(self):
+        self.many_calls = []
+        self.lru.miss_many_fn = self.short_miss_many_fn
+        res = yield self.lru.get_many(['a', 'b', 'a'])
+        self.check_result(res, [ short('a'), short('b'), short('a') ],
+                          1, 2)
+        self.assertEqual(self.many_calls, [ ['a', 'b'] ])
+
+    @defer.inlineCallbacks
+    def test_get_many_missing(self):
+        def partial_miss_many_fn(keys):
+            return defer.succeed({'a' : short('a')})
+        self.lru.miss_many_fn = partial_miss_many_fn
+        res = yield self.lru.get_many(['a', 'b'])
+        self.check_result(res, [ short('a'), None ])
+
+        # the missing key was not cached
+        self.assertEqual(self.lru.keys(), ['a'])
+
+    @defer.inlineCallbacks
+    def test_get_many_no_miss_many_fn(self):
+        res = yield self.lru.get_many(['a', 'b'])
+        self.check_result(res, [ short('a'), short('b') ], 0, 2)
+
+    def test_get_many_concurrent(self):
+        fetches = []
+        def slow_miss_many_fn(keys):
+            d = defer.Deferred()
+            fetches.append((keys, d))
+            return d
+        self.lru.miss_many_fn = slow_miss_many_fn
+
+        # a get for a key that is part of an outstanding batch waits for
+        # that batch, and vice versa
+        d1 = self.lru.get_many(['a', 'b'])
+        d2 = self.lru.get('b')
+        d3 = self.lru.get_many(['b', 'c'])
+        self.assertEqual([ keys for keys, _ in fetches ],
+                         [ ['a', 'b'], ['c'] ])
+
+        fetches[0][1].callback(dict(a=short('a'), b=short('b')))
+        fetches[1][1].callback(dict(c=short('c')))
+
+        d = defer.gatherResults([d1, d2, d3])
+        def check(res):
+            self.assertEqual(res, [ [ short('a'), short('b') ], short('b'),
+                                    [ short('b'), short('c') ] ])
+            self.assertEqual((self.lru.hits, self.lru.misses), (2, 3))
+        d.addCallback(check)
+        return d
+
+    def test_get_many_failure(self):
+        def fail_miss_many_fn(keys):
+            return defer.fail(failure.Failure(RuntimeError("oh noes")))
+        self.lru.miss_many_fn = fail_miss_many_fn
+
+        d = self.lru.get_many(['a', 'b'])
+        self.assertFailure(d, RuntimeError)
+        def check(_):
+            self.assertEqual(self.lru.concurrent, {})
+        d.addCallback(check)
+        return d
+
+    @defer.inlineCallbacks
+    def test_max_bytes(self):
+        self.lru = lru.AsyncLRUCache(self.short_miss_fn, 10, max_bytes=6,
+                size_fn=lambda value : len(list(value)[0]))
+        for c in 'abc':
+            yield self.lru.get(c)
+        self.assertEqual((sorted(self.lru.keys()), self.lru.bytes),
+                         (['b', 'c'], 6))
+        self.lru.inv()
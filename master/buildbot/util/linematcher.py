@@ -0,0 +1,135 @@
+# This file is part of Buildbot.  Buildbot is free software: you can
+# redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, version 2.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+# Copyright Buildbot Team Members
+
+import re
+
+# patterns which cannot safely share a regular expression with others:
+# numbered or named backreferences, conditionals, and inline flags (which
+# apply to the whole expression in this version of Python)
+_uncombinable_re = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[iLmsux]+\)')
+
+class LineMatcher(object):
+    """
+    I match lines against a set of named regular expressions, in the order
+    they were added.
+
+    Most lines of a log match none of the patterns an observer is looking
+    for, so I first check each line against a single alternation of all of
+    the patterns, and only try the patterns one by one for lines which
+    matched that.  The results are the same as trying each pattern in turn.
+    """
+
+    # Python's re module supports at most 100 groups per expression
+    max_groups = 99
+
+    def __init__(self):
+        self.patterns = []
+        self._prefilters = None
+
+    def addPattern(self, name, pattern, search=False):
+        """
+        Add a pattern, either a string or a compiled regular expression.
+        Patterns are applied with C{match}, or with C{search} if SEARCH is
+        true.
+        """
+        if isinstance(pattern, basestring):
+            pattern = re.compile(pattern)
+        self.patterns.append((name, pattern, search))
+        self._prefilters = None
+
+    def _compilePrefilters(self):
+        # returns a list of combined expressions, or None if some pattern
+        # cannot be combined (in which case every line is a candidate)
+        by_flags = {}
+        for name, regex, search in self.patterns:
+            if (regex.flags & re.VERBOSE or
+                    _uncombinable_re.search(regex.pattern)):
+                return None
+            source = regex.pattern
+            if not search:
+                source = r'\A(?:%s)' % (source,)
+            else:
+                source = '(?:%s)' % (source,)
+            by_flags.setdefault(regex.flags, []).append((source, regex.groups))
+
+        prefilters = []
+        for flags, sources in by_flags.iteritems():
+            chunk, chunk_groups = [], 0
+            for source, groups in sources:
+                if chunk and chunk_groups + groups > self.max_groups:
+                    prefilters.append((flags, chunk))
+                    chunk, chunk_groups = [], 0
+                chunk.append(source)
+                chunk_groups += groups
+            prefilters.append((flags, chunk))
+
+        try:
+            return [ re.compile('|'.join(chunk), flags)
+                     for flags, chunk in prefilters ]
+        except (re.error, AssertionError, UnicodeError):
+            return None
+
+    def _mightMatch(self, line):
+        # false if LINE certainly matches none of the patterns
+        if self._prefilters is None:
+            self._prefilters = self._compilePrefilters()
+            if self._prefilters is None:
+                self._prefilters = ()
+        if not self._prefilters:
+            return bool(self.patterns)
+        for prefilter in self._prefilters:
+            if prefilter.search(line):
+                return True
+        return False
+
+    def matchesAny(self, line):
+        """
+        Return true if any pattern matches LINE.
+        """
+        if self._mightMatch(line):
+            # the prefilters are exact, if there are any
+            return bool(self._prefilters) or self.match(line)[1] is not None
+        return False
+
+    def match(self, line):
+        """
+        Return (name, match object) for the first pattern which matches
+        LINE, or (None, None) if none do.
+        """
+        if self._mightMatch(line):
+            for name, regex, search in self.patterns:
+                if search:
+                    m = regex.search(line)
+                else:
+                    m = regex.match(line)
+                if m:
+                    return name, m
+        return None, None
+
+    def matchAll(self, line):
+        """
+        Return a list of (name, match object) for each pattern which matches
+        LINE, in the order the patterns were added.
+        """
+        matches = []
+        if self._mightMatch(line):
+            for name, regex, search in self.patterns:
+                if search:
+                    m = regex.search(line)
+                else:
+                    m = regex.match(line)
+                if m:
+                    matches.append((name, m))
+        return matches
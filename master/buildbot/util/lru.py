@@ -13,6 +13,7 @@
 #
 # Copyright Buildbot Team Members
 
+import sys
 from weakref import WeakValueDictionary
 from itertools import ifilterfalse
 from twisted.python import log
@@ -29,11 +30,12 @@ class LRUCache(object):
     """
 
     __slots__ = ('max_size max_queue miss_fn queue cache weakrefs '
-                 'refcount hits refhits misses'.split())
+                 'refcount hits refhits misses max_bytes size_fn sizes '
+                 'bytes'.split())
     sentinel = object()
     QUEUE_SIZE_FACTOR = 10
 
-    def __init__(self, miss_fn, max_size=50):
+    def __init__(self, miss_fn, max_size=50, max_bytes=None, size_fn=None):
         self.max_size = max_size
         self.max_queue = max_size * self.QUEUE_SIZE_FACTOR
         self.queue = deque()
@@ -42,11 +44,16 @@ class LRUCache(object):
         self.hits = self.misses = self.refhits = 0
         self.refcount = defaultdict(lambda : 0)
         self.miss_fn = miss_fn
+        self.max_bytes = max_bytes
+        self.size_fn = size_fn
+        self.sizes = {}
+        self.bytes = 0
 
     def put(self, key, value):
         if key in self.cache:
-            self.cache[key] = value
+            self._store(key, value)
             self.weakrefs[key] = value
+            self._purge()
         elif key in self.weakrefs:
             self.weakrefs[key] = value
 
@@ -60,7 +67,7 @@ class LRUCache(object):
 
         result = self.miss_fn(key, **miss_fn_kwargs)
         if result is not None:
-            self.cache[key] = result
+            self._store(key, result)
             self.weakrefs[key] = result
             self._ref_key(key)
             self._purge()
@@ -70,6 +77,27 @@ class LRUCache(object):
     def keys(self):
         return self.cache.keys()
 
+    def evict(self, key):
+        """Remove C{key} from the cache, so that the next C{get} for it will
+        invoke the miss function."""
+        self.weakrefs.pop(key, None)
+        if key not in self.cache:
+            return
+        del self.cache[key]
+        for i in xrange(self.refcount.pop(key)):
+            self.queue.remove(key)
+        if key in self.sizes:
+            self.bytes -= self.sizes.pop(key)
+
+    def clear(self):
+        """Remove all keys from the cache."""
+        self.queue.clear()
+        self.cache.clear()
+        self.weakrefs.clear()
+        self.refcount.clear()
+        self.sizes.clear()
+        self.bytes = 0
+
     def set_max_size(self, max_size):
         if self.max_size == max_size:
             return
@@ -78,6 +106,13 @@ class LRUCache(object):
         self.max_queue = max_size * self.QUEUE_SIZE_FACTOR
         self._purge()
 
+    def set_max_bytes(self, max_bytes):
+        if self.max_bytes == max_bytes:
+            return
+
+        self.max_bytes = max_bytes
+        self._purge()
+
     def inv(self):
         global inv_failed
 
@@ -102,6 +137,25 @@ class LRUCache(object):
             log.msg("      got:", sorted(self.refcount.items()))
             inv_failed = True
 
+        # the byte count should be the sum of the sizes of the cached values
+        if self.size_fn:
+            if set(self.sizes) != cache_keys:
+                log.msg("INV: sized keys differ from cached keys")
+                inv_failed = True
+            if sum(self.sizes.itervalues()) != self.bytes:
+                log.msg("INV: bytes is %d, but sizes sum to %d"
+                        % (self.bytes, sum(self.sizes.itervalues())))
+                inv_failed = True
+
+    def _store(self, key, value):
+        """Put a value in the strongly-referenced part of the cache, keeping
+        track of its estimated size."""
+        self.cache[key] = value
+        if self.size_fn:
+            size = self.size_fn(value)
+            self.bytes += size - self.sizes.get(key, 0)
+            self.sizes[key] = size
+
     def _ref_key(self, key):
         """Record a reference to the argument key."""
         queue = self.queue
@@ -135,32 +189,43 @@ class LRUCache(object):
 
         result = self.weakrefs[key]
         self.refhits += 1
-        self.cache[key] = result
+        self._store(key, result)
         self._ref_key(key)
+        self._purge()
         return result
 
+    def _over_budget(self):
+        # the most recently used entry is always kept, even if it alone
+        # exceeds max_bytes
+        if len(self.cache) > self.max_size:
+            return True
+        return (self.max_bytes is not None and self.bytes > self.max_bytes
+                and len(self.cache) > 1)
+
     def _purge(self):
         """
-        Trim the cache down to max_size by evicting the
+        Trim the cache down to max_size and max_bytes by evicting the
         least-recently-used entries.
         """
-        if len(self.cache) <= self.max_size:
+        if not self._over_budget():
             return
 
         cache = self.cache
         refcount = self.refcount
         queue = self.queue
-        max_size = self.max_size
+        sizes = self.sizes
 
         # purge least recently used entries, using refcount to count entries
         # that appear multiple times in the queue
-        while len(cache) > max_size:
+        while self._over_budget():
             refc = 1
             while refc:
                 k = queue.popleft()
                 refc = refcount[k] = refcount[k] - 1
             del cache[k]
             del refcount[k]
+            if k in sizes:
+                self.bytes -= sizes.pop(k)
 
 
 class AsyncLRUCache(LRUCache):
@@ -169,11 +234,26 @@ class AsyncLRUCache(LRUCache):
     multiple concurrent requests for the same key, only one fetch is performed.
     """
 
-    __slots__ = ['concurrent']
+    __slots__ = ['concurrent', 'miss_many_fn', 'evicted']
 
-    def __init__(self, miss_fn, max_size=50):
-        LRUCache.__init__(self, miss_fn, max_size=max_size)
+    def __init__(self, miss_fn, max_size=50, miss_many_fn=None,
+                 max_bytes=None, size_fn=None):
+        LRUCache.__init__(self, miss_fn, max_size=max_size,
+                          max_bytes=max_bytes, size_fn=size_fn)
         self.concurrent = {}
+        # keys evicted while their values were being fetched; the fetched
+        # values may be stale, so they are not cached
+        self.evicted = set()
+        self.miss_many_fn = miss_many_fn
+
+    def evict(self, key):
+        LRUCache.evict(self, key)
+        if key in self.concurrent:
+            self.evicted.add(key)
+
+    def clear(self):
+        LRUCache.clear(self)
+        self.evicted.update(self.concurrent)
 
     def get(self, key, **miss_fn_kwargs):
         try:
@@ -201,8 +281,8 @@ class AsyncLRUCache(LRUCache):
         miss_d = self.miss_fn(key, **miss_fn_kwargs)
 
         def handle_result(result):
-            if result is not None:
-                self.cache[key] = result
+            if result is not None and key not in self.evicted:
+                self._store(key, result)
                 self.weakrefs[key] = result
 
                 # reference the key once, possibly standing in for multiple
@@ -212,12 +292,14 @@ class AsyncLRUCache(LRUCache):
                 self._purge()
 
             # and fire all of the waiting Deferreds
+            self.evicted.discard(key)
             dlist = concurrent.pop(key)
             for d in dlist:
                 d.callback(result)
 
         def handle_failure(f):
             # errback all of the waiting Deferreds
+            self.evicted.discard(key)
             dlist = concurrent.pop(key)
             for d in dlist:
                 d.errback(f)
@@ -227,6 +309,98 @@ class AsyncLRUCache(LRUCache):
 
         return d
 
+    def get_many(self, keys, **miss_fn_kwargs):
+        if self.miss_many_fn is None:
+            # no batched miss function, so fall back to individual gets
+            dlist = [ self.get(key, **miss_fn_kwargs) for key in keys ]
+            return self._gather(dlist)
+
+        concurrent = self.concurrent
+        dlist = []
+        missing = []
+        for key in keys:
+            try:
+                dlist.append(defer.succeed(self._get_hit(key)))
+                continue
+            except KeyError:
+                pass
+
+            # a fetch of this key is already underway, either from another
+            # get, or from earlier in this list of keys
+            d = defer.Deferred()
+            dlist.append(d)
+            if key in concurrent:
+                self.hits += 1
+                concurrent[key].append(d)
+                continue
+
+            self.misses += 1
+            concurrent[key] = [ d ]
+            missing.append(key)
+
+        if missing:
+            miss_d = self.miss_many_fn(missing, **miss_fn_kwargs)
+
+            def handle_results(results):
+                for key in missing:
+                    result = results.get(key)
+                    if result is not None and key not in self.evicted:
+                        self._store(key, result)
+                        self.weakrefs[key] = result
+                        self._ref_key(key)
+
+                self._purge()
+
+                for key in missing:
+                    result = results.get(key)
+                    self.evicted.discard(key)
+                    for d in concurrent.pop(key):
+                        d.callback(result)
+
+            def handle_failure(f):
+                for key in missing:
+                    self.evicted.discard(key)
+                    for d in concurrent.pop(key):
+                        d.errback(f)
+
+            miss_d.addCallbacks(handle_results, handle_failure)
+            miss_d.addErrback(log.err)
+
+        return self._gather(dlist)
+
+    def _gather(self, dlist):
+        # like gatherResults, but errback with the first failure itself
+        # rather than a FirstError
+        d = defer.DeferredList(dlist, fireOnOneErrback=True,
+                               consumeErrors=True)
+        d.addCallbacks(lambda res : [ r for (s, r) in res ],
+                       lambda f : f.value.subFailure)
+        return d
+
+
+def estimate_size(obj):
+    """
+    Return a rough estimate of the number of bytes of memory used by C{obj}.
+    Builtin containers are followed recursively, as is the C{__dict__} of
+    C{obj} itself; other objects are counted without their contents.
+    """
+    seen = set()
+    def size(o, follow_attrs=False):
+        if id(o) in seen:
+            return 0
+        seen.add(id(o))
+        rv = sys.getsizeof(o)
+        if isinstance(o, dict):
+            for k, v in o.iteritems():
+                rv += size(k) + size(v)
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            for v in o:
+                rv += size(v)
+        elif follow_attrs and hasattr(o, '__dict__'):
+            rv += size(o.__dict__)
+        return rv
+    return size(obj, follow_attrs=True)
+
 
 # for tests
 inv_failed = False
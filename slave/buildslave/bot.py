@@ -17,6 +17,7 @@ import os.path
 import socket
 import sys
 import signal
+import zlib
 
 from twisted.spread import pb
 from twisted.python import log
@@ -54,9 +55,32 @@ class SlaveBuilder(pb.Referenceable, service.Service):
     # when the step is started
     remoteStep = None
 
+    # .updateWindow is the number of "update" calls which may be awaiting
+    # acknowledgement from the master at once; further updates are queued and
+    # sent together when an acknowledgement arrives.  It is set by the master
+    # with setUpdateWindow; until then, each update is sent in its own call.
+    updateWindow = None
+
+    # the most updates that are sent in a single "update" call
+    UPDATE_BATCH_LIMIT = 50
+
+    # when more than this many updates are queued, the producer (usually a
+    # RunProcess) is paused until the queue drains to UPDATE_BATCH_LIMIT
+    UPDATE_HIGH_WATER = 100
+
+    # .outputCompression is the method used to compress command output in
+    # updates, set by the master with setOutputCompression.  Each output
+    # stream of a command has its own compression context.
+    outputCompression = None
+
     def __init__(self, name):
         #service.Service.__init__(self) # Service has no __init__ method
         self.setName(name)
+        self.pendingUpdates = []
+        self.updatesInFlight = 0
+        self.producer = None
+        self.producerPaused = False
+        self.compressors = {}
 
     def __repr__(self):
         return "<SlaveBuilder '%s' at %d>" % (self.name, id(self))
@@ -104,6 +128,7 @@ class SlaveBuilder(pb.Referenceable, service.Service):
     def lostRemoteStep(self, remotestep):
         log.msg("lost remote step")
         self.remoteStep = None
+        self.pendingUpdates = []
         if self.stopCommandOnShutdown:
             self.stopCommand()
 
@@ -136,13 +161,32 @@ class SlaveBuilder(pb.Referenceable, service.Service):
         self.command = factory(self, stepId, args)
 
         log.msg(" startCommand:%s [id %s]" % (command,stepId))
+        # anything queued for the previous step goes to that step
+        self._sendPendingUpdates(flush=True)
         self.remoteStep = stepref
+        self.compressors = {}
         self.remoteStep.notifyOnDisconnect(self.lostRemoteStep)
         d = self.command.doStart()
         d.addCallback(lambda res: None)
         d.addBoth(self.commandComplete)
         return None
 
+    def remote_setUpdateWindow(self, window):
+        """Allow up to C{window} unacknowledged "update" calls, batching
+        updates while the window is full.  If C{window} is None, each update
+        is sent in its own call."""
+        self.updateWindow = window
+        if window is None:
+            self._sendPendingUpdates(flush=True)
+
+    def remote_setOutputCompression(self, method):
+        """Compress the output in subsequent updates with C{method}, which
+        must be 'zlib', or None to send output uncompressed."""
+        if method not in (None, 'zlib'):
+            raise ValueError("unknown output compression %r" % (method,))
+        self.outputCompression = method
+        self.compressors = {}
+
     def remote_interruptCommand(self, stepId, why):
         """Halt the current step."""
         log.msg("asked to interrupt current command: %s" % why)
@@ -183,12 +227,86 @@ class SlaveBuilder(pb.Referenceable, service.Service):
         # master still expects to receive. Provide it to avoid significant
         # interoperability issues between new slaves and old masters.
         if self.remoteStep:
+            if self.outputCompression:
+                data = self._compressUpdate(data)
             update = [data, 0]
-            updates = [update]
+            if self.updateWindow is None:
+                updates = [update]
+                d = self.remoteStep.callRemote("update", updates)
+                d.addCallback(self.ackUpdate)
+                d.addErrback(self._ackFailed, "SlaveBuilder.sendUpdate")
+                return
+            self.pendingUpdates.append(update)
+            self._sendPendingUpdates()
+            if (self.producer and not self.producerPaused
+                    and len(self.pendingUpdates) > self.UPDATE_HIGH_WATER):
+                self.producerPaused = True
+                self.producer.pauseProducing()
+
+    def _compressUpdate(self, data):
+        # compress the output in this update, flushing each stream so that
+        # the master can decompress it immediately
+        compressed = {}
+        for key in ('stdout', 'stderr', 'log'):
+            if key not in data:
+                continue
+            if key == 'log':
+                logname, output = data['log']
+                stream = ('log', logname)
+            else:
+                output = data[key]
+                stream = key
+            if stream not in self.compressors:
+                self.compressors[stream] = zlib.compressobj()
+            c = self.compressors[stream]
+            output = c.compress(output) + c.flush(zlib.Z_SYNC_FLUSH)
+            if key == 'log':
+                compressed['log'] = (logname, output)
+            else:
+                compressed[key] = output
+        if not compressed:
+            return data
+        data = data.copy()
+        data.update(compressed)
+        data['compressed'] = self.outputCompression
+        return data
+
+    def _sendPendingUpdates(self, flush=False):
+        # send queued updates in batches while the window allows, or all of
+        # them if flush is true
+        while self.pendingUpdates and self.remoteStep:
+            if not flush and self.updatesInFlight >= self.updateWindow:
+                break
+            updates = self.pendingUpdates[:self.UPDATE_BATCH_LIMIT]
+            del self.pendingUpdates[:self.UPDATE_BATCH_LIMIT]
+            self.updatesInFlight += 1
             d = self.remoteStep.callRemote("update", updates)
+            d.addBoth(self._updateAcked)
             d.addCallback(self.ackUpdate)
             d.addErrback(self._ackFailed, "SlaveBuilder.sendUpdate")
 
+        if (self.producerPaused
+                and len(self.pendingUpdates) <= self.UPDATE_BATCH_LIMIT):
+            self.producerPaused = False
+            self.producer.resumeProducing()
+
+    def _updateAcked(self, res):
+        self.updatesInFlight -= 1
+        if self.updateWindow is not None:
+            self._sendPendingUpdates()
+        return res
+
+    # the current command's RunProcess registers itself here, so that it can
+    # be paused while updates are backed up
+    def registerProducer(self, producer, streaming):
+        assert streaming, "only push producers are supported"
+        self.producer = producer
+        self.producerPaused = False
+
+    def unregisterProducer(self):
+        self.producer = None
+        self.producerPaused = False
+
     def ackUpdate(self, acknum):
         self.activity() # update the "last activity" timer
 
@@ -217,6 +335,9 @@ class SlaveBuilder(pb.Referenceable, service.Service):
             log.msg(" but we weren't running, quitting silently")
             return
         if self.remoteStep:
+            # PB delivers calls in order, so sending everything that is
+            # queued first ensures that the master sees all of the updates
+            self._sendPendingUpdates(flush=True)
             self.remoteStep.dontNotifyOnDisconnect(self.lostRemoteStep)
             d = self.remoteStep.callRemote("complete", failure)
             d.addCallback(self.ackComplete)
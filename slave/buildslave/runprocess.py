@@ -223,6 +223,9 @@ class RunProcess:
     startTime = None
     elapsedTime = None
 
+    # True while the builder has paused us; see pauseProducing
+    paused = False
+
     # For scheduling future events
     _reactor = reactor
 
@@ -508,6 +511,9 @@ class RunProcess:
                                  self.workdir,
                                  usePTY=self.usePTY)
 
+        # the builder pauses us if updates back up on their way to the master
+        self.builder.registerProducer(self, True)
+
         # set up timeouts
 
         if self.timeout:
@@ -698,9 +704,29 @@ class RunProcess:
         if self.timer:
             self.timer.reset(self.timeout)
 
+    # IPushProducer methods, called by the builder
+
+    def pauseProducing(self):
+        self.paused = True
+        if self.process:
+            self.process.pauseProducing()
+
+    def resumeProducing(self):
+        self.paused = False
+        if self.process:
+            self.process.resumeProducing()
+        # time spent paused does not count as time without output
+        if self.timer:
+            self.timer.reset(self.timeout)
+
+    def stopProducing(self):
+        # commands are stopped by interrupting them, not through the producer
+        pass
+
     def finished(self, sig, rc):
         self.elapsedTime = util.now(self._reactor) - self.startTime
         log.msg("command finished with signal %s, exit code %s, elapsedTime: %0.6f" % (sig,rc,self.elapsedTime))
+        self.builder.unregisterProducer()
         for w in self.logFileWatchers:
             # this will send the final updates
             w.stop()
@@ -730,6 +756,7 @@ class RunProcess:
             log.msg("Hey, command %s finished twice" % self)
 
     def failed(self, why):
+        self.builder.unregisterProducer()
         self._sendBuffers()
         log.msg("RunProcess.failed: command failed: %s" % (why,))
         if self.timer:
@@ -749,6 +776,10 @@ class RunProcess:
             log.msg("Hey, command %s finished twice" % self)
 
     def doTimeout(self):
+        if self.paused:
+            # we are not reading output, so its absence means nothing
+            self.timer = self._reactor.callLater(self.timeout, self.doTimeout)
+            return
         self.timer = None
         msg = "command timed out: %d seconds without output" % self.timeout
         self.kill(msg)
@@ -22,6 +22,8 @@ class FakeSlaveBuilder:
     showing the updates.  Set debug to True to show updates as they happen.
     """
     debug = False
+    producer = None
+
     def __init__(self, usePTY=False, basedir="/slavebuilder/basedir"):
         self.updates = []
         self.basedir = basedir
@@ -33,6 +35,12 @@ class FakeSlaveBuilder:
             print "FakeSlaveBuilder.sendUpdate", data
         self.updates.append(data)
 
+    def registerProducer(self, producer, streaming):
+        self.producer = producer
+
+    def unregisterProducer(self):
+        self.producer = None
+
     def show(self):
         return pprint.pformat(self.updates)
 
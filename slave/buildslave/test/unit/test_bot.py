@@ -15,6 +15,7 @@
 
 import os
 import shutil
+import zlib
 import mock
 
 from twisted.trial import unittest
@@ -336,6 +337,115 @@ class TestSlaveBuilder(command.CommandTestMixin, unittest.TestCase):
         d.addCallback(check)
         return d
 
+    def make_windowed_step(self, window):
+        # a remote step whose "update" calls are acknowledged by firing the
+        # Deferreds in self.acks
+        sb = self.sb.original
+        sb.remote_setUpdateWindow(window)
+        self.acks = []
+        self.calls = []
+        def callRemote(meth, *args):
+            self.calls.append((meth,) + args)
+            d = defer.Deferred()
+            if meth == 'update':
+                self.acks.append(d)
+            return d
+        sb.remoteStep = mock.Mock()
+        sb.remoteStep.callRemote = callRemote
+        return sb
+
+    def test_sendUpdate_unwindowed(self):
+        sb = self.make_windowed_step(None)
+        for i in range(3):
+            sb.sendUpdate({'stdout' : str(i)})
+        self.assertEqual(len(self.calls), 3)
+
+    def test_sendUpdate_window(self):
+        sb = self.make_windowed_step(2)
+        for i in range(5):
+            sb.sendUpdate({'stdout' : str(i)})
+        # two calls are outstanding, and the rest are queued
+        self.assertEqual(self.calls, [
+            ('update', [[{'stdout' : '0'}, 0]]),
+            ('update', [[{'stdout' : '1'}, 0]]),
+        ])
+        self.acks[0].callback(0)
+        self.assertEqual(self.calls[2], ('update', [
+            [{'stdout' : '2'}, 0],
+            [{'stdout' : '3'}, 0],
+            [{'stdout' : '4'}, 0],
+        ]))
+        self.assertEqual(sb.pendingUpdates, [])
+
+    def test_sendUpdate_batch_limit(self):
+        sb = self.make_windowed_step(1)
+        sb.UPDATE_BATCH_LIMIT = 2
+        for i in range(4):
+            sb.sendUpdate({'stdout' : str(i)})
+        self.acks[0].callback(0)
+        self.assertEqual([ len(c[1]) for c in self.calls ], [ 1, 2 ])
+
+    def test_sendUpdate_backpressure(self):
+        sb = self.make_windowed_step(1)
+        sb.UPDATE_BATCH_LIMIT = 2
+        sb.UPDATE_HIGH_WATER = 3
+        producer = mock.Mock()
+        sb.registerProducer(producer, True)
+        for i in range(5):
+            sb.sendUpdate({'stdout' : str(i)})
+        self.assertTrue(producer.pauseProducing.called)
+        self.assertFalse(producer.resumeProducing.called)
+        # the acknowledgement sends two more updates, leaving two queued
+        self.acks[0].callback(0)
+        self.assertTrue(producer.resumeProducing.called)
+        self.assertEqual(len(sb.pendingUpdates), 2)
+
+    def test_commandComplete_flushes(self):
+        sb = self.make_windowed_step(1)
+        for i in range(3):
+            sb.sendUpdate({'stdout' : str(i)})
+        sb.commandComplete(None)
+        self.assertEqual([ c[0] for c in self.calls ],
+                         [ 'update', 'update', 'complete' ])
+        self.assertEqual(len(self.calls[1][1]), 2)
+
+    def test_sendUpdate_compressed(self):
+        sb = self.make_windowed_step(None)
+        sb.remote_setOutputCompression('zlib')
+        sb.sendUpdate({'stdout' : 'hello\n'})
+        sb.sendUpdate({'stdout' : 'hello\n', 'stderr' : 'oops\n'})
+        sb.sendUpdate({'log' : ('cmd.log', 'abc')})
+        sb.sendUpdate({'rc' : 0})
+
+        # each stream is decompressed with its own context
+        decompressors = {}
+        def decompress(stream, data):
+            d = decompressors.setdefault(stream, zlib.decompressobj())
+            return d.decompress(data)
+        got = []
+        for meth, updates in self.calls:
+            update = updates[0][0]
+            if 'compressed' in update:
+                self.assertEqual(update['compressed'], 'zlib')
+                for k in ('stdout', 'stderr'):
+                    if k in update:
+                        got.append((k, decompress(k, update[k])))
+                if 'log' in update:
+                    logname, data = update['log']
+                    got.append((logname, decompress(logname, data)))
+            else:
+                got.append(update)
+        self.assertEqual(got, [
+            ('stdout', 'hello\n'),
+            ('stdout', 'hello\n'), ('stderr', 'oops\n'),
+            ('cmd.log', 'abc'),
+            {'rc' : 0},
+        ])
+
+    def test_setOutputCompression_unknown(self):
+        self.assertRaises(ValueError, lambda :
+            self.sb.original.remote_setOutputCompression('lzma'))
+
 class TestBotFactory(unittest.TestCase):
 
     def setUp(self):
@@ -268,6 +268,27 @@ class TestRunProcess(BasedirMixin, unittest.TestCase):
         clock.advance(6)
         return d
 
+    def testCommandTimeoutPaused(self):
+        b = FakeSlaveBuilder(False, self.basedir)
+        s = runprocess.RunProcess(b, sleepCommand(10), self.basedir, timeout=5)
+        clock = task.Clock()
+        s._reactor = clock
+        d = s.start()
+        self.assertIdentical(b.producer, s)
+
+        # while the builder has paused the process, silence is expected
+        s.pauseProducing()
+        clock.advance(6)
+        self.assertNotEqual(s.deferred, None)
+        s.resumeProducing()
+
+        def check(ign):
+            self.failUnless({'rc': FATAL_RC} in b.updates, b.show())
+            self.assertEqual(b.producer, None)
+        d.addCallback(check)
+        clock.advance(6)
+        return d
+
     def testCommandMaxTime(self):
         b = FakeSlaveBuilder(False, self.basedir)
         s = runprocess.RunProcess(b, sleepCommand(10), self.basedir, maxTime=5)